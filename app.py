@@ -1,27 +1,1718 @@
 import os
 import io
+import re
+import posixpath
 import zipfile
 import pandas as pd
 import pyodbc
 import logging
 import uuid
+import tempfile
+import pickle
+import json
+import sys
+import hashlib
+import contextlib
+import time
+import shutil
+import threading
+import itertools
+import collections
+import multiprocessing
+import unicodedata
+import decimal
+import datetime
+import csv
 import numpy as np  # [중요] name 'np' is not defined 오류 해결을 위한 import 구문
-from flask import Flask, render_template, request, jsonify, send_file, session
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as pa_ipc
+import pyarrow.parquet as pq
+from flask import Flask, Response, render_template, request, jsonify, send_file, session
 from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import quote
 from openpyxl.utils import get_column_letter  # 엑셀 컬럼 너비 조절을 위해 추가
+from openpyxl.utils.cell import column_index_from_string, range_boundaries
 from openpyxl.styles import Font              # 엑셀 폰트 스타일링을 위해 추가
+from openpyxl.cell import WriteOnlyCell
 import openpyxl  # 파일 상단에 import 되어 있는지 확인
+try:
+    import resource   # 최대 RSS 측정용 (Windows 에는 없음)
+except ImportError:
+    resource = None
 
 # --- 기본 설정 ---
 logging.basicConfig(level=logging.INFO)
 app = Flask(__name__)
-# app.secret_key = os.urandom(24)  # 이 라인을 주석 처리하거나 삭제하고
-# 아래와 같이 고정된 문자열로 변경합니다.
-app.secret_key = 'dev-secret-key-any-string-is-ok'
+# 세션 서명 키. 여러 워커/레플리카가 서로의 세션을 읽으려면 모두 같은 SECRET_KEY 를 써야 합니다. (운영에서는 반드시 설정)
+app.secret_key = os.environ.get('SECRET_KEY') or 'dev-secret-key-any-string-is-ok'
+if not os.environ.get('SECRET_KEY'):
+    app.logger.warning("SECRET_KEY 가 설정되지 않아 개발용 세션 키를 사용합니다.")
 app.permanent_session_lifetime = timedelta(minutes=30)
-TEMP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp_data')
-if not os.path.exists(TEMP_DIR):
-    os.makedirs(TEMP_DIR)
+# 조회 결과/내보내기 파일 폴더. 여러 레플리카로 실행할 때는 공유 볼륨 경로로 지정합니다. (RESULT_STORE_BACKEND 참고)
+TEMP_DIR = os.environ.get('TEMP_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp_data'))
+os.makedirs(TEMP_DIR, exist_ok=True)
+
+# --- 성능 지표 (Prometheus /metrics) ---
+# 조회/내보내기의 단계별 소요 시간, 행 수, 바이트 수, 최대 메모리(RSS)를 query_name 별로 모읍니다.
+#   단계: connect, execute, fetch_rows, parquet_write, parquet_read, template_load, sheet_fill, workbook_save, zip_write,
+#         file_write (CSV/Parquet/Arrow 내보내기에서 파트 하나를 ZIP 항목에 기록하는 시간), validate (내보내기 전 검증),
+#         integrity (참조 무결성 검사: 데이터셋별 키 집합 생성/참조 판정)
+# 파트 엑셀은 프로세스 풀 워커에서 만들어지므로, 워커는 측정값을 모아 파트 결과와 함께 돌려주고
+# 부모 프로세스가 기록합니다. (_collect_stage_samples)
+# SQL_LOG: off (기록 안 함) / summary (쿼리 이름, 파라미터, SQL 해시) / full (SQL 본문 포함)
+SQL_LOG = os.environ.get('SQL_LOG', 'summary')
+_STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _peak_rss_bytes():
+    """현재 프로세스의 최대 RSS (측정할 수 없는 OS 면 None)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024   # Linux 는 KB 단위
+
+
+def _metric_labels(**labels):
+    """Prometheus 라벨 문자열 ({name="value",...})"""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+class _StageMetrics:
+    """단계별 히스토그램/카운터를 보관하고 Prometheus 텍스트 형식으로 내보냅니다."""
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self._seconds = {}   # (stage, query_name) -> [버킷별 개수..., 합계, 개수]
+        self._rows = collections.Counter()
+        self._bytes = collections.Counter()
+        self._peak_rss = {}
+
+    def observe(self, stage, query_name, seconds, rows=0, nbytes=0, rss=None):
+        key = (stage, query_name or '')
+        with self._lock:
+            histogram = self._seconds.setdefault(key, [0] * len(self._buckets) + [0.0, 0])
+            for n, bound in enumerate(self._buckets):
+                if seconds <= bound:
+                    histogram[n] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+            self._rows[key] += rows
+            self._bytes[key] += nbytes
+            if rss is not None:
+                self._peak_rss[key] = max(self._peak_rss.get(key, 0), rss)
+
+    def render(self):
+        lines = ['# HELP migration_stage_seconds Time spent in each fetch/export stage.',
+                 '# TYPE migration_stage_seconds histogram']
+        with self._lock:
+            for (stage, query_name), histogram in sorted(self._seconds.items()):
+                for bound, count in zip(self._buckets + ('+Inf',), histogram[:-2] + histogram[-1:]):
+                    lines.append(f'migration_stage_seconds_bucket{_metric_labels(stage=stage, query_name=query_name, le=bound)} {count}')
+                lines.append(f'migration_stage_seconds_sum{_metric_labels(stage=stage, query_name=query_name)} {histogram[-2]}')
+                lines.append(f'migration_stage_seconds_count{_metric_labels(stage=stage, query_name=query_name)} {histogram[-1]}')
+            for name, kind, help_text, values in (
+                ('migration_stage_rows_total', 'counter', 'Rows processed in each stage.', self._rows),
+                ('migration_stage_bytes_total', 'counter', 'Bytes written in each stage.', self._bytes),
+                ('migration_stage_peak_rss_bytes', 'gauge', 'Peak RSS of the process that ran the stage.', self._peak_rss),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+                lines += [f'{name}{_metric_labels(stage=stage, query_name=query_name)} {value}'
+                          for (stage, query_name), value in sorted(values.items())]
+        rss = _peak_rss_bytes()
+        if rss is not None:
+            lines += ['# HELP process_peak_rss_bytes Peak RSS of the web process.',
+                      '# TYPE process_peak_rss_bytes gauge', f'process_peak_rss_bytes {rss}']
+        return '\n'.join(lines) + '\n'
+
+
+_metrics = _StageMetrics(_STAGE_BUCKETS)
+_stage_samples = threading.local()
+
+
+def _record_stage(stage, query_name, seconds, rows=0, nbytes=0):
+    sample = (stage, query_name, seconds, rows, nbytes, _peak_rss_bytes())
+    collected = getattr(_stage_samples, 'items', None)
+    if collected is not None:
+        collected.append(sample)
+    else:
+        _metrics.observe(*sample)
+
+
+@contextlib.contextmanager
+def _stage(stage, query_name):
+    """단계 소요 시간을 측정합니다. yield 한 dict 에 rows / bytes 를 채우면 함께 기록합니다."""
+    info = {"rows": 0, "bytes": 0}
+    started = time.perf_counter()
+    try:
+        yield info
+    finally:
+        _record_stage(stage, query_name, time.perf_counter() - started, info["rows"], info["bytes"])
+
+
+@contextlib.contextmanager
+def _collect_stage_samples():
+    """이 스레드에서 측정한 값을 바로 기록하지 않고 목록으로 모읍니다. (워커 → 부모 프로세스 전달용)"""
+    _stage_samples.items = []
+    try:
+        yield _stage_samples.items
+    finally:
+        _stage_samples.items = None
+
+
+def _log_query(spec):
+    """실행할 쿼리를 SQL_LOG 설정에 맞춰 구조화된 형태(JSON 한 줄)로 기록합니다."""
+    if SQL_LOG == 'off':
+        return
+    record = {
+        "event": "query",
+        "query_name": spec["query_name"],
+        "co_cd": spec["co_cd"],
+        "fetch_mode": spec["fetch_mode"],
+        "params": [str(value) for value in spec["params"]],
+        "sql_hash": hashlib.sha256(spec["sql"].encode('utf-8')).hexdigest()[:12],
+    }
+    if SQL_LOG == 'full':
+        record["sql"] = spec["sql"]
+    app.logger.info(json.dumps(record, ensure_ascii=False))
+
+# --- 조회(fetch) 설정 ---
+# stream: 커서를 fetchmany 배치로 읽어 Parquet row group 단위로 바로 기록 (메모리 = 배치 크기)
+# buffered: 기존 방식 (pd.read_sql 로 전체 결과를 DataFrame 으로 적재)
+# partitioned / incremental: 아래 '기간 분할 병렬 조회', '증분 데이터셋' 참고
+FETCH_MODE = os.environ.get('FETCH_MODE', 'stream')
+FETCH_BATCH_SIZE = int(os.environ.get('FETCH_BATCH_SIZE', '10000'))
+PREVIEW_ROWS = 100
+
+# pyodbc cursor.description 의 type_code(파이썬 타입) → Arrow 타입
+# Decimal 은 pd.read_sql(coerce_float=True) 과 동일하게 float 로 저장합니다.
+_ARROW_TYPES = {
+    str: pa.string(),
+    int: pa.int64(),
+    float: pa.float64(),
+    decimal.Decimal: pa.float64(),
+    bool: pa.bool_(),
+    datetime.datetime: pa.timestamp('us'),
+    datetime.date: pa.date32(),
+    datetime.time: pa.time64('us'),
+    bytes: pa.binary(),
+    bytearray: pa.binary(),
+}
+
+
+def _arrow_schema_from_cursor(cursor):
+    """cursor.description 으로 결과 스키마를 만듭니다. (배치마다 타입이 흔들리지 않도록)"""
+    fields = []
+    for column in cursor.description:
+        name, type_code = column[0], column[1]
+        fields.append(pa.field(name, _ARROW_TYPES.get(type_code, pa.string())))
+    return pa.schema(fields)
+
+
+def _rows_to_arrow(rows, schema):
+    """fetchmany 로 받은 Row 목록을 컬럼 단위 Arrow 테이블로 변환합니다."""
+    arrays = []
+    for values, field in zip(zip(*rows), schema):
+        if pa.types.is_floating(field.type):
+            values = [None if v is None else float(v) for v in values]
+        try:
+            arrays.append(pa.array(values, type=field.type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # 매핑되지 않은 타입(UUID 등)은 문자열로 저장
+            arrays.append(pa.array([None if v is None else str(v) for v in values], type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _no_progress(**fields):
+    """진행 상황 보고가 필요 없을 때 쓰는 기본 콜백"""
+
+
+# --- 작업 취소 ---
+# 백그라운드 작업마다 취소 토큰을 두고, 작업이 실행 중인 커서를 토큰에 등록해 둡니다.
+# 취소 요청이 오면 등록된 커서에 cursor.cancel()(ODBC SQLCancel)을 보내 DB 에서 실행 중인 쿼리를 바로 멈추고,
+# 작업 스레드는 다음 fetchmany 배치/진행 보고 시점에 _JobCancelled 로 빠져나옵니다. (쓰던 파일은 기존 정리 경로로 삭제)
+class _JobCancelled(Exception):
+    """사용자가 작업을 취소함"""
+
+
+class _CancelToken:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cursors = set()
+        self.cancelled = False
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            cursors = list(self._cursors)
+        for cursor in cursors:
+            try:
+                cursor.cancel()
+            except Exception as e:
+                app.logger.warning(f"쿼리 취소 요청 실패: {e}")
+
+    def check(self):
+        if self.cancelled:
+            raise _JobCancelled("작업이 취소되었습니다.")
+
+    @contextlib.contextmanager
+    def track(self, cursor):
+        """실행하는 동안 커서를 등록해 두고, 취소로 중단된 DB 오류는 _JobCancelled 로 바꿉니다."""
+        with self._lock:
+            self.check()
+            self._cursors.add(cursor)
+        try:
+            yield cursor
+        except pyodbc.Error as e:
+            if self.cancelled:
+                raise _JobCancelled("작업이 취소되었습니다.") from e
+            raise
+        finally:
+            with self._lock:
+                self._cursors.discard(cursor)
+
+
+def _stream_query_to_parquet(cnxn, sql, params, filepath, batch_size=None, on_rows=None, query_name='', cancel=None):
+    """쿼리 결과를 fetchmany 배치 단위로 Parquet row group 에 이어서 기록합니다.
+
+    on_rows 가 있으면 배치를 기록할 때마다 지금까지의 행 수로 호출합니다.
+    cancel(_CancelToken) 이 있으면 커서를 등록해 실행/fetch 중에도 취소할 수 있습니다.
+    반환값: (총 행 수, 컬럼 목록, 첫 배치 기준 미리보기 레코드)
+    """
+    batch_size = batch_size or FETCH_BATCH_SIZE
+    cursor = cnxn.cursor()
+    try:
+        with cancel.track(cursor) if cancel else contextlib.nullcontext():
+            with _stage('execute', query_name):
+                cursor.execute(sql, params or [])
+                # 프로시저(EXEC)가 결과셋 앞에 행 수 메시지 등을 돌려주는 경우 첫 결과셋까지 이동
+                while cursor.description is None and cursor.nextset():
+                    pass
+            if cursor.description is None:
+                raise ValueError("쿼리가 결과셋을 반환하지 않았습니다.")
+
+            schema = _arrow_schema_from_cursor(cursor)
+            total_rows = 0
+            preview = None
+            fetch_seconds = write_seconds = 0.0
+            with pq.ParquetWriter(filepath, schema) as writer:
+                while True:
+                    if cancel:
+                        cancel.check()
+                    started = time.perf_counter()
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        fetch_seconds += time.perf_counter() - started
+                        break
+                    table = _rows_to_arrow(rows, schema)
+                    converted = time.perf_counter()
+                    writer.write_table(table)
+                    fetch_seconds += converted - started
+                    write_seconds += time.perf_counter() - converted
+                    if preview is None:
+                        preview = table.slice(0, PREVIEW_ROWS).to_pylist()
+                    total_rows += len(rows)
+                    if on_rows:
+                        on_rows(total_rows)
+            _record_stage('fetch_rows', query_name, fetch_seconds, rows=total_rows)
+            _record_stage('parquet_write', query_name, write_seconds, rows=total_rows, nbytes=os.path.getsize(filepath))
+            return total_rows, schema.names, preview or []
+    finally:
+        cursor.close()
+
+# --- DB 연결 풀 ---
+# 요청마다 pyodbc.connect 를 새로 하면 (TLS 포함) 핸드셰이크에 수백 ms 가 걸리므로
+# server/database/uid 별로 연결을 보관해 두고 재사용합니다.
+DB_POOL_MAX_PER_TARGET = int(os.environ.get('DB_POOL_MAX_PER_TARGET', '4'))    # 대상 DB 별 최대 연결 수
+DB_POOL_MAX_IDLE_SECONDS = int(os.environ.get('DB_POOL_MAX_IDLE_SECONDS', '300'))  # 이 시간 이상 쉬면 닫음
+# 빈 연결 대기 한도(초). 백그라운드 작업은 다른 작업의 긴 조회가 끝날 때까지 한도 없이 기다리고, 작업이 취소되면 중단
+DB_POOL_ACQUIRE_TIMEOUT = float(os.environ.get('DB_POOL_ACQUIRE_TIMEOUT', '30'))
+DB_POOL_CANCEL_POLL_SECONDS = 1   # 작업이 연결을 기다리는 동안 취소 여부 확인 간격(초)
+DB_CONNECT_TIMEOUT = 10
+
+
+def _connection_string(db_config):
+    return (f'DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={db_config["server"]};DATABASE={db_config["database"]};UID={db_config["uid"]};PWD={db_config["password"]};TrustServerCertificate=yes;')
+
+
+def _db_target_key(db_config):
+    """풀 키. 비밀번호는 원문 대신 해시로만 보관합니다. (비밀번호가 다르면 다른 연결)"""
+    password_digest = hashlib.sha256(str(db_config["password"]).encode('utf-8')).hexdigest()
+    return (db_config["server"], db_config["database"], db_config["uid"], password_digest)
+
+
+class _ConnectionPool:
+    """대상 DB 별 연결 풀. 빌려줄 때 살아있는지 확인하고, 오래 쉰 연결은 닫습니다."""
+
+    def __init__(self, max_per_target, max_idle_seconds, acquire_timeout):
+        self.max_per_target = max_per_target
+        self.max_idle_seconds = max_idle_seconds
+        self.acquire_timeout = acquire_timeout
+        self._cond = threading.Condition()
+        self._idle = collections.defaultdict(list)    # key -> [(연결, 반납 시각)]
+        self._open = collections.Counter()            # key -> 열려 있는 연결 수 (대기 + 사용 중)
+
+    def _evict_idle_locked(self, now):
+        expired = []
+        for key, idle in list(self._idle.items()):
+            keep = []
+            for cnxn, released_at in idle:
+                if now - released_at > self.max_idle_seconds:
+                    expired.append(cnxn)
+                    self._open[key] -= 1
+                else:
+                    keep.append((cnxn, released_at))
+            if keep:
+                self._idle[key] = keep
+            else:
+                del self._idle[key]
+        if expired:
+            self._cond.notify_all()
+        return expired
+
+    @staticmethod
+    def _close_quietly(cnxn):
+        try:
+            cnxn.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_alive(cnxn):
+        try:
+            cursor = cnxn.cursor()
+            try:
+                cursor.execute("SELECT 1").fetchone()
+            finally:
+                cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def acquire(self, key, conn_str, cancel=None):
+        """연결을 빌려줍니다. cancel(작업 취소 토큰)이 있으면 대기 한도 없이 기다리다 작업이 취소되면 중단합니다."""
+        deadline = None if cancel is not None else time.monotonic() + self.acquire_timeout
+        while True:
+            cnxn = None
+            reserved = False
+            expired = []
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    expired += self._evict_idle_locked(now)
+                    idle = self._idle.get(key)
+                    if idle:
+                        cnxn, _ = idle.pop()   # 가장 최근에 반납된 연결부터 사용
+                        if not idle:
+                            del self._idle[key]
+                        break
+                    if self._open[key] < self.max_per_target:
+                        self._open[key] += 1
+                        reserved = True
+                        break
+                    if cancel is not None:
+                        if cancel.cancelled:
+                            break
+                        self._cond.wait(DB_POOL_CANCEL_POLL_SECONDS)
+                        continue
+                    if now >= deadline:
+                        raise TimeoutError(f"DB 연결 대기 시간 초과 (대상별 최대 {self.max_per_target}개 사용 중)")
+                    self._cond.wait(deadline - now)
+            for stale in expired:
+                self._close_quietly(stale)
+
+            if cnxn is None and not reserved:
+                cancel.check()   # 연결을 기다리던 중 작업이 취소됨
+            if cnxn is None:
+                try:
+                    return pyodbc.connect(conn_str, timeout=DB_CONNECT_TIMEOUT)
+                except Exception:
+                    self._forget(key)
+                    raise
+            if self._is_alive(cnxn):
+                return cnxn
+            # 서버가 끊은 연결 -> 버리고 다시 시도
+            app.logger.info("끊어진 DB 연결을 폐기하고 다시 연결합니다.")
+            self._close_quietly(cnxn)
+            self._forget(key)
+
+    def release(self, key, cnxn, discard=False):
+        if not discard:
+            try:
+                cnxn.rollback()   # 열린 트랜잭션/잠금을 남기지 않음
+            except pyodbc.Error:
+                discard = True
+        if discard:
+            self._close_quietly(cnxn)
+            self._forget(key)
+            return
+        with self._cond:
+            self._idle[key].append((cnxn, time.monotonic()))
+            self._cond.notify()
+
+    def _forget(self, key):
+        with self._cond:
+            self._open[key] -= 1
+            if self._open[key] <= 0:
+                del self._open[key]
+            self._cond.notify()
+
+
+_db_pool = _ConnectionPool(DB_POOL_MAX_PER_TARGET, DB_POOL_MAX_IDLE_SECONDS, DB_POOL_ACQUIRE_TIMEOUT)
+
+
+@contextlib.contextmanager
+def _db_connection(db_config, query_name='', cancel=None):
+    """풀에서 연결을 빌려 쓰고 반납합니다. DB 오류가 나거나 취소된 연결은 재사용하지 않습니다.
+
+    cancel 은 백그라운드 작업의 취소 토큰 (빈 연결을 한도 없이 기다림)
+    """
+    key = _db_target_key(db_config)
+    with _stage('connect', query_name):
+        cnxn = _db_pool.acquire(key, _connection_string(db_config), cancel)
+    discard = False
+    try:
+        yield cnxn
+    except (pyodbc.Error, pd.errors.DatabaseError):   # pd.read_sql 은 pyodbc 오류를 DatabaseError 로 감쌉니다
+        discard = True
+        raise
+    except _JobCancelled:
+        # 취소된 쿼리의 남은 결과셋을 비우는 대신 연결을 닫아 서버 세션을 바로 돌려줍니다.
+        discard = True
+        raise
+    finally:
+        _db_pool.release(key, cnxn, discard=discard)
+
+# --- 회사 목록 캐시 ---
+# sco 는 이관 작업 중 거의 바뀌지 않으므로 server+database 별로 결과를 잠시 보관합니다.
+# 항목마다 조회에 쓴 계정 해시를 함께 저장해 다른 계정 정보로는 캐시를 돌려주지 않습니다.
+COMPANY_CACHE_TTL_SECONDS = int(os.environ.get('COMPANY_CACHE_TTL_SECONDS', '600'))
+COMPANY_CACHE_MAX_ENTRIES = int(os.environ.get('COMPANY_CACHE_MAX_ENTRIES', '64'))
+
+_company_cache = collections.OrderedDict()   # (server, database) -> (만료 시각, 계정 키, 회사 목록)
+_company_cache_lock = threading.Lock()
+
+
+def _get_cached_companies(db_config):
+    cache_key = (db_config["server"], db_config["database"])
+    with _company_cache_lock:
+        entry = _company_cache.get(cache_key)
+        if entry is None:
+            return None
+        expires_at, target_key, companies = entry
+        if time.monotonic() >= expires_at:
+            del _company_cache[cache_key]
+            return None
+        if target_key != _db_target_key(db_config):
+            return None
+        _company_cache.move_to_end(cache_key)
+        return companies
+
+
+def _put_cached_companies(db_config, companies):
+    if COMPANY_CACHE_TTL_SECONDS <= 0:
+        return
+    cache_key = (db_config["server"], db_config["database"])
+    with _company_cache_lock:
+        _company_cache[cache_key] = (time.monotonic() + COMPANY_CACHE_TTL_SECONDS, _db_target_key(db_config), companies)
+        _company_cache.move_to_end(cache_key)
+        while len(_company_cache) > COMPANY_CACHE_MAX_ENTRIES:
+            _company_cache.popitem(last=False)   # 가장 오래 사용하지 않은 항목부터 제거
+
+# --- 쿼리 레지스트리 ---
+# 메뉴(query_name)별 SQL, 파라미터 바인딩, 필수 입력값, 엑셀 템플릿 설정을 한 곳에서 관리합니다.
+#   params   : SQL 의 ? 순서대로 바인딩할 값 (_QUERY_PARAM_BINDERS 의 키)
+#   required : 비어 있으면 조회를 거부할 요청 입력값, error 는 그때의 안내 문구
+#   template / start_row : 내보내기 템플릿 파일과 데이터 시작 행 (None 이면 템플릿 없이 내보냄)
+#   columns  : 템플릿 헤더의 컬럼 수 (시작 시 템플릿 파일과 대조)
+#   partition: 기간 분할 조회(fetch_mode=partitioned)에 쓸 날짜 컬럼. SQL 에서 end_date 가 바인딩되는
+#              ? 마다 하나씩 (UNION ALL 의 각 SELECT 별)
+TEMPLATE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'excel_templates')
+
+_QUERY_PARAM_BINDERS = {
+    "co_cd": lambda inputs: inputs["co_cd"],
+    "start_date": lambda inputs: inputs["start_date"],
+    "end_date": lambda inputs: inputs["end_date"],
+    "start_year": lambda inputs: inputs["start_date"][:4],
+    "end_year": lambda inputs: inputs["end_date"][:4],
+}
+# 바인딩 키가 읽는 요청 입력값 (필수 입력값 검증용)
+_QUERY_PARAM_INPUTS = {"co_cd": "co_cd", "start_date": "start_date", "end_date": "end_date",
+                       "start_year": "start_date", "end_year": "end_date"}
+
+QUERY_REGISTRY = {
+    "거래처등록": {
+        "sql": (
+            "SELECT ISNULL(CO_CD, '') AS CO_CD, ISNULL(TR_FG, '') AS TR_FG, ISNULL(TR_CD, '') AS TR_CD, "
+            "ISNULL(TR_NM, '') AS TR_NM, ISNULL(ATTR_NM, '') AS ATTR_NM, ISNULL(CEO_NM, '') AS CEO_NM, "
+            "ISNULL(REG_NB, '') AS REG_NB, ISNULL(PPL_NB, '') AS PPL_NB, ISNULL(FOR_YN, '') AS FOR_YN, "
+            "ISNULL(BUSINESS, '') AS BUSINESS, ISNULL(JONGMOK, '') AS JONGMOK, ISNULL(ZIP, '') AS ZIP, "
+            "ISNULL(DIV_ADDR1, '') AS DIV_ADDR1, ISNULL(ADDR2, '') AS ADDR2, ISNULL(TEL, '') AS TEL, "
+            "ISNULL(FAX, '') AS FAX, ISNULL(HOMEPAGE, '') AS HOMEPAGE, ISNULL(EMAIL, '') AS EMAIL, "
+            "ISNULL(LIQ_RS, '') AS LIQ_RS, ISNULL(PJT_CD, '') AS PJT_CD, ISNULL(TRGRP_CD, '') AS TRGRP_CD, "
+            "ISNULL(TRRAT_FG, '') AS TRRAT_FG, ISNULL(CLTTR_CD, '') AS CLTTR_CD, ISNULL(LOCAL_CD, '') AS LOCAL_CD, "
+            "ISNULL(LINK_CD, '') AS LINK_CD, ISNULL(JEONJA_YN, '') AS JEONJA_YN, ISNULL(REPTR_CD, '') AS REPTR_CD, "
+            "ISNULL(APPR_NB, '') AS APPR_NB, ISNULL(LIQ_FG, '') AS LIQ_FG, ISNULL(REMARK_DC, '') AS REMARK_DC, "
+            "ISNULL(INTER_DT, '') AS INTER_DT, ISNULL(DUE_DT, '') AS DUE_DT, ISNULL(USE_YN, '') AS USE_YN, "
+            "ISNULL(TRSO_FG, '') AS TRSO_FG, ISNULL(PAYCON_DC, '') AS PAYCON_DC, ISNULL(DOUDATE1_FG, '') AS DOUDATE1_FG, "
+            "ISNULL(DOUDATE1_DD, '') AS DOUDATE1_DD, ISNULL(EMP_CD, '') AS EMP_CD, ISNULL(DEPT_CD, '') AS DEPT_CD, "
+            "'' AS TITLE_DC, '' AS JOB_DC, '' AS TEL_DC, '' AS EXT_DC, '' AS HP_DC, '' AS EMAIL_DC, "
+            "'' AS RMK_DC, ISNULL(RECZIP, '') AS RECZIP, ISNULL(REC_ADDR1, '') AS REC_ADDR1, ISNULL(REC_ADDR2, '') AS REC_ADDR2, "
+            "'' AS REC_TEL, '' AS REC_HP, '' AS REC_FAX, '' AS REC_MAIL, '' AS EMPGRP_CD, '' AS TRCHARGE_EMP, "
+            "'' AS TRCHARGE_EMAIL, '' AS TRCHARGE_DEPT, '' AS TRCHARGE_TITLE, '' AS TRCHARGE_JOP, ISNULL(TRCHARGE_TEL, '') AS TRCHARGE_TEL, "
+            "ISNULL(TRCHARGE_EXT, '') AS TRCHARGE_EXT, '' AS TRCHARGE_HP, ISNULL(JIRO_CD, '') AS JIRO_CD, ISNULL(BA_NB, '') AS BA_NB, "
+            "ISNULL(DEPOSITOR, '') AS DEPOSITOR, ISNULL(ACCT1_FG, '') AS ACCT1_FG, ISNULL(TAX1_FG, '') AS TAX1_FG, ISNULL(SETTLE_PAY, '') AS SETTLE_PAY, "
+            "ISNULL(SETTLE_CD, '') AS SETTLE_CD, ISNULL(ACCT2_FG, '') AS ACCT2_FG, ISNULL(TAX2_FG, '') AS TAX2_FG, ISNULL(SETTLE_RCP, '') AS SETTLE_RCP "
+            "FROM STRADE WHERE CO_CD = ? "
+        ),
+        "params": ["co_cd"],
+        "required": ["co_cd"],
+        "error": "회사를 선택해야 합니다.",
+        "template": "거래처등록_template.xlsx",
+        "start_row": 4,
+        "columns": 72,
+    },
+    "사원정보": {
+        "sql": (
+            "SELECT ROW_NUMBER() OVER (ORDER BY EMP_CD) AS 'NO', EMP_CD AS 사번, KOR_NM AS 이름, "
+            "'' AS 로그인ID, '' AS 메일ID, '' AS 로그인비밀번호, '' AS 결재비밀번호, "
+            "CASE WHEN GENDER_FG = 'M' THEN '남자' ELSE '여자' END AS '성별', '한국어' AS 사용언어, "
+            "GRUP_DT AS '최초입사일', '' AS 기본라이선스, '' AS 메일, '' AS 원챔버탐색기팩, "
+            "'' AS ONEAI라이선스, HCLS_CD AS 직급, HRSP_CD AS 직책, ENRL_FG AS 재직구분, "
+            "EMPL_FG AS 고용구분, HOPR_CD AS 직무, JOIN_DT AS 입사일, '사용' AS 근태사용, "
+            "REFR_YN AS 내외국인여부, RSRG_NO AS 주민등록번호, FORG_NO AS 외국인등록번호, "
+            "PYSP_FG AS 급여형태, HTYP_CD AS 직종 FROM SEMP WHERE CO_CD = ? AND EMPL_FG = '001'"
+        ),
+        "params": ["co_cd"],
+        "required": ["co_cd"],
+        "error": "회사를 선택해야 합니다.",
+        "template": "사원정보_template.xlsx",
+        "start_row": 8,
+        "columns": 26,
+    },
+    "사원정보2": {
+        "sql": (
+            "SELECT '' AS [순번], EMP_CD AS [사번], KOR_NM AS [이름(한국어)], ENLS_NM AS [이름(영어)], "
+            "'' AS [이름(일본어)], '' AS [이름(중국어)], '' AS [로그인ID], '' AS [메일ID], "
+            "'' AS [로그인 비밀번호], '' AS [결재 비밀번호], "
+            "CASE WHEN GENDER_FG = 'M' THEN '남자' ELSE '여자' END AS [성별], '한국어' AS [사용언어], "
+            "EMAL_ADD AS [개인메일], '' AS [휴대전화], TEL AS [전화번호], "
+            "'' AS [비상연락망(HP) 관계], EMGC_TEL AS [비상연락망(HP)], RR_ZIP AS [우편번호], "
+            "RSRG_ADD AS [기본주소], RSRD_ADD AS [상세주소], '' AS [우편번호(영문)], "
+            "'' AS [기본주소(영문)], '' AS [상세주소(영문)], JOIN_DT AS [최초입사일], "
+            "RTR_DT AS [최종퇴사일], '미사용' AS [계정 사용], '미사용' AS [모바일 사용], "
+            "'미사용' AS [메신저 사용], BCCN_NO AS [출입카드번호], '' AS [SNS], "
+            "'' AS [커리어], '비라이선스' AS [기본 라이선스], '미사용' AS [메일], "
+            "'미사용' AS [ONE-AI 라이선스], '미사용' AS [원챔버탐색기팩], '1000' AS [회사코드], "
+            "'1000' AS [사업장코드], DEPT_CD AS [부서코드], HCLS_CD AS [직급코드], "
+            "HRSP_CD AS [직책코드], ENRL_FG AS [재직구분코드], EMPL_FG AS [고용구분코드], "
+            "HOPR_CD AS [직무코드], JOIN_DT AS [입사일], RPMC_DT AS [퇴사일], "
+            "'' AS [회사전화번호], '' AS [회사팩스번호], '' AS [내선단축번호], "
+            "'' AS [회사우편번호], '' AS [회사기본주소], '' AS [회사상세주소], "
+            "'' AS [회사우편번호(영문)], '' AS [회사기본주소(영문)], '' AS [회사상세주소(영문)], "
+            "'미표시' AS [조직도], '미표시' AS [대화/쪽지 조직도], '미사용' AS [근태사용], "
+            "REFR_YN AS [내외국인여부], RSRG_NO AS [주민등록번호], FORG_NO AS [외국인등록번호], "
+            "'' AS [외국인단일세율적용여부], '' AS [생년월일], '' AS [양/음력구분], "
+            "'' AS [급여이메일], '' AS [본적주소], '' AS [본적주소상세], "
+            "'' AS [본적우편번호], '' AS [수습적용여부], '' AS [수습만료일], "
+            "'' AS [수습급여지급률], '' AS [근속기간포함여부(수습)], '' AS [휴직시작일], "
+            "'' AS [휴직종료일], '' AS [휴직복직일], '' AS [휴직사유], "
+            "'' AS [휴직급여지급율], '' AS [퇴직기간포함여부(휴직)], '' AS [중도정산일], "
+            "'' AS [계약종료일], '' AS [퇴직사유], '' AS [계정유형], '' AS [호봉], "
+            "PYSP_FG AS [급여형태], HTYP_CD AS [직종], '' AS [근무조], '' AS [프로젝트], "
+            "'' AS [하위사업], '' AS [분류코드], '' AS [사용자정의1], '' AS [사용자정의2], "
+            "'' AS [사용자정의3], '' AS [사용자정의4], '' AS [사용자정의5], "
+            "'' AS [사용자정의6], '' AS [국적코드(관리용)], '' AS [국적코드(신고용)], "
+            "'' AS [거주구분], '' AS [거주지국코드], '' AS [세대주여/부], "
+            "'' AS [최종학력], '' AS [국외소득유무], '' AS [건강보험번호], "
+            "'' AS [건강보험료자동계산여부], '' AS [건강보험보수월액], '' AS [건강보험금액], "
+            "'' AS [건강보험여부], '' AS [노인장기요양보험료], '' AS [장기요양보험료 경감대상자여부], "
+            "'' AS [연금유형], '' AS [국민연금자동계산여부], '' AS [국민연금보수월액], "
+            "'' AS [국민연금금액], '' AS [사학연금자동계산여부], '' AS [사학연금보수월액], "
+            "'' AS [사학연금], '' AS [고용보험여부], '' AS [고용보험 자동계산여부], "
+            "'' AS [고용보험보수월액], '' AS [고용보험료], '' AS [고용보험대표이사여부], "
+            "'' AS [노조가입여부], '' AS [(급여)이체은행], '' AS [(급여)계좌번호], "
+            "'' AS [예금주], '' AS [(기타)이체은행], '' AS [(기타)계좌번호], "
+            "'' AS [예금주2], '' AS [장애인구분], '' AS [배우자공제 여부], "
+            "'' AS [20세이하 인원수], '' AS [60세이상 인원수], "
+            "'' AS [장애인기본공제인원수], '' AS [기타수급자], '' AS [다자녀추가공제], "
+            "'' AS [부녀자공제], '' AS [학자금공제자 여부], '' AS [학자금상환 통지액], "
+            "'' AS [생산직 총급여], '' AS [퇴직연금구분], '' AS [퇴직연금은행코드], "
+            "'' AS [퇴직연금계좌번호], '' AS [퇴직연금가입일], '' AS [퇴직연금해지일], "
+            "'' AS [퇴직연금 비고], '' AS [두루누리사회보험 신청여부], "
+            "'' AS [두루누리사회보험적용율], '' AS [자금입력방식], "
+            "'' AS [경비이체은행코드], '' AS [경비이체계좌번호], "
+            "'' AS [경비이체예금주], '' AS [종교관련종사자여부], "
+            "'' AS [근무지], '' AS [학자금공제기간시작], "
+            "'' AS [학자금공제기간종료], '' AS [감면대상], "
+            "'' AS [감면유형코드], '' AS [감면기간(시작연월)], "
+            "'' AS [감면기간(종료연월)], '' AS [담당업무], "
+            "'' AS [담당업무(영문)], '' AS [담당업무(중국어)], "
+            "'' AS [담당업무(일본어)], '' AS [외국법인소속파견자여부], "
+            "'' AS [결혼여부], '' AS [결혼일], '' AS [기타근무유형], "
+            "'' AS [기타근무시간] FROM SEMP WHERE CO_CD = ? AND EMPL_FG = '001'"
+        ),
+        "params": ["co_cd"],
+        "required": ["co_cd"],
+        "error": "회사를 선택해야 합니다.",
+        "template": "사원정보2_template.xlsx",
+        "start_row": 8,
+        "columns": 167,
+    },
+    "조직정보": {
+        "sql": (
+            "SELECT D.CO_CD, C.CO_NM, H.CTRL_NM, '' AS 상세구분, D.CTD_CD, D.CTD_NM, "
+            "'' AS 영어, '' AS 중국어, '' AS 일본어, 'Y', '' AS 정렬 "
+            "FROM SCTRL_D D "
+            "INNER JOIN SCO C ON D.CO_CD = C.CO_CD "
+            "LEFT OUTER JOIN SCTRL H ON H.CO_CD = D.CO_CD AND H.CTRL_CD = D.CTRL_CD AND H.MODULE_CD = 'H' "
+            "WHERE D.CO_CD = ? AND D.CTRL_CD IN ('G3','G4','G5','G6') AND H.MODULE_CD = 'H' "
+        ),
+        "params": ["co_cd"],
+        "required": ["co_cd"],
+        "error": "회사를 선택해야 합니다.",
+        "template": "조직정보_template.xlsx",
+        "start_row": 8,
+        "columns": 12,
+    },
+    "상용직정보": {
+        "sql": (
+            "SELECT '' AS [순번], '' AS [로그인ID], '' AS [메일ID], '' AS [로그인 비밀번호], "
+            "KOR_NM AS [이름(한국어)], ENLS_NM AS [이름(영어)], '' AS [이름(일본어)], "
+            "'' AS [이름(중국어)], CASE WHEN GENDER_FG = 'M' THEN '남자' ELSE '여자' END AS [성별], "
+            "'' AS [휴대전화], TEL AS [전화번호], EMGC_TEL AS [비상연락망(HP)], "
+            "'' AS [관계], RR_ZIP AS [우편번호], RSRG_ADD AS [기본주소], RSRD_ADD AS [상세주소], "
+            "'한국어' AS [사용언어], EMAL_ADD AS [개인메일], '' AS [개인메일도메인], "
+            "EMAL_ADD AS [급여메일], '' AS [급여메일도메인], '비라이선스' AS [기본 라이선스], "
+            "'N' AS [메일], 'N' AS [원챔버 탐색기팩], 'N' AS [OneAI], JOIN_DT AS [최초입사일], "
+            "RTR_DT AS [최종퇴사일], '' AS [회사코드], DEPT_CD AS [부서코드], EMP_CD AS [사번], "
+            "HCLS_CD AS [직급코드], HRSP_CD AS [직책코드], ENRL_FG AS [재직구분코드], "
+            "EMPL_FG AS [고용구분코드], HOPR_CD AS [직무코드], '' AS [담당업무(한국어)], "
+            "'' AS [담당업무(영어)], '' AS [담당업무(중국어)], '' AS [담당업무(일본어)], "
+            "JOIN_DT AS [입사일], RPMC_DT AS [퇴사일], '미사용' AS [근태사용], "
+            "TEL AS [전화번호(조직)], '' AS [내선번호(조직)], '' AS [팩스번호(조직)], "
+            "RR_ZIP AS [우편번호(조직)], RSRG_ADD AS [기본주소(조직)], RSRD_ADD AS [상세주소(조직)], "
+            "'표시' AS [조직도], '표시' AS [대화/쪽지조직도] FROM SEMP WHERE CO_CD = ?  AND EMPL_FG = '001'"
+        ),
+        "params": ["co_cd"],
+        "required": ["co_cd"],
+        "error": "회사를 선택해야 합니다.",
+        "template": "상용직정보_template.xlsx",
+        "start_row": 8,
+        "columns": 50,
+    },
+    "부서정보": {
+        "sql": (
+            "SELECT '' AS 회사코드, '' AS 회사명, '' AS 사업장코드, '' AS 사업장명, "
+            "'-' AS 상위부서코드, 1 AS Depth, dept_cd AS 부서코드, dept_nm AS 부서명, "
+            "'부서' AS 유형 FROM SDEPT WHERE CO_CD = ? "
+        ),
+        "params": ["co_cd"],
+        "required": ["co_cd"],
+        "error": "회사를 선택해야 합니다.",
+        "template": "부서정보_template.xlsx",
+        "start_row": 22,
+        "columns": 17,
+    },
+    "품목등록": {
+        "sql": (
+            "SELECT ITEM_CD, ITEM_NM, ITEM_DC, ACCT_FG, ODR_FG, ITEMGRP_CD, UNIT_DC, UNITMANG_DC, UNITCHNG_NB, USE_YN, "
+            "LEAD_DT, DESIGN_NB, LOT_FG, SETITEM_FG, QC_FG, '0' REQ_FG, TRMAIN_CD, STANDARD_UM, REAL_UM, SALE_UM, "
+            "PURCH_UM, SALPLN_CD, PURPLN_CD, MTLPLN_CD, MFGPLN_CD, EMP_CD, L_CD, M_CD, S_CD, LOT_QT, FOQ_QT, "
+            "TRSUB_CD, TRSUB2_CD, SAFESTOCK_QT, COMP_DC, BARCODE_DC, WIDTH_QT, LENGTH_QT, HEIGHT_QT, DENSTY_QT, "
+            "WIDTH_UM, LENGTH_UM, HEIGHT_UM, VOLUME_QT, WEIGHT_QT, AREA_QT, VOLUME_UM, WEIGHT_UM, AREA_UM, "
+            "DAYCAPA_NB, LNSP_UM, HS_NB, MASS_CD, MASS_CONFNB, PACK_PO_QT, PACK_PO_RT, PACK_SO_QT, PACK_SO_RT, "
+            "STANDARD_TIME,'' aaa,LIQ_YN, REMARK_DC, AL_REMARK_DC, LIQ_FG, STANDARD_TIME_UNIT_DC, SALEVAT_UM, PURCHVAT_UM, "
+            "'' LIQUSE_FG FROM SITEM WHERE CO_CD = ?"
+        ),
+        "params": ["co_cd"],
+        "required": ["co_cd"],
+        "error": "회사를 선택해야 합니다.",
+        "template": "품목등록_template.xlsx",
+        "start_row": 4,
+        "columns": 65,
+    },
+    "품목군등록": {
+        "sql": (
+            "SELECT ITEMGRP_CD, ITEMGRP_NM, USE_YN, ITEMGRP_DC FROM SITEMGRP WHERE CO_CD = ?"
+        ),
+        "params": ["co_cd"],
+        "required": ["co_cd"],
+        "error": "회사를 선택해야 합니다.",
+        "template": "품목군등록_template.xlsx",
+        "start_row": 4,
+        "columns": 4,
+    },
+    "BOM등록": {
+        "sql": (
+            "SELECT ITEMPARENT_CD	,BOM_SQ SORT_SQ	,ITEMCHILD_CD	,JUST_QT	,LOSS_RT	,OUT_FG	,USE_YN	,REAL_QT	,ODR_FG	,START_DT	,END_DT	,REMARK_DC	FROM SBOM_WF WHERE CO_CD = ? and itemparent_cd in (SELECT item_cd FROM SITEM WHERE co_cd = ? and use_yn = '1')"
+        ),
+        "params": ["co_cd", "co_cd"],
+        "required": ["co_cd"],
+        "error": "회사를 선택해야 합니다.",
+        "template": "BOM등록_template.xlsx",
+        "start_row": 4,
+        "columns": 12,
+    },
+    "관리내역등록": {
+        "sql": (
+            "SELECT H.CTRL_CD,D.MGM_CD,D.MGM_NM,D.REMARK_DC,D.USE_YN FROM LCTRL_MGM H INNER JOIN  LCTRL_MGM_D D ON H.CO_CD = D.CO_CD AND H.CTRL_CD = D.CTRL_CD WHERE D.CO_CD = ?"
+        ),
+        "params": ["co_cd"],
+        "required": ["co_cd"],
+        "error": "회사를 선택해야 합니다.",
+        "template": "관리내역등록_template.xlsx",
+        "start_row": 4,
+        "columns": 5,
+    },
+    "창고": {
+        "sql": (
+            "SELECT DIV_CD,BASELOC_FG,BASELOC_CD,BASELOC_NM,BASELOC_DC,USE_YN FROM SBASELOC WHERE CO_CD = ?"
+        ),
+        "params": ["co_cd"],
+        "required": ["co_cd"],
+        "error": "회사를 선택해야 합니다.",
+        "template": "창고_template.xlsx",
+        "start_row": 4,
+        "columns": 6,
+    },
+    "공정": {
+        "sql": (
+            "SELECT BASELOC_CD,LOC_CD,LOC_NM,TR_CD,BAD_YN,AVABSTOCK_YN,USE_YN,LOC_DC FROM SLOC WHERE CO_CD = ?"
+        ),
+        "params": ["co_cd"],
+        "required": ["co_cd"],
+        "error": "회사를 선택해야 합니다.",
+        "template": "공정_template.xlsx",
+        "start_row": 4,
+        "columns": 8,
+    },
+    "프로젝트등록": {
+        "sql": (
+            "SELECT CO_CD,PJT_CD,PROG_FG,PJT_NM,PJT_NMK,ATPJT_NM,ATPJT_NMK,TR_CD,PJTGRP_CD,FR_DT,TO_DT,START_DT,PJT_WORKTY,PJTRMK_DC,PJTRMK_DCK,COST_FG,PJT_TY,DEPT_CD,EMP_CD,'' PRIME_TR_CD,ORD_AM,GOYONG_NM,RSRG_NO,HJS,HCLS,DTL_DC,GOAL_DC FROM SPJT  WHERE CO_CD = ?"
+        ),
+        "params": ["co_cd"],
+        "required": ["co_cd"],
+        "error": "회사를 선택해야 합니다.",
+        "template": "프로젝트등록_template.xlsx",
+        "start_row": 4,
+        "columns": 27,
+    },
+    "납품처등록": {
+        "sql": (
+            "SELECT CUST_CD,	SHIP_CD,	SHIP_NM,	ZIP_CD,	ADD_DC,	SHIP_FG,	CARGO_AM,	TREMP_NM,	PHONE_NB,	FAX_NB,	CP_NB,	EMAIL_DC,	USE_YN FROM LSHIP_BILL  WHERE CO_CD = ?"
+        ),
+        "params": ["co_cd"],
+        "required": ["co_cd"],
+        "error": "회사를 선택해야 합니다.",
+        "template": "납품처등록_template.xlsx",
+        "start_row": 4,
+        "columns": 13,
+    },
+    "물류담당자등록": {
+        "sql": (
+            "SELECT PLN_CD,PLN_NM,EMP_CD,PLN_TEL,PLN_FAX,PLN_CP,PLNS_CD,FROM_DT,TO_DT,USE_YN FROM LPLNNERCD  WHERE CO_CD = ?"
+        ),
+        "params": ["co_cd"],
+        "required": ["co_cd"],
+        "error": "회사를 선택해야 합니다.",
+        "template": "물류담당자등록_template.xlsx",
+        "start_row": 4,
+        "columns": 10,
+    },
+    "고객별물류담당자등록": {
+        "sql": (
+            "SELECT TR_CD,PLN_CD,PURPLN_CD,OUTPLN_CD,AREA_CD,AREA_GRP,TRADE_GRP,SHIP_CD,UM_FG,POUM_FG   FROM LTRADEMGM  WHERE CO_CD = ?"
+        ),
+        "params": ["co_cd"],
+        "required": ["co_cd"],
+        "error": "회사를 선택해야 합니다.",
+        "template": "고객별물류담당자등록_template.xlsx",
+        "start_row": 4,
+        "columns": 10,
+    },
+    "기초재고": {
+        "sql": (
+            "SELECT LI.DIV_CD, LEFT(?, 4) + '0101' AS ADJUST_DT, LI.WH_CD, LI.LC_CD,'기초재고' AS REMARK_DC,'' AS TR_CD,'' AS PLN_CD, LI.ITEM_CD,SUM(ISNULL(LI.IOPEN_QT, 0)) AS IOPEN_QT, MAX(ISNULL(T.OPEN_UM, 0)) AS OPEN_UM, "
+            "CASE WHEN ROW_NUMBER() OVER (PARTITION BY LI.DIV_CD, LI.ITEM_CD ORDER BY LI.LOT_NB) = 1 THEN MAX(ISNULL(T.OPEN_AM, 0)) ELSE 0 END AS OPEN_AM, "
+            "'' AS MGMT_CD, '' AS PJT_CD, ISNULL(LI.LOT_NB, '') AS LOT_NB "
+            "FROM LX_LINVTORY LI "
+            "LEFT OUTER JOIN LINV_TAV T ON LI.CO_CD = T.CO_CD AND LI.DIV_CD = T.DIV_CD AND LI.P_YR + '01' = T.SMM AND LI.ITEM_CD = T.ITEM_CD "
+            "WHERE LI.CO_CD = ? AND LI.P_YR = LEFT(?, 4) "
+            "GROUP BY LI.DIV_CD, LI.WH_CD, LI.LC_CD, LI.ITEM_CD, LI.LOT_NB "
+            "HAVING SUM(LI.IOPEN_QT) <> 0 ORDER BY LI.WH_CD,LI.LC_CD,LI.ITEM_CD, LI.LOT_NB"
+        ),
+        "params": ["start_date", "co_cd", "start_date"],
+        "required": ["co_cd", "start_date"],
+        "error": "회사,시작일자를 선택해야 합니다.",
+        "template": "기초재고_template.xlsx",
+        "start_row": 4,
+        "columns": 15,
+    },
+    "주문정보": {
+        "sql": (
+            "SELECT H.SO_FG, H.SO_DT, H.TR_CD, 'KRW' AS EXCH_CD, ISNULL(H.EXCH_RT,1) EXCH_RT, H.VAT_FG, H.UMVAT_FG, "
+            "ISNULL(H.SHIP_CD,'') SHIP_CD, ISNULL(H.PLN_CD,'') PLN_CD, ISNULL(H.LC_NB,'') LC_NB, "
+            "ISNULL(D.SO_NB,'') MGM_NM, ISNULL(H.REMARK_DC,'') REMARK_DC, D.ITEM_CD, D.DUE_DT, D.SHIPREQ_DT, "
+            "ISNULL(D.SO_QT,0) SO_QT, ISNULL(D.UM_FG,'') UM_FG, ISNULL(D.SO_UM,0) SO_UM, D.VAT_UM, D.SOG_AM, "
+            "D.SOV_AM, D.SOH_AM, D.EXCH_UM, D.EXCH_AM, '0' REQ_FG, ISNULL(D.QC_FG,'0') QC_FG, D.MGMT_CD, D.PJT_CD, "
+            "ISNULL(LEFT(D.REMARK_DC,57),'') + '|'+CONVERT(NVARCHAR(3),D.SO_SQ) REMARKD_DC, D.EST_NB, "
+            "CASE WHEN D.EST_SQ= 0 THEN NULL ELSE D.EST_SQ END EST_SQ, D.ITEMSET_CD "
+            "FROM LSO H "
+            "LEFT OUTER JOIN LSO_D D ON H.CO_CD = D.CO_CD AND H.SO_NB = D.SO_NB "
+            "WHERE H.SO_FG = '0' AND H.CO_CD = ? AND H.SO_DT >=  ? AND H.SO_DT <= ? "
+            "ORDER BY H.CO_CD, H.SO_NB, D.SO_SQ"
+        ),
+        "partition": ["H.SO_DT"],
+        "params": ["co_cd", "start_date", "end_date"],
+        "required": ["co_cd", "start_date", "end_date"],
+        "error": "회사,시작일자,종료일자 모두 선택해야 합니다.",
+        "template": "주문정보_template.xlsx",
+        "start_row": 4,
+        "columns": 32,
+    },
+    "입고처리": {
+        "sql": (
+            "SELECT H.DIV_CD,H.PO_FG, H.RCV_DT, H.TR_CD, H.EXCH_CD, ISNULL(H.EXCH_RT,1) EXCH_RT, H.VAT_FG, H.UMVAT_FG, "
+            "H.WH_CD, H.PLN_CD,H.RCV_NB REMARK_DC, D.ITEM_CD, D.PO_QT, D.RCV_QT, D.UM_FG, D.RCV_UM, D.VAT_UM, "
+            "D.RCVG_AM, D.RCVV_AM, D.RCVH_AM, D.EXCH_UM, D.EXCH_AM, D.LC_CD, D.LOT_NB,H.MGMT_CD, D.PJT_CD, "
+            "D.REMARK_DC REMARKD_DC, PO_NB, PO_SQ,  IBL_NB, IBL_SQ, '' REQ_NB, '' REQ_SQ, "
+            "'' QC_NB, '' QC_SQ "
+            "FROM LSTOCK H "
+            "LEFT OUTER JOIN LSTOCK_D D ON H.CO_CD = D.CO_CD AND H.RCV_NB = D.RCV_NB "
+            "WHERE H.CO_CD = ? AND H.RCV_DT >=  ? AND H.RCV_DT <= ? "
+            "ORDER BY H.CO_CD, d.RCV_NB, D.RCV_SQ"
+        ),
+        "partition": ["H.RCV_DT"],
+        "params": ["co_cd", "start_date", "end_date"],
+        "required": ["co_cd", "start_date", "end_date"],
+        "error": "회사,시작일자,종료일자 모두 선택해야 합니다.",
+        "template": "입고처리_template.xlsx",
+        "start_row": 4,
+        "columns": 35,
+    },
+    "발주등록": {
+        "sql": (
+            "SELECT H.PO_DT, H.TR_CD, H.PO_FG, H.VAT_FG, H.EXCH_CD, D.ITEM_CD, D.DUE_DT, D.PO_QT, D.EXCH_UM, D.EXCH_AM, ISNULL(H.EXCH_RT,1) EXCH_RT, ISNULL(H.MGMT_CD,'') MGMT_CD, ISNULL(D.PJT_CD,'') PJT_CD, ISNULL(H.LC_NB,'') LC_NB, ISNULL(H.PLN_CD,'') PLN_CD, H.REMARK_DC, D.PO_UM, ISNULL(D.UM_FG,'') UM_FG, D.POG_AM, D.POGV_AM1, D.POGH_AM1, D.SHIPREQ_DT, '' REQ_FG, '' QC_FG, ISNULL(D.REMARK_DC,'') + '|' + CONVERT(NVARCHAR(3),D.PO_SQ) REMARKD_DC, '' SO_NB, '' SO_SQ, '' REQ_NB, '' MREQ_SQ, '' REQR_NB, '' REQR_SQ, TRNMTD_DC, PAYCON_DC, DELARA_DC,D.PO_NB MGM_NM, UMVAT_FG, VAT_UM " 
+            "FROM LPO H INNER JOIN LPO_D D ON H.CO_CD = D.CO_CD AND H.PO_NB = D.PO_NB "
+            "WHERE H.CO_CD = ? AND H.PO_DT >= ? AND H.PO_DT <= ? "
+            "ORDER BY H.CO_CD, H.PO_NB, D.PO_SQ"
+        ),
+        "partition": ["H.PO_DT"],
+        "params": ["co_cd", "start_date", "end_date"],
+        "required": ["co_cd", "start_date", "end_date"],
+        "error": "회사,시작일자,종료일자 모두 선택해야 합니다.",
+        "template": "발주등록_template.xlsx",
+        "start_row": 4,
+        "columns": 37,
+    },
+    "출고처리": {
+        "sql": (
+            "SELECT H.DIV_CD,H.SO_FG, H.ISU_DT, H.TR_CD, H.EXCH_CD, H.EXCH_RT, H.VAT_FG, H.UMVAT_FG, H.SHIP_CD, H.WH_CD, "
+            "'' AS AREA_CD, H.SHIP_FG, H.PLN_CD, H.REMARK_DC, D.ITEM_CD, D.SO_QT, D.ISU_QT, D.UM_FG, D.ISU_UM, "
+            "D.VAT_UM, D.ISUG_AM, D.ISUV_AM, D.ISUH_AM, D.EXCH_UM, D.EXCH_AM, D.LC_CD, D.LOT_NB, D.MGMT_CD, "
+            "D.PJT_CD, D.REMARK_DC AS REMARKD_DC, D.SO_NB, D.SO_SQ, D.REQ_NB, D.REQ_SQ, D.QC_NB, D.QC_SQ "
+            "FROM dbo.LDELIVER AS H "
+            "INNER JOIN dbo.LDELIVER_D AS D ON H.CO_CD = D.CO_CD AND H.ISU_NB = D.ISU_NB "
+            "WHERE H.CO_CD = ? AND H.ISU_DT >= ? AND H.ISU_DT <= ? "
+            "ORDER BY H.CO_CD, D.ISU_NB, D.ISU_SQ"
+        ),
+        "partition": ["H.ISU_DT"],
+        "params": ["co_cd", "start_date", "end_date"],
+        "required": ["co_cd", "start_date", "end_date"],
+        "error": "회사,시작일자,종료일자 모두 선택해야 합니다.",
+        "template": "출고처리_template.xlsx",
+        "start_row": 4,
+        "columns": 36,
+    },
+    "수금등록": {
+        "sql": (
+           "SELECT H.RCP_FG RCPH_FG,H.RCP_DT,H.TR_CD,H.REF_DC,H.PLN_CD,H.REMARK_DC,D.RCP_FG,D.RCPMGTR_CD,D.RCPMG_DC,D.JATA_FG,D.NORMAL_AM,D.BEFORE_AM,"
+            "D.BANK_CD,D.ISU_DT,D.DUE_DT,D.REMARK_DC REMARKD_DC,H.MGMT_CD,D.PJT_CD " 
+            "FROM LRCP H INNER JOIN LRCP_D D ON H.CO_CD = D.CO_CD AND H.RCP_NB =D.RCP_NB "
+            "WHERE H.RCP_FG = '0' AND H.CO_CD = ? AND H.rcp_DT BETWEEN ? AND ? "
+            "ORDER BY H.RCP_NB"
+        ),
+        "partition": ["H.rcp_DT"],
+        "params": ["co_cd", "start_date", "end_date"],
+        "required": ["co_cd", "start_date", "end_date"],
+        "error": "회사,시작일자,종료일자 모두 선택해야 합니다.",
+        "template": "수금등록_template.xlsx",
+        "start_row": 4,
+        "columns": 18,
+    },
+    "생산실적": {
+        "sql": (
+            "SELECT DOC_DT, ITEM_CD, ITEM_QT, MOVEBASELOC_CD, MOVELOC_CD, LOT_NB, PJT_CD,'' MGMT_CD, "
+            "PLN_CD,DOC_CD DOC_DC, BASELOC_CD, LOC_CD, EQUIP_CD "
+            "FROM LORCV_H WHERE CO_CD = ? AND DOC_DT >=  ? AND DOC_DT <= ? "
+            "UNION ALL "
+            "SELECT DOC_DT,PITEM_CD,ITEM_QT,BASELOC_CD,LOC_CD,LOT_NB,PJT_CD,MGMT_CD,PLN_CD,DOC_CD REMARK_DC,WR_WH_CD,WR_LC_CD,EQUIP_CD FROM LPRODUCTION "
+            "WHERE CO_CD = ? AND DOC_DT >= ? AND DOC_DT <= ?"
+        ),
+        "partition": ["DOC_DT", "DOC_DT"],
+        "params": ["co_cd", "start_date", "end_date", "co_cd", "start_date", "end_date"],
+        "required": ["co_cd", "start_date", "end_date"],
+        "error": "회사,시작일자,종료일자 모두 선택해야 합니다.",
+        "template": "생산입고_template.xlsx",
+        "start_row": 4,
+        "columns": 14,
+    },
+    "생산출고": {
+        "sql": (
+            "SELECT U.USE_DT ISU_DT, U.ITEM_CD, U.USE_QT ISU_QT, '' FWH_CD, '' FLC_CD, '' PLN_CD, "
+            "H.DOC_CD WR_CD, H.ITEM_CD ITEMPARENT_CD, '' LOT_NB, U.PJT_CD, U.MGMT_CD, U.REMARK_DC, "
+            "'' WO_CD, '' MATL_SQ, '' OP_NB "
+            "FROM LORCV_H H "
+            "LEFT OUTER JOIN LMTL_USE U ON H.CO_CD = U.CO_CD AND H.DOC_CD = U.WR_CD "
+            "WHERE H.CO_CD = ? AND U.USE_DT >= ? AND  U.USE_DT <= ? "
+            "union all "
+            "SELECT H.DOC_DT,D.CITEM_CD,D.USE_QT,D.BASELOC_CD,D.LOC_CD, '' PLN_CD,D.DOC_CD, H.PITEM_CD,D.LOT_NB,'' PJT_CD,'' MGMT_CD,D.REMARK_DC ,'' WO_CD, '' MATL_SQ, '' OP_NB "
+            "FROM LPRODUCTION H INNER JOIN  LPRODUCTION_D D ON H.CO_CD = D.CO_CD AND H.DOC_CD = D.DOC_CD "
+            "WHERE H.CO_CD = ? AND H.DOC_DT >= ? AND  H.DOC_DT <= ?"
+        ),
+        "partition": ["U.USE_DT", "H.DOC_DT"],
+        "params": ["co_cd", "start_date", "end_date", "co_cd", "start_date", "end_date"],
+        "required": ["co_cd", "start_date", "end_date"],
+        "error": "회사,시작일자,종료일자 모두 선택해야 합니다.",
+        "template": "생산출고_template.xlsx",
+        "start_row": 4,
+        "columns": 16,
+    },
+    "재고조정": {
+        "sql": (
+            "SELECT CASE WHEN H.ADJUST_FG='0' THEN '기초' WHEN H.ADJUST_FG='1' THEN '입고' WHEN H.ADJUST_FG='2' THEN '출고' END ADJUST_FG,H.DIV_CD, "
+            "H.ADJUST_DT, H.WH_CD, H.LC_CD, H.REMARK_DC, H.TR_CD, H.PLN_CD, D.ITEM_CD, "
+            "CASE WHEN H.ADJUST_FG ='0' THEN D.OPEN_QT WHEN H.ADJUST_FG = '1' THEN D.RCV_QT ELSE D.ISU_QT END ADJUST_QT, "
+            "D.ADJUST_UM, D.ADJUST_AM, D.MGMT_CD, D.PJT_CD, D.LOT_NB, D.REMARK_DC REMARKD_DC "
+            "FROM LADJUST H "
+            "INNER JOIN LADJUST_D D ON H.CO_CD = D.CO_cD AND H.ADJUST_NB = D.ADJUST_NB "
+            "WHERE H.CO_CD = ? AND H.ADJUST_DT >= ? AND H.ADJUST_DT <= ? AND ADJUST_FG IN ('0','1','2')"
+        ),
+        "partition": ["H.ADJUST_DT"],
+        "params": ["co_cd", "start_date", "end_date"],
+        "required": ["co_cd", "start_date", "end_date"],
+        "error": "회사,시작일자,종료일자 모두 선택해야 합니다.",
+        "template": "재고조정_template.xlsx",
+        "start_row": 4,
+        "columns": 16,
+    },
+    "재고이동": {
+        "sql": (
+            "SELECT H.MOVE_DT,H.PLN_CD,H.REMARK_DC,D.ITEM_CD,D.MOVE_QT,H.FWH_CD,H.FLC_CD," 
+            "H.TWH_CD,H.TLC_CD,D.LOT_NB,D.PJT_CD,H.MGMT_CD,D.REMARK_DC REMARKD_DC "
+            "FROM LSTKMOVE H INNER JOIN LSTKMOVE_D D ON H.CO_CD = D.CO_CD AND H.MOVE_NB = D.MOVE_NB "
+            "WHERE H.CO_CD = ? AND H.MOVE_DT >= ? AND  H.MOVE_DT <= ?"
+        ),
+        "partition": ["H.MOVE_DT"],
+        "params": ["co_cd", "start_date", "end_date"],
+        "required": ["co_cd", "start_date", "end_date"],
+        "error": "회사,시작일자,종료일자 모두 선택해야 합니다.",
+        "template": "재고이동_template.xlsx",
+        "start_row": 4,
+        "columns": 13,
+    },
+    "회계초기이월": {
+        "sql": (
+            "SELECT GISU,DIV_CD,ACCT_CD,ISU_SQ,DEPT_CD,EMP_CD,ACCT_AM,TR_CD,CT_DEPT,"
+            "'' CASH_CD,PJT_CD,'' M_EMP_CD,'' EXCH_RT,'' EXCH_CD,'' EXCH_AM,'' BL_NO FROM APREV "
+            "WHERE CO_CD = ? AND FILL_DT = LEFT(?,4)+'0101'"
+        ),
+        "params": ["co_cd", "start_date"],
+        "required": ["co_cd", "start_date"],
+        "error": "회사,시작일자,종료일자 모두 선택해야 합니다.",
+        "template": "회계초기이월_template.xlsx",
+        "start_row": 4,
+        "columns": 16,
+    },
+    "급여자료 추출": {
+        "sql": "EXEC sp_GetDynamicPayrollPivot_Fixed ?, ?, ?",
+        "params": ["co_cd", "start_year", "end_year"],
+        "required": ["co_cd", "start_date", "end_date"],
+        "error": "회사, 시작일, 종료일을 모두 선택해야 합니다.",
+        "template": None,   # 급여자료는 템플릿 없이 새 통합문서로 내보냄
+        "start_row": None,
+        "columns": None,    # 급여 항목에 따라 컬럼 수가 달라지는 동적 피벗
+    },
+    "자동전표처리": {
+        "sql": (
+            "SELECT H.DIV_CD AS IN_DIV_CD, H.ISU_DT AS MENU_DT, H.ISU_SQ AS MENU_SQ, D.LN_SQ AS MENU_LN_SQ, "
+            "H.ISU_DOC, H.DOCU_TY, D.DRCR_FG,LEFT(D.ACCT_CD,3) +'00'+ RIGHT(D.ACCT_CD,2) ACCT_CD, D.TR_CD, D.TR_NM, D.ACCT_AM, D.ATTR_CD, D.RMK_DC, "
+            "T.DIV_CD VAT_DIV_CD, H.FILL_DT ISS_DT , D.CT_DEAL TAX_FG, T.NONSUB_TY, T.SUP_AM, T.DUMMY1, T.CASH_AM, "
+            "T.BILL_AM, D.CT_NB,"
+            "CASE WHEN D.CT_DEAL = '24' THEN D.CT_QT ELSE D.CT_AM END CT_AM, T.JEONJA_YN, T.ASSET_AM, T.ASSET_VAT, "
+            "CASE WHEN AV2.ASSET_FG = '1' THEN AV2.ITEM_DC ELSE '' END AS ASSET_FG1, "
+            "CASE WHEN AV2.ASSET_FG = '1' THEN ISNULL(AV2.MATT_CNT, 0) ELSE 0 END AS MATT_CNT1, "
+            "CASE WHEN AV2.ASSET_FG = '1' THEN ISNULL(AV2.SUP_AM, 0) ELSE 0 END AS SUP_AM1, "
+            "CASE WHEN AV2.ASSET_FG = '1' THEN ISNULL(AV2.VAT_AM, 0) ELSE 0 END AS VAT_AM1, "
+            "CASE WHEN AV2.ASSET_FG = '2' THEN AV2.ITEM_DC ELSE '' END AS ASSET_FG2, "
+            "CASE WHEN AV2.ASSET_FG = '2' THEN ISNULL(AV2.MATT_CNT, 0) ELSE 0 END AS MATT_CNT2, "
+            "CASE WHEN AV2.ASSET_FG = '2' THEN ISNULL(AV2.SUP_AM, 0) ELSE 0 END AS SUP_AM2, "
+            "CASE WHEN AV2.ASSET_FG = '2' THEN ISNULL(AV2.VAT_AM, 0) ELSE 0 END AS VAT_AM2, "
+            "CASE WHEN AV2.ASSET_FG = '3' THEN AV2.ITEM_DC ELSE '' END AS ASSET_FG3, "
+            "CASE WHEN AV2.ASSET_FG = '3' THEN ISNULL(AV2.MATT_CNT, 0) ELSE 0 END AS MATT_CNT3, "
+            "CASE WHEN AV2.ASSET_FG = '3' THEN ISNULL(AV2.SUP_AM, 0) ELSE 0 END AS SUP_AM3, "
+            "CASE WHEN AV2.ASSET_FG = '3' THEN ISNULL(AV2.VAT_AM, 0) ELSE 0 END AS VAT_AM3, "
+            "CASE WHEN AV2.ASSET_FG = '4' THEN AV2.ITEM_DC ELSE '' END AS ASSET_FG4, "
+            "CASE WHEN AV2.ASSET_FG = '4' THEN ISNULL(AV2.MATT_CNT, 0) ELSE 0 END AS MATT_CNT4, "
+            "CASE WHEN AV2.ASSET_FG = '4' THEN ISNULL(AV2.SUP_AM, 0) ELSE 0 END AS SUP_AM4, "
+            "CASE WHEN AV2.ASSET_FG = '4' THEN ISNULL(AV2.VAT_AM, 0) ELSE 0 END AS VAT_AM4, "
+            "SB.BILL_NB, SB.ISS_DT ISSUE_DT, SB.DUE_DT, SB.BANK_CD FIN_CD, '' BILLCASH_CD, SB.ISU_NM, SB.ENDORS_NM, "
+            "SB.BILL_FG1, SB.BILL_FG2, SB.DEAL_FG, "
+            "CASE WHEN D.ACCT_CD IN ('13300','26300') THEN LEFT(D.CT_NB,3) + '00' + RIGHT(D.CT_NB,2) ELSE '' END LACCT_CD, CASE WHEN D.FR_DT = '00000000' THEN '' ELSE D.FR_DT END FR_DT, CASE WHEN D.TO_DT='00000000' THEN '' ELSE D.TO_DT END TO_DT, "
+            "CASE WHEN D.ACCT_CD IN ('13300','26300') THEN D.CT_DEAL ELSE '' END CALC_TY, "
+            "CASE WHEN D.DEPTCD_TY = 'C1' THEN D.CT_DEPT ELSE '' END CT_DEPT, "
+            "CASE WHEN D.DEPTCD_TY = 'C2' THEN D.CT_DEPT ELSE '' END CASH_CD, "
+            "CASE WHEN D.USER1_TY = 'L1' THEN D.CT_USER1 ELSE '' END CAR_CD, "
+            "CASE WHEN D.DEPTCD_TY = 'C4' THEN D.CT_DEPT ELSE '' END FI_IN_CD, "
+            "CASE WHEN D.DEPTCD_TY = 'C5' THEN D.CT_DEPT ELSE '' END SEC_CD, "
+            "CASE WHEN D.DEPTCD_TY = 'C9' THEN D.CT_DEPT ELSE '' END LOCAL_CD, "
+            "CASE WHEN D.PJTCD_TY = 'D1' THEN D.PJT_CD ELSE '' END PJT_CD, "
+            "CASE WHEN D.PJTCD_TY = 'D3' THEN D.PJT_CD ELSE '' END WH_CD, "
+            "CASE WHEN D.PJTCD_TY = 'D4' THEN D.PJT_CD ELSE '' END M_EMP_CD, "
+            "CASE WHEN D.PJTCD_TY = 'D5' THEN D.PJT_CD ELSE '' END M_DIV_CD, "
+            "CASE WHEN D.PJTCD_TY = 'D6' THEN D.PJT_CD ELSE '' END ITEMGRP_CD, "
+            "CASE WHEN D.PJTCD_TY = 'D8' THEN D.PJT_CD ELSE '' END PROC_FG, "
+            "CASE WHEN D.CTNB_TY = 'E2' THEN D.CT_NB ELSE '' END BL_NB, "
+            "CASE WHEN D.CTNB_TY = 'E3' THEN D.CT_NB ELSE '' END LC_NB, "
+            "CASE WHEN D.CTNB_TY = 'E4' THEN D.CT_NB ELSE '' END STOCK_NB, "
+            "CASE WHEN D.CTNB_TY = 'E5' THEN LEFT(D.CT_NB,3) + '00' + RIGHT(D.CT_NB,2) ELSE ''  END SUB_ACCT, "
+            "CASE WHEN D.CTNB_TY = 'E6' THEN D.CT_NB ELSE '' END ITEM_CD, "
+            "CASE WHEN D.CTNB_TY = 'E7' THEN D.CT_NB ELSE '' END ASSET_CD, "
+            "CASE WHEN D.CTNB_TY = 'E8' THEN D.CT_NB ELSE '' END LOAN_NB, "
+            "CASE WHEN D.CTNB_TY = 'E9' THEN D.CT_NB ELSE '' END LEND_NB, "
+            "CASE WHEN D.CTNB_TY = 'EA' THEN D.CT_NB ELSE '' END MA_NB, "
+            "CASE WHEN D.FRDT_TY = 'F1' THEN D.FR_DT ELSE '' END OCCUR_DT, "
+            "CASE WHEN D.FRDT_TY = 'F2' THEN D.FR_DT ELSE '' END START_DT, "
+            "CASE WHEN D.FRDT_TY = 'F3' THEN D.FR_DT ELSE '' END REQ_DT, "
+            "CASE WHEN D.TODT_TY = 'G1' THEN D.TO_DT ELSE '' END EXP_DT, "
+            "CASE WHEN D.TODT_TY = 'G2' THEN D.TO_DT ELSE '' END END_DT, "
+            "CASE WHEN D.TODT_TY = 'G3' THEN D.TO_DT ELSE '' END REPAY_DT, "
+            "CASE WHEN D.QT_TY = 'H1' THEN D.CT_QT ELSE 0 END CT_QT, "
+            "CASE WHEN D.QT_TY = 'H2' THEN D.CT_QT ELSE 0 END REPAY_QT, "
+            "CASE WHEN D.QT_TY = 'H3' THEN D.CT_QT ELSE 0 END NDEDUCTION_AM, "
+            "CASE WHEN D.QT_TY = 'H5' THEN D.CT_QT ELSE 0 END EXCH_RT, "
+            "CASE WHEN D.QT_TY = 'H6' THEN D.CT_QT ELSE 0 END CARDRCP_AM, "
+            "CASE WHEN D.AM_TY = 'I2' THEN D.CT_AM ELSE 0 END PARV_AM, "
+            "CASE WHEN D.AM_TY = 'I3' THEN D.CT_AM ELSE 0 END STANDARD_AM, "
+            "CASE WHEN D.AM_TY = 'I4' THEN D.CT_AM ELSE 0 END UNIT_AM, "
+            "CASE WHEN D.AM_TY = 'I5' THEN D.CT_AM ELSE 0 END FORE_AM, "
+            "CASE WHEN D.AM_TY = 'I6' THEN D.CT_AM ELSE 0 END PAY_AM, "
+            "CASE WHEN D.RT_TY = 'J1' THEN D.CT_RT ELSE 0 END INTER_RT, "
+            "CASE WHEN D.RT_TY = 'J2' THEN D.CT_RT ELSE 0 END DISCOUNT_RT, "
+            "CASE WHEN D.RT_TY = 'J3' THEN D.CT_RT ELSE 0 END FEE_RT, "
+            "CASE WHEN D.DEAL_TY = 'K1' THEN D.CT_DEAL ELSE '' END CT_DEAL, "
+            "CASE WHEN D.DEAL_TY = 'K2' THEN D.CT_DEAL ELSE '' END EXCH_CD, "
+            "CASE WHEN D.DEAL_TY = 'K3' THEN D.CT_DEAL ELSE '' END RECBILL_FG, "
+            "CASE WHEN D.DEAL_TY = 'K4' THEN D.CT_DEAL ELSE '' END PAYBILL_FG, "
+            "CASE WHEN D.DEAL_TY = 'K6' THEN D.CT_DEAL ELSE '' END OTHER_FG, "
+            "CASE WHEN D.DEAL_TY = 'K7' THEN D.CT_DEAL ELSE '' END COLLECT_FG, "
+            "CASE WHEN D.DEAL_TY = 'K8' THEN D.CT_DEAL ELSE '' END EVALUATION_FG, "
+            "CASE WHEN D.DEAL_TY = 'K9' THEN D.CT_DEAL ELSE '' END CALC_FG, "
+            "CT_USER1 USERL_TY1, '' USERL_TY2, '' USERL_TY3, '' USERL_TY4, '' USERL_TY5, '' USERL_TY6, '' USERL_TY7, '' USERL_TY8, '' USERL_TY9, "
+            "CT_USER2 USERM_TY1, '' USERM_TY2, '' USERM_TY3, '' USERM_TY4, '' USERM_TY5, '' USERM_TY6, '' USERM_TY7, '' USERM_TY8, '' USERM_TY9, "
+            "'' CEO_NM, '' REG_NB, '' BUSINESS, '' JONGMOK, '' DIV_ADDR1, '' ADDR2, '' TEL, '' EMAIL, '' EMPGRP_CD, '' TRCHARGE_EMP, "
+            "'' TRCHARGE_EMAIL, '' TRCHARGE_DEPT, '' TRCHARGE_TEL, '' TRCHARGE_HP, '' ISS_NO, d.DIV_CD2, d.MGT_CD, d.BOTTOM_CD, d.BGT_CD, d.RMK_NB "
+            "FROM ADOCUH H "
+            "INNER JOIN ADOCUD D ON H.CO_CD = D.CO_CD AND H.ISU_DT = D.ISU_DT AND H.ISU_SQ = D.ISU_SQ "
+            "LEFT OUTER JOIN ATAX T ON D.CO_CD = T.CO_CD AND D.ISU_DT = T.ISU_DT AND D.ISU_SQ = T.ISU_SQ AND D.LN_SQ = T.LN_SQ "
+            "LEFT OUTER JOIN AVASSET2 AV2 ON D.CO_CD = AV2.CO_CD AND D.ISU_DT = AV2.ISU_DT AND D.ISU_SQ = AV2.ISU_SQ AND D.LN_SQ = AV2.LN_SQ "
+            "LEFT OUTER JOIN SBILL SB ON D.CO_CD = SB.CO_CD AND D.ISU_DT = SB.ISU_DT AND D.ISU_SQ = SB.ISU_SQ AND D.LN_SQ = SB.LN_SQ "
+            "WHERE D.CO_CD = ? AND CONVERT(DATE, H.ISU_DT, 112) >= ? AND H.ISU_DT <= ? " 
+            "ORDER BY H.ISU_DT, H.ISU_SQ, D.LN_SQ"
+        ),
+        "partition": ["H.ISU_DT"],
+        "params": ["co_cd", "start_date", "end_date"],
+        "required": ["co_cd", "start_date", "end_date"],
+        "error": "회사,시작일자,종료일자 모두 선택해야 합니다.",
+        "template": "자동전표처리_template.xlsx",
+        "start_row": 4,
+        "columns": 142,
+    },
+}
+
+
+def _bind_query_params(entry, inputs):
+    """레지스트리 항목의 params 순서대로 바인딩 값 목록을 만듭니다."""
+    return [_QUERY_PARAM_BINDERS[token](inputs) for token in entry["params"]]
+
+
+def _sql_depths(sql):
+    """문자(위치)별 괄호 깊이. 문자열 리터럴 안은 None"""
+    depths = []
+    depth = 0
+    in_quote = False
+    for ch in sql:
+        if in_quote:
+            depths.append(None)
+            if ch == "'":
+                in_quote = False
+            continue
+        if ch == "'":
+            in_quote = True
+            depths.append(None)
+            continue
+        if ch == ')':
+            depth -= 1
+        depths.append(depth)
+        if ch == '(':
+            depth += 1
+    return depths
+
+
+def _find_keyword(sql, depths, pattern, depth=0, start=0, end=None):
+    """주어진 괄호 깊이에서 정규식 pattern 이 처음 나오는 위치 (없으면 -1)"""
+    for match in re.finditer(pattern, sql[:end] if end is not None else sql, re.I):
+        if match.start() >= start and depths[match.start()] == depth:
+            return match.start()
+    return -1
+
+
+def _count_select_columns(sql):
+    """SELECT 목록의 컬럼 수 (최상위 괄호/문자열 밖의 콤마 기준). 판단할 수 없으면 None"""
+    depths = _sql_depths(sql)
+    select = _find_keyword(sql, depths, r'\bSELECT\b')
+    from_ = _find_keyword(sql, depths, r'\bFROM\b', start=select)
+    if select < 0 or from_ < 0:
+        return None
+    return sum(1 for i in range(select, from_) if sql[i] == ',' and depths[i] == 0) + 1
+
+
+_CONSTANT_LITERAL = r"(?:N?'(?:[^']|'')*'|NULL|[-+]?\d+(?:\.\d+)?)"
+_CONSTANT_ALIAS = r"(?:\[[^\]]*\]|'[^']*'|\w+)"
+_CONSTANT_ITEM_RE = re.compile(
+    rf"\s*(?:{_CONSTANT_LITERAL}(?:\s+(?:AS\s+)?{_CONSTANT_ALIAS})?|{_CONSTANT_ALIAS}\s*=\s*{_CONSTANT_LITERAL})\s*", re.I)
+
+
+def _constant_select_positions(sql):
+    """SELECT 목록에서 상수('', '한국어', NULL 등)로 채우는 컬럼의 위치(1부터) 집합. 판단할 수 없으면 빈 집합"""
+    depths = _sql_depths(sql)
+    select = _find_keyword(sql, depths, r'\bSELECT\b')
+    from_ = _find_keyword(sql, depths, r'\bFROM\b', start=select)
+    if select < 0 or from_ < 0:
+        return set()
+    head = re.match(r'SELECT\s+(?:DISTINCT\s+)?(?:TOP\s+\d+\s+)?', sql[select:], re.I)
+    items, start = [], select + head.end()
+    for i in range(start, from_):
+        if sql[i] == ',' and depths[i] == 0:
+            items.append(sql[start:i])
+            start = i + 1
+    items.append(sql[start:from_])
+    return {position for position, item in enumerate(items, start=1) if _CONSTANT_ITEM_RE.fullmatch(item)}
+
+
+def _template_header_width(template, start_row):
+    """데이터 시작 행 위(헤더 영역)에서 값이 있는 마지막 컬럼 번호"""
+    width = 0
+    for row_number, row_xml in template["rows"]:
+        if row_number >= start_row:
+            break
+        for cell in _CELL_RE.finditer(row_xml):
+            if re.search(r'<v>[^<]|<t\b[^>]*>[^<]', cell.group(0)):
+                width = max(width, column_index_from_string(cell.group(1)))
+    return width
+
+
+def _validate_query_registry():
+    """시작 시 레지스트리를 검사합니다. 템플릿 누락/컬럼 수 불일치 등은 바로 실패시킵니다.
+
+    (검사하면서 고속 기록기용 템플릿도 미리 해석해 캐시에 올려 둡니다.)
+    """
+    problems = []
+    for query_name, entry in QUERY_REGISTRY.items():
+        for token in entry["params"]:
+            if token not in _QUERY_PARAM_BINDERS:
+                problems.append(f"{query_name}: 알 수 없는 파라미터 '{token}'")
+            elif _QUERY_PARAM_INPUTS[token] not in entry["required"]:
+                problems.append(f"{query_name}: 파라미터 '{token}' 의 입력값이 required 에 없습니다.")
+        if entry["sql"].count('?') != len(entry["params"]):
+            problems.append(f"{query_name}: SQL 의 ? 개수({entry['sql'].count('?')})와 params 개수({len(entry['params'])})가 다릅니다.")
+
+        if entry.get("partition"):
+            problems.extend(f"{query_name}: {problem}" for problem in _partition_problems(entry))
+
+        if entry["template"] is None:
+            continue
+        template_path = os.path.join(TEMPLATE_FOLDER, entry["template"])
+        if not os.path.exists(template_path):
+            problems.append(f"{query_name}: 템플릿 파일({entry['template']})이 없습니다.")
+            continue
+        try:
+            template = _get_xlsx_template(template_path)
+        except Exception as e:
+            problems.append(f"{query_name}: 템플릿 파일({entry['template']})을 읽을 수 없습니다. ({e})")
+            continue
+        width = _template_header_width(template, entry["start_row"])
+        if width != entry["columns"]:
+            problems.append(f"{query_name}: 템플릿 컬럼 수({width})가 설정({entry['columns']})과 다릅니다.")
+
+        # 쿼리 결과가 템플릿보다 넓으면 헤더 밖으로 값이 써집니다. (기존 쿼리 중 일부가 해당되어 경고만 남김)
+        select_columns = _count_select_columns(entry["sql"])
+        if select_columns is not None and select_columns > entry["columns"]:
+            app.logger.warning(f"{query_name}: 쿼리 컬럼 수({select_columns})가 템플릿 컬럼 수({entry['columns']})보다 많습니다.")
+
+    problems.extend(_integrity_rule_problems())
+    if problems:
+        raise RuntimeError("쿼리 레지스트리 설정 오류:\n" + "\n".join(problems))
+
+# --- 기간 분할 병렬 조회 ---
+# 날짜 범위가 있는 쿼리를 PARTITION_MONTHS 개월 단위 구간으로 나눠 여러 연결에서 동시에 실행하고,
+# 쿼리의 ORDER BY 순서대로 합쳐 하나의 Parquet 로 저장합니다. (구간마다 배치 하나씩만 메모리에 올림)
+# 구간 조건은 원래 WHERE 조건에 AND 로 덧붙이므로 (원래 기간 조건은 그대로) 결과 행 집합은 단일 조회와 같습니다.
+#   - 구간: (-∞, b1), [b1, b2), ..., [bk, +∞) 와 날짜로 변환되지 않는 값(TRY_CONVERT IS NULL)
+#   - ORDER BY 가 없거나 분할 날짜 컬럼으로 시작하면 구간 순서대로 이어 붙임. 이때 NULL 은 (SQL Server 에서
+#     가장 작은 값) 맨 앞/뒤에 두고, 날짜로 변환되지 않는 문자열은 정렬 위치를 알 수 없으므로 따로 조회해
+#     한 건이라도 있으면 단일 조회로 다시 가져옴
+#   - 그 외에는 구간 쿼리마다 ORDER BY 를 그대로 두고 ORDER BY 식을 숨은 컬럼으로 함께 조회해, 서버가 정렬한
+#     구간 파일들을 그 키로 k-way 병합 (NULL 은 가장 작은 값, 문자열은 기본 콜레이션(*_CI_*)처럼 대소문자와
+#     끝 공백을 무시하고 비교)
+PARTITION_MONTHS = int(os.environ.get('PARTITION_MONTHS', '1'))
+PARTITION_CONCURRENCY = int(os.environ.get('PARTITION_CONCURRENCY', '4'))
+_SORT_KEY_PREFIX = '__sort_'
+
+
+def _partition_insert_positions(entry):
+    """end_date 가 바인딩되는 ? 바로 뒤 위치 목록"""
+    depths = _sql_depths(entry["sql"])
+    marks = [i for i, ch in enumerate(entry["sql"]) if ch == '?' and depths[i] is not None]
+    return [marks[n] + 1 for n, token in enumerate(entry["params"]) if token == "end_date"]
+
+
+def _order_by_items(sql):
+    """최상위 ORDER BY 항목 [(식, 내림차순 여부)]"""
+    depths = _sql_depths(sql)
+    position = _find_keyword(sql, depths, r'\bORDER\s+BY\b')
+    if position < 0:
+        return []
+    body = sql[position:]
+    body = body[re.match(r'ORDER\s+BY\s*', body, re.I).end():]
+    items = []
+    for item in body.split(','):
+        words = item.split()
+        if not words:
+            continue
+        descending = words[-1].upper() == 'DESC'
+        if words[-1].upper() in ('ASC', 'DESC'):
+            words = words[:-1]
+        items.append((' '.join(words), descending))
+    return items
+
+
+def _partition_problems(entry):
+    """기간 분할이 결과를 바꾸지 않는 형태인지 검사합니다. (레지스트리 검사용)"""
+    sql = entry["sql"]
+    depths = _sql_depths(sql)
+    positions = _partition_insert_positions(entry)
+    problems = []
+    if len(positions) != len(entry["partition"]):
+        return [f"partition 컬럼 수({len(entry['partition'])})가 end_date 바인딩 수({len(positions)})와 다릅니다."]
+    for position in positions:
+        # 덧붙이는 AND 조건이 WHERE 절 전체에 걸리려면 같은 깊이에 OR 가 없어야 함
+        depth = depths[position - 1]
+        where = max((m.start() for m in re.finditer(r'\bWHERE\b', sql[:position], re.I) if depths[m.start()] == depth), default=-1)
+        end = len(sql)
+        for i in range(position, len(sql)):
+            if depths[i] is not None and depths[i] < depth:
+                end = i
+                break
+        stop = _find_keyword(sql, depths, r'\b(ORDER|GROUP|HAVING|UNION)\b', depth=depth, start=position, end=end)
+        end = stop if stop >= 0 else end
+        if where < 0 or _find_keyword(sql, depths, r'\bOR\b', depth=depth, start=where, end=end) >= 0:
+            problems.append("기간 조건이 있는 WHERE 절을 찾을 수 없거나 OR 조건이 있어 기간 분할할 수 없습니다.")
+    if _partition_sort_keys(entry):
+        if re.match(r'\s*SELECT\s+DISTINCT\b', sql, re.I):
+            problems.append("SELECT DISTINCT 에는 정렬용 컬럼을 추가할 수 없어 기간 분할할 수 없습니다.")
+        for expression, _ in _order_by_items(sql):
+            if not re.fullmatch(r'[\w.\[\]]+', expression):
+                problems.append(f"ORDER BY 항목({expression})은 기간 분할 병합에 사용할 수 없습니다.")
+    return problems
+
+
+def _partition_windows(spec):
+    """조회 기간을 나눈 구간 목록 [(시작, 끝)] (None 은 열린 경계). 나눌 필요가 없으면 None"""
+    if not spec.get("partition"):
+        return None
+    try:
+        start = datetime.date.fromisoformat(str(spec["start_date"])[:10])
+        end = datetime.date.fromisoformat(str(spec["end_date"])[:10])
+    except ValueError:
+        return None
+    months = max(1, spec.get("partition_months") or PARTITION_MONTHS)
+    boundaries = []
+    year, month = start.year, start.month
+    while True:
+        month += months
+        year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+        boundary = datetime.date(year, month, 1)
+        if boundary > end:
+            break
+        boundaries.append(boundary)
+    if not boundaries:
+        return None
+    edges = [None] + boundaries + [None]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def _partition_query(spec, window):
+    """구간 조건을 덧붙인 (sql, params).
+
+    window 가 'undated' 면 날짜로 변환되지 않는 행 전체, 'null' 이면 그중 NULL, 'invalid' 면 NULL 이 아닌 행
+    """
+    sql, params = spec["sql"], spec["params"]
+    pieces, new_params = [], []
+    last = 0
+    positions = _partition_insert_positions({"sql": sql, "params": spec["param_tokens"]})
+    inserts = dict(zip(positions, spec["partition"]))
+    depths = _sql_depths(sql)
+    values = iter(params)
+    for mark in (i for i, ch in enumerate(sql) if ch == '?' and depths[i] is not None):
+        new_params.append(next(values))
+        column = inserts.get(mark + 1)
+        if column is None:
+            continue
+        converted = f"TRY_CONVERT(DATE, {column})"
+        if window == 'undated':
+            condition = f" AND {converted} IS NULL"
+        elif window == 'null':
+            condition = f" AND {column} IS NULL"
+        elif window == 'invalid':
+            condition = f" AND {column} IS NOT NULL AND {converted} IS NULL"
+        else:
+            lower, upper = window
+            condition = ""
+            if lower is not None:
+                condition += f" AND {converted} >= ?"
+                new_params.append(lower)
+            if upper is not None:
+                condition += f" AND {converted} < ?"
+                new_params.append(upper)
+        pieces.append(sql[last:mark + 1] + condition)
+        last = mark + 1
+    pieces.append(sql[last:])
+    return ''.join(pieces), new_params
+
+
+def _partition_sort_keys(spec):
+    """구간 파일을 병합할 때 비교할 ORDER BY 항목. ORDER BY 가 없거나 분할 날짜 컬럼으로 시작하면 이어 붙이기만 하면 되므로 빈 목록"""
+    items = _order_by_items(spec["sql"])
+    if not items or items[0][0].lower() == spec["partition"][0].lower():
+        return []
+    return items
+
+
+def _inject_sort_columns(sql, sort_keys):
+    """첫 SELECT 목록 끝에 ORDER BY 식을 숨은 컬럼으로 추가합니다."""
+    depths = _sql_depths(sql)
+    from_ = _find_keyword(sql, depths, r'\bFROM\b')
+    hidden = ''.join(f", {expression} AS [{_SORT_KEY_PREFIX}{n}]" for n, (expression, _) in enumerate(sort_keys))
+    return sql[:from_].rstrip() + hidden + ' ' + sql[from_:]
+
+
+def _run_window_queries(spec, queries, progress=_no_progress):
+    """[(sql, params, 저장 경로)] 를 여러 연결에서 동시에 조회합니다. 반환값은 쿼리별 _stream_query_to_parquet 결과"""
+    rows_by_query = [0] * len(queries)
+    progress_lock = threading.Lock()
+
+    def run_query(n):
+        sql, params, path = queries[n]
+
+        def on_rows(rows):
+            with progress_lock:
+                rows_by_query[n] = rows
+                progress(stage='fetching', rows=sum(rows_by_query))
+
+        with _db_connection(spec["db_config"], spec["query_name"], spec.get("cancel")) as cnxn:
+            return _stream_query_to_parquet(cnxn, sql, params, path, on_rows=on_rows, query_name=spec["query_name"],
+                                            cancel=spec.get("cancel"))
+
+    progress(stage='querying')
+    concurrency = max(1, min(PARTITION_CONCURRENCY, DB_POOL_MAX_PER_TARGET, len(queries)))
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='partition') as pool:
+        futures = [pool.submit(run_query, n) for n in range(len(queries))]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+class _Descending:
+    """내림차순 ORDER BY 항목의 병합 비교용 값"""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def _merge_key_table(table, key_names):
+    """정렬 키 컬럼을 SQL Server 정렬처럼 비교할 수 있게 바꾼 표 (키마다 NULL 여부, 값)
+
+    문자열은 대소문자/끝 공백을 무시하도록 소문자 + 끝 공백 제거. (UTF-8 바이트 순서 = 코드 포인트 순서이므로
+    Arrow 정렬과 파이썬 비교가 같은 결과)
+    """
+    columns = {}
+    for n, name in enumerate(key_names):
+        column = table.column(name)
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            column = pc.utf8_rtrim(pc.utf8_lower(column), characters=' ')
+        columns[f"valid{n}"] = pc.is_valid(column)
+        columns[f"value{n}"] = column
+    return pa.table(columns)
+
+
+def _merge_sorted_window_files(paths, filepath, sort_keys):
+    """ORDER BY 로 정렬된 구간 파일들을 숨은 정렬 컬럼 기준으로 k-way 병합해 filepath 에 저장합니다.
+
+    구간마다 FETCH_BATCH_SIZE 행 배치 하나씩만 읽습니다. 매 회차 각 구간의 현재 배치 마지막 키 중 가장 작은 값까지를
+    모든 구간에서 잘라 모아 정렬해 씁니다. ORDER BY 키가 같은 행끼리의 순서는 SQL Server 와 마찬가지로 정해지지 않습니다.
+    반환값: (컬럼, 미리보기)
+    """
+    key_names = [f"{_SORT_KEY_PREFIX}{n}" for n in range(len(sort_keys))]
+    schema = pq.read_schema(paths[0])
+    output_schema = pa.schema([field for field in schema if field.name not in key_names])
+    order = []
+    for n, (_, descending) in enumerate(sort_keys):
+        # NULL 은 가장 작은 값: 오름차순이면 앞, 내림차순이면 뒤
+        direction = "descending" if descending else "ascending"
+        order += [(f"valid{n}", direction), (f"value{n}", direction)]
+
+    def batches(path):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=FETCH_BATCH_SIZE):
+            table = pa.Table.from_batches([batch])
+            if table.schema != schema:
+                table = table.cast(schema)
+            yield table.drop_columns(key_names), _merge_key_table(table, key_names)
+
+    def row_key(keys, index):
+        values = keys.slice(index, 1).to_pylist()[0]
+        key = []
+        for n, (_, descending) in enumerate(sort_keys):
+            value = (1, values[f"value{n}"]) if values[f"valid{n}"] else (0,)
+            key.append(_Descending(value) if descending else value)
+        return tuple(key)
+
+    def rows_through(keys, bound):
+        """정렬된 keys 에서 bound 이하인 앞쪽 행 수"""
+        low, high = 0, keys.num_rows
+        while low < high:
+            middle = (low + high) // 2
+            if bound < row_key(keys, middle):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    sources = [batches(path) for path in paths]
+    current = [None] * len(sources)   # 구간별 아직 쓰지 않은 (데이터, 키)
+    preview = []
+    with pq.ParquetWriter(filepath, output_schema) as writer:
+        while True:
+            for n, source in enumerate(sources):
+                while source is not None and (current[n] is None or current[n][1].num_rows == 0):
+                    current[n] = next(source, None)
+                    if current[n] is None:
+                        sources[n] = source = None
+            active = [n for n in range(len(sources)) if current[n] is not None]
+            if not active:
+                break
+            bound = min(row_key(current[n][1], current[n][1].num_rows - 1) for n in active)
+            data_parts, key_parts = [], []
+            for n in active:
+                data, keys = current[n]
+                count = rows_through(keys, bound)
+                if count:
+                    data_parts.append(data.slice(0, count))
+                    key_parts.append(keys.slice(0, count))
+                    current[n] = (data.slice(count), keys.slice(count))
+            keys = pa.concat_tables(key_parts)
+            table = pa.concat_tables(data_parts).take(pc.sort_indices(keys, sort_keys=order))
+            writer.write_table(table)
+            if len(preview) < PREVIEW_ROWS:
+                preview.extend(table.slice(0, PREVIEW_ROWS - len(preview)).to_pylist())
+    return output_schema.names, preview
+
+
+def _merge_window_files(paths, filepath, sort_keys=()):
+    """구간별 Parquet 파일을 합쳐 filepath 에 저장합니다. 반환값: (컬럼, 미리보기)
+
+    sort_keys 가 있으면 그 키로 k-way 병합하고, 없으면 순서대로 행 그룹 단위로 이어 붙입니다.
+    """
+    if sort_keys:
+        return _merge_sorted_window_files(paths, filepath, sort_keys)
+    schema = pq.read_schema(paths[0])
+    preview = []
+    with pq.ParquetWriter(filepath, schema) as writer:
+        for path in paths:
+            part = pq.ParquetFile(path)
+            for group in range(part.num_row_groups):
+                table = part.read_row_group(group)
+                if table.schema != schema:
+                    # 다른 시점에 저장된 구간은 (빈 결과의 문자열 컬럼 등) 타입이 다를 수 있음
+                    table = table.cast(schema)
+                writer.write_table(table)
+                if len(preview) < PREVIEW_ROWS:
+                    preview.extend(table.slice(0, PREVIEW_ROWS - len(preview)).to_pylist())
+    return schema.names, preview
+
+
+def _partition_descending(spec):
+    """ORDER BY 가 (분할 날짜 컬럼) 내림차순인지"""
+    items = _order_by_items(spec["sql"])
+    return bool(items) and items[0][1]
+
+
+def _fetch_partitioned(spec, windows, filepath, progress=_no_progress):
+    """구간별로 동시에 조회해 filepath 에 합쳐 저장합니다. 반환값은 _stream_query_to_parquet 과 같고,
+    구간을 이어 붙여서는 정렬 순서를 지킬 수 없으면 (날짜로 변환되지 않는 값) None
+    """
+    sort_keys = _partition_sort_keys(spec)
+    concatenated = bool(_order_by_items(spec["sql"])) and not sort_keys   # 분할 날짜 컬럼 순서로 이어 붙임
+    if not concatenated:
+        ordered = ['undated'] + windows
+    elif _partition_descending(spec):
+        ordered = list(reversed(windows)) + ['null', 'invalid']
+    else:
+        ordered = ['null'] + windows + ['invalid']
+    base_sql = _inject_sort_columns(spec["sql"], sort_keys) if sort_keys else spec["sql"]
+    part_paths = [f"{filepath}.w{n}.parquet" for n in range(len(ordered))]
+    queries = [_partition_query(dict(spec, sql=base_sql), window) + (path,) for window, path in zip(ordered, part_paths)]
+
+    app.logger.info(f"기간 분할 조회: 구간 {len(ordered)}개, 정렬 병합 {'예' if sort_keys else '아니오'}")
+    try:
+        results = _run_window_queries(spec, queries, progress)
+        if concatenated and results[-1][0]:
+            # 날짜가 아닌 문자열이 서버 정렬에서 어디에 오는지 알 수 없으므로 순서를 지키려면 한 번에 조회
+            app.logger.warning(f"{spec['query_name']}: 날짜로 변환되지 않는 {spec['partition'][0]} 값 "
+                               f"{results[-1][0]}건이 있어 단일 조회로 다시 가져옵니다.")
+            return None
+        merge_paths = part_paths[:-1] if concatenated else part_paths   # 'invalid' 구간은 비어 있음 (파일 정리는 part_paths 로)
+        total_rows = sum(result[0] for result in results)
+        columns, preview = _merge_window_files(merge_paths, filepath, sort_keys)
+        return total_rows, columns, preview
+    finally:
+        for path in part_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+# --- 증분 데이터셋 (회사별 월 단위 Parquet) ---
+# fetch_mode=incremental 이면 기간 분할 대상 쿼리의 결과를 DATASET_DIR/<대상 DB>/<쿼리>/<회사>/<YYYY-MM>.parquet
+# 로 남겨 두고, 다시 조회할 때는 없거나 오래된(stale) 달만 DB 에서 가져와 나머지는 디스크에서 읽어 합칩니다.
+#   - 조회 기간에 온전히 들어가는 달만 저장/재사용하고, 기간 경계에 걸친 달은 매번 조회
+#   - 달을 그 달의 시작~말일 기간으로 조회해 저장하므로 조회 기간이 달라도 같은 파일을 재사용
+#   - 마감 전에 조회한 달(당월 등)은 말일 + DATASET_SETTLE_DAYS 일 이후에 다시 조회할 때까지 stale
+#   - 요청의 stale_months(["2024-03", ...]) 로 지정한 달은 다시 조회, force_refresh 면 전체를 다시 조회
+#   - 쿼리 SQL 이 바뀌면(레지스트리 수정) 저장된 달은 모두 stale
+#   - 날짜로 변환되지 않는 행(TRY_CONVERT IS NULL)은 기간 조건을 만족하지 않으므로 포함하지 않음
+#   - 달 파일은 기간 분할과 같은 방식으로 합침 (ORDER BY 가 분할 날짜 컬럼으로 시작하지 않으면 숨은 정렬
+#     컬럼과 함께 저장해 두고 k-way 병합)
+DATASET_DIR = os.environ.get('DATASET_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dataset'))
+DATASET_SETTLE_DAYS = int(os.environ.get('DATASET_SETTLE_DAYS', '0'))
+
+
+def _dataset_months(spec):
+    """조회 기간이 걸친 달 목록 [(달 시작일, 다음 달 시작일, 기간에 온전히 포함되는지)]. 대상이 아니면 None"""
+    if not spec.get("partition"):
+        return None
+    try:
+        start = datetime.date.fromisoformat(str(spec["start_date"])[:10])
+        end = datetime.date.fromisoformat(str(spec["end_date"])[:10])
+    except ValueError:
+        return None
+    months = []
+    month_start = start.replace(day=1)
+    while month_start <= end:
+        next_start = (month_start + timedelta(days=31)).replace(day=1)
+        months.append((month_start, next_start, start <= month_start and next_start - timedelta(days=1) <= end))
+        month_start = next_start
+    return months
+
+
+def _dataset_folder(spec):
+    """대상 DB(서버/DB/계정) / 쿼리 / 회사별 데이터셋 폴더"""
+    db_config = spec["db_config"]
+    target = (db_config.get('server'), db_config.get('database'), db_config.get('uid'))
+    safe = lambda value: re.sub(r'[^\w-]', '_', str(value))
+    return os.path.join(DATASET_DIR, hashlib.sha256(repr(target).encode('utf-8')).hexdigest()[:16],
+                        safe(spec["query_name"]), safe(spec["co_cd"]))
+
+
+def _dataset_month_fresh(path, sql_hash, next_start):
+    """저장된 달 파일을 그대로 쓸 수 있는지 (같은 SQL 로, 마감 후에 조회했는지)"""
+    try:
+        with open(path[:-len('.parquet')] + '.json', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if meta.get("sql_hash") != sql_hash or not os.path.exists(path):
+        return False
+    settled = datetime.datetime.combine(next_start, datetime.time()) + timedelta(days=DATASET_SETTLE_DAYS)
+    return datetime.datetime.fromisoformat(meta["fetched_at"]) >= settled
+
+
+def _fetch_incremental(spec, months, filepath, progress=_no_progress):
+    """없거나 stale 인 달만 조회해 데이터셋을 갱신하고, 조회 기간의 달을 합쳐 filepath 에 저장합니다."""
+    sort_keys = _partition_sort_keys(spec)
+    base_sql = _inject_sort_columns(spec["sql"], sort_keys) if sort_keys else spec["sql"]
+    sql_hash = hashlib.sha256(base_sql.encode('utf-8')).hexdigest()
+    folder = _dataset_folder(spec)
+    os.makedirs(folder, exist_ok=True)
+    stale_months = set(spec.get("stale_months") or ())
+    if _partition_descending(spec) and not sort_keys:
+        months = list(reversed(months))
+
+    paths, queries, stored = [], [], []
+    fetched_at = datetime.datetime.now().isoformat(timespec='seconds')
+    for n, (month_start, next_start, full) in enumerate(months):
+        window = (month_start, next_start)
+        if not full:
+            # 기간 경계에 걸친 달: 요청 기간 그대로 조회하고 저장하지 않음
+            path = f"{filepath}.m{n}.parquet"
+            queries.append(_partition_query(dict(spec, sql=base_sql), window) + (path,))
+            paths.append(path)
+            continue
+        key = month_start.strftime('%Y-%m')
+        path = os.path.join(folder, f"{key}.parquet")
+        paths.append(path)
+        if (not spec.get("refresh_dataset") and key not in stale_months
+                and _dataset_month_fresh(path, sql_hash, next_start)):
+            continue
+        inputs = {"co_cd": spec["co_cd"], "start_date": month_start.isoformat(),
+                  "end_date": (next_start - timedelta(days=1)).isoformat()}
+        month_spec = dict(spec, sql=base_sql, params=_bind_query_params({"params": spec["param_tokens"]}, inputs))
+        staging = f"{path}.{uuid.uuid4().hex}.tmp"
+        queries.append(_partition_query(month_spec, window) + (staging,))
+        stored.append((staging, path))
+
+    reused = sum(1 for _, _, full in months if full) - len(stored)
+    app.logger.info(f"증분 조회: {len(months)}개월 중 저장분 {reused}개월 재사용, {len(queries)}개 구간 조회")
+    try:
+        if queries:
+            _run_window_queries(spec, queries, progress)
+        for staging, path in stored:
+            # 파일 교체 후 메타데이터를 기록하므로, 중간에 실패하면 다음 조회에서 다시 가져옴
+            os.replace(staging, path)
+            meta_path = path[:-len('.parquet')] + '.json'
+            with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({"sql_hash": sql_hash, "fetched_at": fetched_at}, f)
+            os.replace(meta_path + '.tmp', meta_path)
+        total_rows = sum(pq.ParquetFile(path).metadata.num_rows for path in paths)
+        columns, preview = _merge_window_files(paths, filepath, sort_keys)
+        return total_rows, columns, preview
+    finally:
+        for path in [path for path in paths if path.startswith(f"{filepath}.m")] + [staging for staging, _ in stored]:
+            if os.path.exists(path):
+                os.remove(path)
 
 # --- 웹 페이지 및 API 기능 정의 ---
 
@@ -35,12 +1726,10 @@ def get_companies():
     db_config = request.json.get('db_config')
     if not db_config:
         return jsonify({"error": "DB 정보가 없습니다."}), 400
+    refresh = bool(request.json.get('refresh'))  # [신규] true 면 캐시를 무시하고 다시 조회
     try:
-        conn_str = (f'DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={db_config["server"]};DATABASE={db_config["database"]};UID={db_config["uid"]};PWD={db_config["password"]};TrustServerCertificate=yes;')
-        with pyodbc.connect(conn_str, timeout=10) as cnxn:
-            company_df = pd.read_sql("SELECT co_cd, co_nm FROM sco ORDER BY co_nm", cnxn)
-            companies = company_df.to_dict(orient='records')
-            return jsonify({"companies": companies})
+        companies, cached = _load_companies(db_config, refresh)
+        return jsonify({"companies": companies, "cached": cached})
     except pyodbc.Error as ex:
         sqlstate = ex.args[0]
         if 'S0002' in sqlstate:
@@ -49,697 +1738,2614 @@ def get_companies():
     except Exception as e:
         return jsonify({"error": f"알 수 없는 오류 발생: {e}"}), 500
 
+def _load_companies(db_config, refresh=False):
+    """회사 목록 (캐시 우선). 반환값: (회사 목록, 캐시 사용 여부)"""
+    if not refresh:
+        companies = _get_cached_companies(db_config)
+        if companies is not None:
+            return companies, True
+    with _db_connection(db_config) as cnxn:
+        company_df = pd.read_sql("SELECT co_cd, co_nm FROM sco ORDER BY co_nm", cnxn)
+        companies = company_df.to_dict(orient='records')
+    _put_cached_companies(db_config, companies)
+    return companies, False
+
+def _prepare_fetch(data):
+    """조회 요청을 검사해 실행할 작업 정보를 만듭니다. 반환값: (작업 정보, 오류 응답)"""
+    # --- [수정] 선택된 메뉴 이름으로 쿼리 레지스트리에서 sql과 params를 가져옴 ---
+    query_name = data.get('query_name')
+    co_cd = data.get('co_cd')
+    start_date = data.get('start_date')
+    end_date = data.get('end_date')
+
+    entry = QUERY_REGISTRY.get(query_name)
+    if entry is None:
+        return None, (jsonify({"error": "유효하지 않은 쿼리 이름입니다."}), 400)
+    inputs = {"co_cd": co_cd, "start_date": start_date, "end_date": end_date}
+    if not all(inputs.get(name) for name in entry["required"]):
+        return None, (jsonify({"error": entry["error"]}), 400)
+    stale_months = data.get('stale_months') or []
+    if isinstance(stale_months, str):
+        stale_months = [month.strip() for month in stale_months.split(',') if month.strip()]
+    if not all(isinstance(month, str) and re.fullmatch(r'\d{4}-(0[1-9]|1[0-2])', month) for month in stale_months):
+        return None, (jsonify({"error": "stale_months 는 'YYYY-MM' 형식의 목록이어야 합니다."}), 400)
+    partition_months = data.get('partition_months') or PARTITION_MONTHS
+    if isinstance(partition_months, str) and re.fullmatch(r'\s*\d+\s*', partition_months):
+        partition_months = int(partition_months)
+    if isinstance(partition_months, bool) or not isinstance(partition_months, int) or partition_months <= 0:
+        return None, (jsonify({"error": "partition_months 는 1 이상의 정수여야 합니다."}), 400)
+
+    return {
+        "db_config": data.get('db_config'),
+        "query_name": query_name,
+        "co_cd": co_cd,
+        "co_nm": data.get('co_nm'),
+        "sql": entry["sql"],
+        "params": _bind_query_params(entry, inputs),
+        "fetch_mode": data.get('fetch_mode') or FETCH_MODE,
+        # 다시 조회할 달을 지정했으면 최근 조회 결과도 재사용하지 않음
+        "force_refresh": bool(data.get('force_refresh') or stale_months),
+        # 기간 분할 조회용
+        "param_tokens": entry["params"],
+        "partition": entry.get("partition"),
+        "start_date": start_date,
+        "end_date": end_date,
+        "partition_months": partition_months,
+        # 증분 데이터셋용
+        "stale_months": stale_months,
+        "refresh_dataset": bool(data.get('force_refresh')),
+        # 작업 취소 토큰 (백그라운드 작업으로 등록할 때 설정)
+        "cancel": None,
+    }, None
+
+
+# --- 조회 결과 저장소 (temp_data) ---
+# 조회 결과 Parquet 파일의 용량과 수명을 관리합니다.
+#   - 마지막 사용(조회/재사용/내보내기) 후 세션 유지 시간이 지나면 삭제 (TTL)
+#   - 전체 크기가 RESULT_STORE_QUOTA_BYTES 를 넘거나 디스크 여유 공간이 RESULT_STORE_MIN_FREE_BYTES
+#     아래로 내려가면 가장 오래 사용하지 않은 파일부터 삭제 (LRU). 내보내기 중인 파일과 방금 만든 파일은 건드리지 않음
+# RESULT_STORE_BACKEND:
+#   - local: 프로세스 하나가 TEMP_DIR 를 혼자 사용 (사용 시각/사용 중 표시를 메모리에 보관)
+#   - shared: 여러 워커/레플리카가 공유 볼륨의 TEMP_DIR 를 함께 사용. 상태를 파일 시스템에 두고,
+#             백그라운드 작업 상태/취소 요청도 같은 폴더로 공유해 어느 워커가 요청을 받아도 처리 (아래 '백그라운드 작업' 참고)
+RESULT_STORE_BACKEND = os.environ.get('RESULT_STORE_BACKEND', 'local')
+RESULT_STORE_PIN_SECONDS = int(os.environ.get('RESULT_STORE_PIN_SECONDS', str(6 * 3600)))   # 이보다 오래된 사용 중 표시는 무시 (shared)
+RESULT_STORE_QUOTA_BYTES = int(os.environ.get('RESULT_STORE_QUOTA_BYTES', str(5 * 1024 ** 3)))
+RESULT_STORE_MIN_FREE_BYTES = int(os.environ.get('RESULT_STORE_MIN_FREE_BYTES', str(1024 ** 3)))
+RESULT_STORE_TTL_SECONDS = int(os.environ.get('RESULT_STORE_TTL_SECONDS', str(int(app.permanent_session_lifetime.total_seconds()))))
+_RESULT_FILE_RE = re.compile(r'[0-9a-f-]{36}\.parquet')   # data_id.parquet (기간 분할 구간 파일 등은 제외)
+_JOB_ID_RE = re.compile(r'[0-9a-f-]{36}')
+
+
+class _ResultStore:
+    """temp_data 의 조회 결과 파일(data_id.parquet) 목록과 크기, 마지막 사용 시각을 관리합니다. (local)"""
+
+    def __init__(self, directory, quota_bytes, min_free_bytes, ttl_seconds):
+        self.directory = directory
+        self.quota_bytes = quota_bytes
+        self.min_free_bytes = min_free_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()   # data_id -> {"size", "last_access", "pins"} (오래된 사용 순)
+
+    def path(self, data_id):
+        return os.path.join(self.directory, f"{data_id}.parquet")
+
+    def scan(self):
+        """이전 실행에서 남은 결과 파일을 등록합니다. (파일 수정 시각 기준으로 TTL 적용)"""
+        found = []
+        for name in os.listdir(self.directory):
+            if _RESULT_FILE_RE.fullmatch(name):   # 구간/임시 파일(<data_id>.parquet.w0.parquet 등)은 결과가 아님
+                stat = os.stat(os.path.join(self.directory, name))
+                found.append((stat.st_mtime, name[:-len('.parquet')], stat.st_size))
+        with self._lock:
+            for mtime, data_id, size in sorted(found):
+                if data_id not in self._entries:
+                    self._entries[data_id] = {"size": size, "last_access": mtime, "pins": 0}
+        if found:
+            app.logger.info(f"결과 저장소: 기존 파일 {len(found)}개 등록")
+
+    def register(self, data_id):
+        """새로 만든 결과 파일을 등록하고, 한도를 넘었으면 다른 파일을 정리합니다. (새 파일은 한도보다 커도 남김)"""
+        size = os.path.getsize(self.path(data_id))
+        with self._lock:
+            self._entries[data_id] = {"size": size, "last_access": time.time(), "pins": 0}
+        self.reclaim(keep=data_id)
+
+    def touch(self, data_id):
+        """결과 파일을 사용했다고 표시합니다. 파일이 없으면 False"""
+        if not os.path.exists(self.path(data_id)):
+            with self._lock:
+                self._entries.pop(data_id, None)
+            return False
+        with self._lock:
+            entry = self._entries.get(data_id)
+            if entry is not None:
+                entry["last_access"] = time.time()
+                self._entries.move_to_end(data_id)
+        return True
+
+    @contextlib.contextmanager
+    def pinned(self, data_id):
+        """사용하는 동안(내보내기 등) 정리 대상에서 제외합니다."""
+        with self._lock:
+            entry = self._entries.get(data_id)
+            if entry is not None:
+                entry["pins"] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                entry = self._entries.get(data_id)
+                if entry is not None:
+                    entry["pins"] -= 1
+                    entry["last_access"] = time.time()
+                    self._entries.move_to_end(data_id)
+
+    def _free_bytes(self):
+        return shutil.disk_usage(self.directory).free
+
+    def reclaim(self, keep=None):
+        """만료된 파일을 지우고, 용량 한도/디스크 여유 공간을 맞출 때까지 오래된 파일부터 지웁니다. (keep 은 제외)"""
+        with self._lock:
+            evicted, free, total = self._plan_reclaim(self._entries, time.time(), keep)
+            for data_id, _ in evicted:
+                del self._entries[data_id]
+        return self._remove_evicted(evicted, free, total)
+
+    def _plan_reclaim(self, entries, now, keep=None):
+        """지울 파일 [(data_id, 사유)] 와 지운 뒤의 디스크 여유 공간, 전체 크기. entries 는 오래된 사용 순"""
+        evicted = [(data_id, "만료") for data_id, entry in entries.items()
+                   if entry["pins"] == 0 and data_id != keep and now - entry["last_access"] > self.ttl_seconds]
+        expired = {data_id for data_id, _ in evicted}
+        total = sum(entry["size"] for data_id, entry in entries.items() if data_id not in expired)
+        free = self._free_bytes() + sum(entries[data_id]["size"] for data_id in expired)
+        for data_id, entry in entries.items():
+            if total <= self.quota_bytes and free >= self.min_free_bytes:
+                break
+            if entry["pins"] or data_id in expired or data_id == keep:
+                continue
+            evicted.append((data_id, "용량 확보"))
+            total -= entry["size"]
+            free += entry["size"]
+        return evicted, free, total
+
+    def _remove_evicted(self, evicted, free, total):
+        for data_id, reason in evicted:
+            try:
+                os.remove(self.path(data_id))
+            except FileNotFoundError:
+                pass
+            app.logger.info(f"결과 저장소: {data_id} 삭제 ({reason})")
+        if total > self.quota_bytes:
+            # 사용 중이거나 방금 만든 결과는 지우지 않으므로 한도를 넘은 채로 둠
+            app.logger.warning(f"결과 저장소: 용량 한도 초과 ({total // (1024 ** 2)}MB / {self.quota_bytes // (1024 ** 2)}MB)")
+        if free < self.min_free_bytes:
+            app.logger.warning(f"결과 저장소: 디스크 여유 공간 부족 ({free // (1024 ** 2)}MB)")
+        return len(evicted)
+
+    # 작업 상태 공유: 로컬 저장소는 프로세스 안의 작업 목록(_jobs)만 사용하므로 할 일이 없습니다.
+    def save_job(self, job):
+        pass
+
+    def load_job(self, job_id):
+        return None
+
+    def request_cancel(self, job_id):
+        pass
+
+    def cancel_requests(self):
+        return set()
+
+    def expire_jobs(self, now, retention_seconds):
+        pass
+
+
+class _SharedResultStore(_ResultStore):
+    """여러 워커/레플리카가 같은 폴더(공유 볼륨)를 쓰는 결과 저장소.
+
+    프로세스 메모리 대신 파일 시스템에 상태를 둡니다: 마지막 사용 시각 = 파일 수정 시각,
+    사용 중 표시 = .pins/<data_id>.<id>.pin, 작업 상태 = .jobs/<job_id>.json, 취소 요청 = .jobs/<job_id>.cancel
+    """
+
+    def __init__(self, directory, quota_bytes, min_free_bytes, ttl_seconds):
+        super().__init__(directory, quota_bytes, min_free_bytes, ttl_seconds)
+        self.pin_dir = os.path.join(directory, '.pins')
+        self.job_dir = os.path.join(directory, '.jobs')
+        os.makedirs(self.pin_dir, exist_ok=True)
+        os.makedirs(self.job_dir, exist_ok=True)
+
+    def scan(self):
+        pass   # 상태를 파일 시스템에서 바로 읽으므로 미리 등록할 것이 없음
+
+    def register(self, data_id):
+        self.reclaim(keep=data_id)
+
+    def touch(self, data_id):
+        try:
+            os.utime(self.path(data_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+    @contextlib.contextmanager
+    def pinned(self, data_id):
+        pin_path = os.path.join(self.pin_dir, f"{data_id}.{uuid.uuid4().hex}.pin")
+        open(pin_path, 'w').close()
+        try:
+            yield
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(pin_path)
+            self.touch(data_id)
+
+    def _disk_entries(self, now):
+        """폴더의 결과 파일 {data_id: {"size", "last_access", "pins"}} (오래된 사용 순)"""
+        pins = collections.Counter()
+        for name in os.listdir(self.pin_dir):
+            path = os.path.join(self.pin_dir, name)
+            try:
+                if now - os.path.getmtime(path) > RESULT_STORE_PIN_SECONDS:
+                    os.remove(path)   # 비정상 종료한 워커가 남긴 표시
+                    continue
+            except FileNotFoundError:
+                continue
+            pins[name.split('.', 1)[0]] += 1
+        found = []
+        for name in os.listdir(self.directory):
+            if _RESULT_FILE_RE.fullmatch(name):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, name[:-len('.parquet')], stat.st_size))
+        return collections.OrderedDict((data_id, {"size": size, "last_access": mtime, "pins": pins[data_id]})
+                                       for mtime, data_id, size in sorted(found))
+
+    def reclaim(self, keep=None):
+        now = time.time()
+        return self._remove_evicted(*self._plan_reclaim(self._disk_entries(now), now, keep))
+
+    def _job_path(self, job_id, suffix):
+        if not _JOB_ID_RE.fullmatch(job_id):
+            raise ValueError(f"잘못된 작업 ID 입니다: {job_id}")
+        return os.path.join(self.job_dir, f"{job_id}{suffix}")
+
+    def save_job(self, job):
+        """작업 상태를 기록합니다. (_file 외의 '_' 항목은 프로세스 안에서만 사용)"""
+        doc = {key: value for key, value in job.items() if not key.startswith('_')}
+        doc["_file"] = job.get("_file")
+        path = self._job_path(job["job_id"], '.json')
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(app.json.dumps(doc))
+        os.replace(temp_path, path)
+
+    def load_job(self, job_id):
+        try:
+            with open(self._job_path(job_id, '.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def request_cancel(self, job_id):
+        open(self._job_path(job_id, '.cancel'), 'w').close()
+
+    def cancel_requests(self):
+        return {name[:-len('.cancel')] for name in os.listdir(self.job_dir) if name.endswith('.cancel')}
+
+    def expire_jobs(self, now, retention_seconds):
+        """끝난 지 retention_seconds 가 지난 작업 상태와 결과 파일을 지웁니다. (어느 워커가 지워도 됨)"""
+        for name in os.listdir(self.job_dir):
+            path = os.path.join(self.job_dir, name)
+            if name.endswith('.json'):
+                job = self.load_job(name[:-len('.json')])
+                if job is None or not job["finished_at"] or now - job["finished_at"] <= retention_seconds:
+                    continue
+                for stale in (job.get("_file"), path[:-len('.json')] + '.cancel', path):
+                    if stale:
+                        with contextlib.suppress(FileNotFoundError):
+                            os.remove(stale)
+            elif name.endswith('.tmp'):
+                with contextlib.suppress(FileNotFoundError):
+                    if now - os.path.getmtime(path) > retention_seconds:
+                        os.remove(path)
+
+
+_RESULT_STORE_BACKENDS = {'local': _ResultStore, 'shared': _SharedResultStore}
+if RESULT_STORE_BACKEND not in _RESULT_STORE_BACKENDS:
+    raise RuntimeError(f"지원하지 않는 RESULT_STORE_BACKEND 입니다: {RESULT_STORE_BACKEND} ({', '.join(_RESULT_STORE_BACKENDS)})")
+_result_store = _RESULT_STORE_BACKENDS[RESULT_STORE_BACKEND](
+    TEMP_DIR, RESULT_STORE_QUOTA_BYTES, RESULT_STORE_MIN_FREE_BYTES, RESULT_STORE_TTL_SECONDS)
+
+
+
+# --- 조회 결과 캐시 ---
+# 같은 대상 DB + 쿼리 + 파라미터로 다시 조회하면 RESULT_CACHE_SECONDS 안에 만든 Parquet 결과를 재사용합니다.
+# (split_rows 만 바꿔 다시 내보내는 경우 등) 결과 파일 자체의 수명은 결과 저장소가 관리합니다.
+RESULT_CACHE_SECONDS = int(os.environ.get('RESULT_CACHE_SECONDS', '1800'))
+
+_result_cache = {}      # 지문 -> 결과 정보 (data_id, 행 수, 컬럼, 미리보기, 생성 시각)
+_result_inflight = {}   # 지문 -> threading.Event (같은 조회가 실행 중)
+_result_cache_lock = threading.Lock()
+
+
+def _fetch_fingerprint(spec):
+    """대상 DB(계정 포함), 쿼리, 파라미터로 만든 조회 지문"""
+    key = (_db_target_key(spec["db_config"]), spec["query_name"], spec["sql"], tuple(spec["params"]))
+    return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+
+
+def _lookup_result_locked(fingerprint, now):
+    cached = _result_cache.get(fingerprint)
+    if cached is None:
+        return None
+    if now - cached["created_at"] > RESULT_CACHE_SECONDS or not _result_store.touch(cached["data_id"]):
+        del _result_cache[fingerprint]
+        return None
+    return cached
+
+
+def _run_fetch(spec, progress=_no_progress):
+    """조회 결과 캐시를 거쳐 쿼리를 실행합니다.
+
+    캐시에 최신 결과가 있으면 DB 에 가지 않고 재사용하고, 같은 조회가 이미 실행 중이면 그 결과를 기다립니다.
+    force_refresh 면 캐시를 무시하고 다시 조회해 캐시를 교체합니다.
+    """
+    fingerprint = _fetch_fingerprint(spec)
+    force_refresh = spec.get("force_refresh")
+    while True:
+        with _result_cache_lock:
+            now = time.time()
+            cached = None if force_refresh else _lookup_result_locked(fingerprint, now)
+            if cached is not None:
+                app.logger.info(f"조회 결과 캐시 사용: {spec['query_name']} ({cached['data_id']})")
+                progress(rows=cached["total_rows"], total_rows=cached["total_rows"])
+                return dict(cached, query_name=spec["query_name"], co_cd=spec["co_cd"], co_nm=spec["co_nm"], cached=True)
+            inflight = _result_inflight.get(fingerprint)
+            if inflight is None:
+                inflight = _result_inflight[fingerprint] = threading.Event()
+                break
+        # 같은 조회가 실행 중: 끝나면 그 결과를 재사용 (방금 만든 결과이므로 force_refresh 도 만족)
+        progress(stage='waiting')
+        while not inflight.wait(1):
+            if spec.get("cancel"):
+                spec["cancel"].check()   # 기다리는 쪽만 취소 (실행 중인 조회는 그대로)
+        force_refresh = False
+
+    try:
+        result = _execute_fetch(spec, progress)
+        with _result_cache_lock:
+            created_at = time.time()
+            _result_cache[fingerprint] = {
+                "data_id": result["data_id"],
+                "total_rows": result["total_rows"],
+                "columns": result["columns"],
+                "preview": result["preview"],
+                "fetch_mode": result["fetch_mode"],
+                "created_at": created_at,
+            }
+        return dict(result, cached=False)
+    finally:
+        with _result_cache_lock:
+            del _result_inflight[fingerprint]
+        inflight.set()
+
+
+def _execute_fetch(spec, progress=_no_progress):
+    """쿼리를 실행해 결과를 temp_data 의 Parquet 파일로 저장합니다.
+
+    progress(stage=..., rows=...) 로 진행 단계(connecting / querying / fetching)와 행 수를 알립니다.
+    """
+    fetch_mode = spec["fetch_mode"]
+    _log_query(spec)
+
+    # 디스크가 부족해 조회 도중 실패하지 않도록 먼저 공간을 확보합니다.
+    _result_store.reclaim()
+    data_id = str(uuid.uuid4())
+    filepath = _result_store.path(data_id)
+
+    try:
+        # 공유 저장소에서는 쓰는 중인 파일을 다른 워커의 정리 작업이 지우지 않도록 표시해 둡니다.
+        with _result_store.pinned(data_id):
+            windows = _partition_windows(spec) if fetch_mode == 'partitioned' else None
+            months = _dataset_months(spec) if fetch_mode == 'incremental' else None
+            fetched, note = None, None
+            if months:
+                progress(stage='connecting')
+                fetched = _fetch_incremental(spec, months, filepath, progress)
+            elif windows:
+                progress(stage='connecting')
+                fetched = _fetch_partitioned(spec, windows, filepath, progress)
+                if fetched is None:
+                    note = "날짜로 변환되지 않는 기간 값이 있어 일반 조회로 다시 가져왔습니다."
+            elif fetch_mode in ('partitioned', 'incremental'):
+                note = f"{fetch_mode} 조회 대상이 아니거나 나눌 구간이 없어 일반 조회로 실행했습니다."
+            if fetched is None:
+                if fetch_mode in ('partitioned', 'incremental'):
+                    fetch_mode = 'stream'   # 요청한 방식을 쓰지 못하면 일반 스트리밍 조회 (note 로 알림)
+                fetched = _fetch_single(spec, filepath, progress)
+            total_rows, columns, preview = fetched
+    except Exception:
+        # 중간에 실패한 경우 쓰다 만 Parquet 파일을 남기지 않습니다.
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        raise
+
+    _result_store.register(data_id)
+    app.logger.info(f"데이터 조회 완료: {total_rows}개 ({fetch_mode})")
+    progress(rows=total_rows, total_rows=total_rows)
+    return {
+        "data_id": data_id,
+        "query_name": spec["query_name"],
+        "co_cd": spec["co_cd"],
+        "co_nm": spec["co_nm"],
+        "total_rows": total_rows,
+        "columns": columns,
+        "preview": preview,
+        "fetch_mode": fetch_mode,
+        "fetch_note": note,
+    }
+
+
+def _fetch_single(spec, filepath, progress=_no_progress):
+    """연결 하나로 쿼리 전체를 조회합니다. (stream / buffered)"""
+    sql, params, query_name = spec["sql"], spec["params"], spec["query_name"]
+    progress(stage='connecting')
+    with _db_connection(spec["db_config"], query_name, spec.get("cancel")) as cnxn:
+        progress(stage='querying')
+        if spec["fetch_mode"] == 'buffered':
+            # pd.read_sql 이 커서를 직접 만들기 때문에 실행 중에는 취소할 수 없고, 끝난 뒤에 취소됩니다.
+            # NaN/None 은 object 로 바꾸지 않고 Arrow 의 NULL(validity)로 변환
+            with _stage('execute', query_name) as info:
+                table = pa.Table.from_pandas(pd.read_sql(sql, cnxn, params=params), preserve_index=False)
+                info["rows"] = table.num_rows
+            with _stage('parquet_write', query_name) as info:
+                if spec.get("cancel"):
+                    spec["cancel"].check()
+                pq.write_table(table, filepath, row_group_size=FETCH_BATCH_SIZE)
+                info["rows"], info["bytes"] = table.num_rows, os.path.getsize(filepath)
+            return table.num_rows, table.column_names, table.slice(0, PREVIEW_ROWS).to_pylist()
+        return _stream_query_to_parquet(
+            cnxn, sql, params, filepath, on_rows=lambda rows: progress(stage='fetching', rows=rows), query_name=query_name,
+            cancel=spec.get("cancel"))
+
+
+def _remember_fetch(result):
+    """조회 결과를 세션에 연결합니다. (내보내기는 세션의 data_id 를 사용)"""
+    session['data_id'] = result["data_id"]
+    session['query_name'] = result["query_name"]
+    session['co_cd'] = result["co_cd"]
+    session['co_nm'] = result["co_nm"]
+
+
+def _fetch_message(result):
+    reused = " (최근 조회 결과 재사용)" if result.get("cached") else ""
+    note = f" {result['fetch_note']}" if result.get("fetch_note") else ""
+    return {
+        "message": f"총 {result['total_rows']}개 데이터 조회 완료{reused}. 상위 {PREVIEW_ROWS}개를 미리보기로 표시합니다.{note}",
+        "columns": result["columns"],
+        "data": result["preview"],
+        "cached": bool(result.get("cached")),
+        "fetch_mode": result.get("fetch_mode"),   # 실제로 사용한 조회 방식
+        "fetch_note": result.get("fetch_note"),
+    }
+
+
 # [수정] 메인 데이터 조회 기능
 @app.route('/api/fetch', methods=['POST'])
 def fetch_data():
     """선택된 쿼리에 맞춰 동적으로 파라미터를 생성하여 데이터를 조회합니다."""
     try:
-        data = request.json
-        db_config = data.get('db_config')
-        
-        # --- [핵심 변경점] 선택된 메뉴 이름에 따라 sql과 params를 각각 설정 ---
-        query_name = data.get('query_name')
-        co_cd = data.get('co_cd')
-        co_nm = data.get('co_nm')
-        start_date = data.get('start_date')
-        end_date = data.get('end_date')
-
-        sql = None
-        params = None
-
-        if query_name == "거래처등록":
-            if not co_cd:
-                return jsonify({"error": "회사를 선택해야 합니다."}), 400
-            sql = (
-                "SELECT ISNULL(CO_CD, '') AS CO_CD, ISNULL(TR_FG, '') AS TR_FG, ISNULL(TR_CD, '') AS TR_CD, "
-                "ISNULL(TR_NM, '') AS TR_NM, ISNULL(ATTR_NM, '') AS ATTR_NM, ISNULL(CEO_NM, '') AS CEO_NM, "
-                "ISNULL(REG_NB, '') AS REG_NB, ISNULL(PPL_NB, '') AS PPL_NB, ISNULL(FOR_YN, '') AS FOR_YN, "
-                "ISNULL(BUSINESS, '') AS BUSINESS, ISNULL(JONGMOK, '') AS JONGMOK, ISNULL(ZIP, '') AS ZIP, "
-                "ISNULL(DIV_ADDR1, '') AS DIV_ADDR1, ISNULL(ADDR2, '') AS ADDR2, ISNULL(TEL, '') AS TEL, "
-                "ISNULL(FAX, '') AS FAX, ISNULL(HOMEPAGE, '') AS HOMEPAGE, ISNULL(EMAIL, '') AS EMAIL, "
-                "ISNULL(LIQ_RS, '') AS LIQ_RS, ISNULL(PJT_CD, '') AS PJT_CD, ISNULL(TRGRP_CD, '') AS TRGRP_CD, "
-                "ISNULL(TRRAT_FG, '') AS TRRAT_FG, ISNULL(CLTTR_CD, '') AS CLTTR_CD, ISNULL(LOCAL_CD, '') AS LOCAL_CD, "
-                "ISNULL(LINK_CD, '') AS LINK_CD, ISNULL(JEONJA_YN, '') AS JEONJA_YN, ISNULL(REPTR_CD, '') AS REPTR_CD, "
-                "ISNULL(APPR_NB, '') AS APPR_NB, ISNULL(LIQ_FG, '') AS LIQ_FG, ISNULL(REMARK_DC, '') AS REMARK_DC, "
-                "ISNULL(INTER_DT, '') AS INTER_DT, ISNULL(DUE_DT, '') AS DUE_DT, ISNULL(USE_YN, '') AS USE_YN, "
-                "ISNULL(TRSO_FG, '') AS TRSO_FG, ISNULL(PAYCON_DC, '') AS PAYCON_DC, ISNULL(DOUDATE1_FG, '') AS DOUDATE1_FG, "
-                "ISNULL(DOUDATE1_DD, '') AS DOUDATE1_DD, ISNULL(EMP_CD, '') AS EMP_CD, ISNULL(DEPT_CD, '') AS DEPT_CD, "
-                "'' AS TITLE_DC, '' AS JOB_DC, '' AS TEL_DC, '' AS EXT_DC, '' AS HP_DC, '' AS EMAIL_DC, "
-                "'' AS RMK_DC, ISNULL(RECZIP, '') AS RECZIP, ISNULL(REC_ADDR1, '') AS REC_ADDR1, ISNULL(REC_ADDR2, '') AS REC_ADDR2, "
-                "'' AS REC_TEL, '' AS REC_HP, '' AS REC_FAX, '' AS REC_MAIL, '' AS EMPGRP_CD, '' AS TRCHARGE_EMP, "
-                "'' AS TRCHARGE_EMAIL, '' AS TRCHARGE_DEPT, '' AS TRCHARGE_TITLE, '' AS TRCHARGE_JOP, ISNULL(TRCHARGE_TEL, '') AS TRCHARGE_TEL, "
-                "ISNULL(TRCHARGE_EXT, '') AS TRCHARGE_EXT, '' AS TRCHARGE_HP, ISNULL(JIRO_CD, '') AS JIRO_CD, ISNULL(BA_NB, '') AS BA_NB, "
-                "ISNULL(DEPOSITOR, '') AS DEPOSITOR, ISNULL(ACCT1_FG, '') AS ACCT1_FG, ISNULL(TAX1_FG, '') AS TAX1_FG, ISNULL(SETTLE_PAY, '') AS SETTLE_PAY, "
-                "ISNULL(SETTLE_CD, '') AS SETTLE_CD, ISNULL(ACCT2_FG, '') AS ACCT2_FG, ISNULL(TAX2_FG, '') AS TAX2_FG, ISNULL(SETTLE_RCP, '') AS SETTLE_RCP "
-                "FROM STRADE WHERE CO_CD = ? "
-            )
-            params = [co_cd]
-
-        elif query_name == "사원정보":
-            if not co_cd:
-                return jsonify({"error": "회사를 선택해야 합니다."}), 400
-            sql = (
-                "SELECT ROW_NUMBER() OVER (ORDER BY EMP_CD) AS 'NO', EMP_CD AS 사번, KOR_NM AS 이름, "
-                "'' AS 로그인ID, '' AS 메일ID, '' AS 로그인비밀번호, '' AS 결재비밀번호, "
-                "CASE WHEN GENDER_FG = 'M' THEN '남자' ELSE '여자' END AS '성별', '한국어' AS 사용언어, "
-                "GRUP_DT AS '최초입사일', '' AS 기본라이선스, '' AS 메일, '' AS 원챔버탐색기팩, "
-                "'' AS ONEAI라이선스, HCLS_CD AS 직급, HRSP_CD AS 직책, ENRL_FG AS 재직구분, "
-                "EMPL_FG AS 고용구분, HOPR_CD AS 직무, JOIN_DT AS 입사일, '사용' AS 근태사용, "
-                "REFR_YN AS 내외국인여부, RSRG_NO AS 주민등록번호, FORG_NO AS 외국인등록번호, "
-                "PYSP_FG AS 급여형태, HTYP_CD AS 직종 FROM SEMP WHERE CO_CD = ? AND EMPL_FG = '001'"
-            )
-            params = [co_cd]
-
-        elif query_name == "사원정보2":
-            if not co_cd:
-                return jsonify({"error": "회사를 선택해야 합니다."}), 400
-            sql = (
-                "SELECT '' AS [순번], EMP_CD AS [사번], KOR_NM AS [이름(한국어)], ENLS_NM AS [이름(영어)], "
-                "'' AS [이름(일본어)], '' AS [이름(중국어)], '' AS [로그인ID], '' AS [메일ID], "
-                "'' AS [로그인 비밀번호], '' AS [결재 비밀번호], "
-                "CASE WHEN GENDER_FG = 'M' THEN '남자' ELSE '여자' END AS [성별], '한국어' AS [사용언어], "
-                "EMAL_ADD AS [개인메일], '' AS [휴대전화], TEL AS [전화번호], "
-                "'' AS [비상연락망(HP) 관계], EMGC_TEL AS [비상연락망(HP)], RR_ZIP AS [우편번호], "
-                "RSRG_ADD AS [기본주소], RSRD_ADD AS [상세주소], '' AS [우편번호(영문)], "
-                "'' AS [기본주소(영문)], '' AS [상세주소(영문)], JOIN_DT AS [최초입사일], "
-                "RTR_DT AS [최종퇴사일], '미사용' AS [계정 사용], '미사용' AS [모바일 사용], "
-                "'미사용' AS [메신저 사용], BCCN_NO AS [출입카드번호], '' AS [SNS], "
-                "'' AS [커리어], '비라이선스' AS [기본 라이선스], '미사용' AS [메일], "
-                "'미사용' AS [ONE-AI 라이선스], '미사용' AS [원챔버탐색기팩], '1000' AS [회사코드], "
-                "'1000' AS [사업장코드], DEPT_CD AS [부서코드], HCLS_CD AS [직급코드], "
-                "HRSP_CD AS [직책코드], ENRL_FG AS [재직구분코드], EMPL_FG AS [고용구분코드], "
-                "HOPR_CD AS [직무코드], JOIN_DT AS [입사일], RPMC_DT AS [퇴사일], "
-                "'' AS [회사전화번호], '' AS [회사팩스번호], '' AS [내선단축번호], "
-                "'' AS [회사우편번호], '' AS [회사기본주소], '' AS [회사상세주소], "
-                "'' AS [회사우편번호(영문)], '' AS [회사기본주소(영문)], '' AS [회사상세주소(영문)], "
-                "'미표시' AS [조직도], '미표시' AS [대화/쪽지 조직도], '미사용' AS [근태사용], "
-                "REFR_YN AS [내외국인여부], RSRG_NO AS [주민등록번호], FORG_NO AS [외국인등록번호], "
-                "'' AS [외국인단일세율적용여부], '' AS [생년월일], '' AS [양/음력구분], "
-                "'' AS [급여이메일], '' AS [본적주소], '' AS [본적주소상세], "
-                "'' AS [본적우편번호], '' AS [수습적용여부], '' AS [수습만료일], "
-                "'' AS [수습급여지급률], '' AS [근속기간포함여부(수습)], '' AS [휴직시작일], "
-                "'' AS [휴직종료일], '' AS [휴직복직일], '' AS [휴직사유], "
-                "'' AS [휴직급여지급율], '' AS [퇴직기간포함여부(휴직)], '' AS [중도정산일], "
-                "'' AS [계약종료일], '' AS [퇴직사유], '' AS [계정유형], '' AS [호봉], "
-                "PYSP_FG AS [급여형태], HTYP_CD AS [직종], '' AS [근무조], '' AS [프로젝트], "
-                "'' AS [하위사업], '' AS [분류코드], '' AS [사용자정의1], '' AS [사용자정의2], "
-                "'' AS [사용자정의3], '' AS [사용자정의4], '' AS [사용자정의5], "
-                "'' AS [사용자정의6], '' AS [국적코드(관리용)], '' AS [국적코드(신고용)], "
-                "'' AS [거주구분], '' AS [거주지국코드], '' AS [세대주여/부], "
-                "'' AS [최종학력], '' AS [국외소득유무], '' AS [건강보험번호], "
-                "'' AS [건강보험료자동계산여부], '' AS [건강보험보수월액], '' AS [건강보험금액], "
-                "'' AS [건강보험여부], '' AS [노인장기요양보험료], '' AS [장기요양보험료 경감대상자여부], "
-                "'' AS [연금유형], '' AS [국민연금자동계산여부], '' AS [국민연금보수월액], "
-                "'' AS [국민연금금액], '' AS [사학연금자동계산여부], '' AS [사학연금보수월액], "
-                "'' AS [사학연금], '' AS [고용보험여부], '' AS [고용보험 자동계산여부], "
-                "'' AS [고용보험보수월액], '' AS [고용보험료], '' AS [고용보험대표이사여부], "
-                "'' AS [노조가입여부], '' AS [(급여)이체은행], '' AS [(급여)계좌번호], "
-                "'' AS [예금주], '' AS [(기타)이체은행], '' AS [(기타)계좌번호], "
-                "'' AS [예금주2], '' AS [장애인구분], '' AS [배우자공제 여부], "
-                "'' AS [20세이하 인원수], '' AS [60세이상 인원수], "
-                "'' AS [장애인기본공제인원수], '' AS [기타수급자], '' AS [다자녀추가공제], "
-                "'' AS [부녀자공제], '' AS [학자금공제자 여부], '' AS [학자금상환 통지액], "
-                "'' AS [생산직 총급여], '' AS [퇴직연금구분], '' AS [퇴직연금은행코드], "
-                "'' AS [퇴직연금계좌번호], '' AS [퇴직연금가입일], '' AS [퇴직연금해지일], "
-                "'' AS [퇴직연금 비고], '' AS [두루누리사회보험 신청여부], "
-                "'' AS [두루누리사회보험적용율], '' AS [자금입력방식], "
-                "'' AS [경비이체은행코드], '' AS [경비이체계좌번호], "
-                "'' AS [경비이체예금주], '' AS [종교관련종사자여부], "
-                "'' AS [근무지], '' AS [학자금공제기간시작], "
-                "'' AS [학자금공제기간종료], '' AS [감면대상], "
-                "'' AS [감면유형코드], '' AS [감면기간(시작연월)], "
-                "'' AS [감면기간(종료연월)], '' AS [담당업무], "
-                "'' AS [담당업무(영문)], '' AS [담당업무(중국어)], "
-                "'' AS [담당업무(일본어)], '' AS [외국법인소속파견자여부], "
-                "'' AS [결혼여부], '' AS [결혼일], '' AS [기타근무유형], "
-                "'' AS [기타근무시간] FROM SEMP WHERE CO_CD = ? AND EMPL_FG = '001'"
-            )
-            params = [co_cd]
-
-        elif query_name == "조직정보":
-            if not co_cd:
-                return jsonify({"error": "회사를 선택해야 합니다."}), 400
-            sql = (
-                "SELECT D.CO_CD, C.CO_NM, H.CTRL_NM, '' AS 상세구분, D.CTD_CD, D.CTD_NM, "
-                "'' AS 영어, '' AS 중국어, '' AS 일본어, 'Y', '' AS 정렬 "
-                "FROM SCTRL_D D "
-                "INNER JOIN SCO C ON D.CO_CD = C.CO_CD "
-                "LEFT OUTER JOIN SCTRL H ON H.CO_CD = D.CO_CD AND H.CTRL_CD = D.CTRL_CD AND H.MODULE_CD = 'H' "
-                "WHERE D.CO_CD = ? AND D.CTRL_CD IN ('G3','G4','G5','G6') AND H.MODULE_CD = 'H' "
-            )
-            params = [co_cd]
-
-        elif query_name == "상용직정보":
-            if not co_cd:
-                return jsonify({"error": "회사를 선택해야 합니다."}), 400
-            sql = (
-                "SELECT '' AS [순번], '' AS [로그인ID], '' AS [메일ID], '' AS [로그인 비밀번호], "
-                "KOR_NM AS [이름(한국어)], ENLS_NM AS [이름(영어)], '' AS [이름(일본어)], "
-                "'' AS [이름(중국어)], CASE WHEN GENDER_FG = 'M' THEN '남자' ELSE '여자' END AS [성별], "
-                "'' AS [휴대전화], TEL AS [전화번호], EMGC_TEL AS [비상연락망(HP)], "
-                "'' AS [관계], RR_ZIP AS [우편번호], RSRG_ADD AS [기본주소], RSRD_ADD AS [상세주소], "
-                "'한국어' AS [사용언어], EMAL_ADD AS [개인메일], '' AS [개인메일도메인], "
-                "EMAL_ADD AS [급여메일], '' AS [급여메일도메인], '비라이선스' AS [기본 라이선스], "
-                "'N' AS [메일], 'N' AS [원챔버 탐색기팩], 'N' AS [OneAI], JOIN_DT AS [최초입사일], "
-                "RTR_DT AS [최종퇴사일], '' AS [회사코드], DEPT_CD AS [부서코드], EMP_CD AS [사번], "
-                "HCLS_CD AS [직급코드], HRSP_CD AS [직책코드], ENRL_FG AS [재직구분코드], "
-                "EMPL_FG AS [고용구분코드], HOPR_CD AS [직무코드], '' AS [담당업무(한국어)], "
-                "'' AS [담당업무(영어)], '' AS [담당업무(중국어)], '' AS [담당업무(일본어)], "
-                "JOIN_DT AS [입사일], RPMC_DT AS [퇴사일], '미사용' AS [근태사용], "
-                "TEL AS [전화번호(조직)], '' AS [내선번호(조직)], '' AS [팩스번호(조직)], "
-                "RR_ZIP AS [우편번호(조직)], RSRG_ADD AS [기본주소(조직)], RSRD_ADD AS [상세주소(조직)], "
-                "'표시' AS [조직도], '표시' AS [대화/쪽지조직도] FROM SEMP WHERE CO_CD = ?  AND EMPL_FG = '001'"
-            )
-            params = [co_cd]
-
-        elif query_name == "부서정보":
-            if not co_cd:
-                return jsonify({"error": "회사를 선택해야 합니다."}), 400
-            sql = (
-                "SELECT '' AS 회사코드, '' AS 회사명, '' AS 사업장코드, '' AS 사업장명, "
-                "'-' AS 상위부서코드, 1 AS Depth, dept_cd AS 부서코드, dept_nm AS 부서명, "
-                "'부서' AS 유형 FROM SDEPT WHERE CO_CD = ? "
-            )
-            params = [co_cd]
-
-        elif query_name == "품목등록":
-            if not co_cd:
-                return jsonify({"error": "회사를 선택해야 합니다."}), 400
-            sql = (
-                "SELECT ITEM_CD, ITEM_NM, ITEM_DC, ACCT_FG, ODR_FG, ITEMGRP_CD, UNIT_DC, UNITMANG_DC, UNITCHNG_NB, USE_YN, "
-                "LEAD_DT, DESIGN_NB, LOT_FG, SETITEM_FG, QC_FG, '0' REQ_FG, TRMAIN_CD, STANDARD_UM, REAL_UM, SALE_UM, "
-                "PURCH_UM, SALPLN_CD, PURPLN_CD, MTLPLN_CD, MFGPLN_CD, EMP_CD, L_CD, M_CD, S_CD, LOT_QT, FOQ_QT, "
-                "TRSUB_CD, TRSUB2_CD, SAFESTOCK_QT, COMP_DC, BARCODE_DC, WIDTH_QT, LENGTH_QT, HEIGHT_QT, DENSTY_QT, "
-                "WIDTH_UM, LENGTH_UM, HEIGHT_UM, VOLUME_QT, WEIGHT_QT, AREA_QT, VOLUME_UM, WEIGHT_UM, AREA_UM, "
-                "DAYCAPA_NB, LNSP_UM, HS_NB, MASS_CD, MASS_CONFNB, PACK_PO_QT, PACK_PO_RT, PACK_SO_QT, PACK_SO_RT, "
-                "STANDARD_TIME,'' aaa,LIQ_YN, REMARK_DC, AL_REMARK_DC, LIQ_FG, STANDARD_TIME_UNIT_DC, SALEVAT_UM, PURCHVAT_UM, "
-                "'' LIQUSE_FG FROM SITEM WHERE CO_CD = ?"
-            )
-            params = [co_cd]
-
-        elif query_name == "품목군등록":
-            if not co_cd:
-                return jsonify({"error": "회사를 선택해야 합니다."}), 400
-            sql = (
-                "SELECT ITEMGRP_CD, ITEMGRP_NM, USE_YN, ITEMGRP_DC FROM SITEMGRP WHERE CO_CD = ?"
-            )
-            params = [co_cd]
-        
-        elif query_name == "BOM등록":
-            if not co_cd:
-                return jsonify({"error": "회사를 선택해야 합니다."}), 400
-            sql = (
-                "SELECT ITEMPARENT_CD	,BOM_SQ SORT_SQ	,ITEMCHILD_CD	,JUST_QT	,LOSS_RT	,OUT_FG	,USE_YN	,REAL_QT	,ODR_FG	,START_DT	,END_DT	,REMARK_DC	FROM SBOM_WF WHERE CO_CD = ? and itemparent_cd in (SELECT item_cd FROM SITEM WHERE co_cd = ? and use_yn = '1')"
-            )
-            params = [co_cd,co_cd]
-
-        elif query_name == "관리내역등록":
-            if not co_cd:
-                return jsonify({"error": "회사를 선택해야 합니다."}), 400
-            sql = (
-                "SELECT H.CTRL_CD,D.MGM_CD,D.MGM_NM,D.REMARK_DC,D.USE_YN FROM LCTRL_MGM H INNER JOIN  LCTRL_MGM_D D ON H.CO_CD = D.CO_CD AND H.CTRL_CD = D.CTRL_CD WHERE D.CO_CD = ?"
-            )
-            params = [co_cd]
-
-        elif query_name == "창고":
-            if not co_cd:
-                return jsonify({"error": "회사를 선택해야 합니다."}), 400
-            sql = (
-                "SELECT DIV_CD,BASELOC_FG,BASELOC_CD,BASELOC_NM,BASELOC_DC,USE_YN FROM SBASELOC WHERE CO_CD = ?"
-            )
-            params = [co_cd]
-
-        elif query_name == "공정":
-            if not co_cd:
-                return jsonify({"error": "회사를 선택해야 합니다."}), 400
-            sql = (
-                "SELECT BASELOC_CD,LOC_CD,LOC_NM,TR_CD,BAD_YN,AVABSTOCK_YN,USE_YN,LOC_DC FROM SLOC WHERE CO_CD = ?"
-            )
-            params = [co_cd]
-
-        elif query_name == "프로젝트등록":
-            if not co_cd:
-                return jsonify({"error": "회사를 선택해야 합니다."}), 400
-            sql = (
-                "SELECT CO_CD,PJT_CD,PROG_FG,PJT_NM,PJT_NMK,ATPJT_NM,ATPJT_NMK,TR_CD,PJTGRP_CD,FR_DT,TO_DT,START_DT,PJT_WORKTY,PJTRMK_DC,PJTRMK_DCK,COST_FG,PJT_TY,DEPT_CD,EMP_CD,'' PRIME_TR_CD,ORD_AM,GOYONG_NM,RSRG_NO,HJS,HCLS,DTL_DC,GOAL_DC FROM SPJT  WHERE CO_CD = ?"
-            )
-            params = [co_cd]
-        elif query_name == "납품처등록":
-            if not co_cd:
-                return jsonify({"error": "회사를 선택해야 합니다."}), 400
-            sql = (
-                "SELECT CUST_CD,	SHIP_CD,	SHIP_NM,	ZIP_CD,	ADD_DC,	SHIP_FG,	CARGO_AM,	TREMP_NM,	PHONE_NB,	FAX_NB,	CP_NB,	EMAIL_DC,	USE_YN FROM LSHIP_BILL  WHERE CO_CD = ?"
-            )
-            params = [co_cd]
-
-        elif query_name == "물류담당자등록":
-            if not co_cd:
-                return jsonify({"error": "회사를 선택해야 합니다."}), 400
-            sql = (
-                "SELECT PLN_CD,PLN_NM,EMP_CD,PLN_TEL,PLN_FAX,PLN_CP,PLNS_CD,FROM_DT,TO_DT,USE_YN FROM LPLNNERCD  WHERE CO_CD = ?"
-            )
-            params = [co_cd]
-        elif query_name == "고객별물류담당자등록":
-            if not co_cd:
-                return jsonify({"error": "회사를 선택해야 합니다."}), 400
-            sql = (
-                "SELECT TR_CD,PLN_CD,PURPLN_CD,OUTPLN_CD,AREA_CD,AREA_GRP,TRADE_GRP,SHIP_CD,UM_FG,POUM_FG   FROM LTRADEMGM  WHERE CO_CD = ?"
-            )
-            params = [co_cd]
-        elif query_name == "기초재고":
-            sql = (
-                "SELECT LI.DIV_CD, LEFT(?, 4) + '0101' AS ADJUST_DT, LI.WH_CD, LI.LC_CD,'기초재고' AS REMARK_DC,'' AS TR_CD,'' AS PLN_CD, LI.ITEM_CD,SUM(ISNULL(LI.IOPEN_QT, 0)) AS IOPEN_QT, MAX(ISNULL(T.OPEN_UM, 0)) AS OPEN_UM, "
-                "CASE WHEN ROW_NUMBER() OVER (PARTITION BY LI.DIV_CD, LI.ITEM_CD ORDER BY LI.LOT_NB) = 1 THEN MAX(ISNULL(T.OPEN_AM, 0)) ELSE 0 END AS OPEN_AM, "
-                "'' AS MGMT_CD, '' AS PJT_CD, ISNULL(LI.LOT_NB, '') AS LOT_NB "
-                "FROM LX_LINVTORY LI "
-                "LEFT OUTER JOIN LINV_TAV T ON LI.CO_CD = T.CO_CD AND LI.DIV_CD = T.DIV_CD AND LI.P_YR + '01' = T.SMM AND LI.ITEM_CD = T.ITEM_CD "
-                "WHERE LI.CO_CD = ? AND LI.P_YR = LEFT(?, 4) "
-                "GROUP BY LI.DIV_CD, LI.WH_CD, LI.LC_CD, LI.ITEM_CD, LI.LOT_NB "
-                "HAVING SUM(LI.IOPEN_QT) <> 0 ORDER BY LI.WH_CD,LI.LC_CD,LI.ITEM_CD, LI.LOT_NB"
-            )
-            params = [
-                start_date,
-                co_cd,
-                start_date
-            ]
-
-        elif query_name == "주문정보":
-            if not all([co_cd, start_date, end_date]):
-                return jsonify({"error": "회사,시작일자,종료일자 모두 선택해야 합니다."}), 400
-            sql = (
-                "SELECT H.SO_FG, H.SO_DT, H.TR_CD, 'KRW' AS EXCH_CD, ISNULL(H.EXCH_RT,1) EXCH_RT, H.VAT_FG, H.UMVAT_FG, "
-                "ISNULL(H.SHIP_CD,'') SHIP_CD, ISNULL(H.PLN_CD,'') PLN_CD, ISNULL(H.LC_NB,'') LC_NB, "
-                "ISNULL(D.SO_NB,'') MGM_NM, ISNULL(H.REMARK_DC,'') REMARK_DC, D.ITEM_CD, D.DUE_DT, D.SHIPREQ_DT, "
-                "ISNULL(D.SO_QT,0) SO_QT, ISNULL(D.UM_FG,'') UM_FG, ISNULL(D.SO_UM,0) SO_UM, D.VAT_UM, D.SOG_AM, "
-                "D.SOV_AM, D.SOH_AM, D.EXCH_UM, D.EXCH_AM, '0' REQ_FG, ISNULL(D.QC_FG,'0') QC_FG, D.MGMT_CD, D.PJT_CD, "
-                "ISNULL(LEFT(D.REMARK_DC,57),'') + '|'+CONVERT(NVARCHAR(3),D.SO_SQ) REMARKD_DC, D.EST_NB, "
-                "CASE WHEN D.EST_SQ= 0 THEN NULL ELSE D.EST_SQ END EST_SQ, D.ITEMSET_CD "
-                "FROM LSO H "
-                "LEFT OUTER JOIN LSO_D D ON H.CO_CD = D.CO_CD AND H.SO_NB = D.SO_NB "
-                "WHERE H.SO_FG = '0' AND H.CO_CD = ? AND H.SO_DT >=  ? AND H.SO_DT <= ? "
-                "ORDER BY H.CO_CD, H.SO_NB, D.SO_SQ"
-            )
-            params = [co_cd, start_date, end_date]
-
-        elif query_name == "입고처리":
-            if not all([co_cd, start_date, end_date]):
-                return jsonify({"error": "회사,시작일자,종료일자 모두 선택해야 합니다."}), 400
-            sql = (
-                "SELECT H.DIV_CD,H.PO_FG, H.RCV_DT, H.TR_CD, H.EXCH_CD, ISNULL(H.EXCH_RT,1) EXCH_RT, H.VAT_FG, H.UMVAT_FG, "
-                "H.WH_CD, H.PLN_CD,H.RCV_NB REMARK_DC, D.ITEM_CD, D.PO_QT, D.RCV_QT, D.UM_FG, D.RCV_UM, D.VAT_UM, "
-                "D.RCVG_AM, D.RCVV_AM, D.RCVH_AM, D.EXCH_UM, D.EXCH_AM, D.LC_CD, D.LOT_NB,H.MGMT_CD, D.PJT_CD, "
-                "D.REMARK_DC REMARKD_DC, PO_NB, PO_SQ,  IBL_NB, IBL_SQ, '' REQ_NB, '' REQ_SQ, "
-                "'' QC_NB, '' QC_SQ "
-                "FROM LSTOCK H "
-                "LEFT OUTER JOIN LSTOCK_D D ON H.CO_CD = D.CO_CD AND H.RCV_NB = D.RCV_NB "
-                "WHERE H.CO_CD = ? AND H.RCV_DT >=  ? AND H.RCV_DT <= ? "
-                "ORDER BY H.CO_CD, d.RCV_NB, D.RCV_SQ"
-            )
-            params = [co_cd, start_date, end_date]
-
-        elif query_name == "발주등록":
-            if not all([co_cd, start_date, end_date]):
-                return jsonify({"error": "회사,시작일자,종료일자 모두 선택해야 합니다."}), 400
-            sql = (
-                "SELECT H.PO_DT, H.TR_CD, H.PO_FG, H.VAT_FG, H.EXCH_CD, D.ITEM_CD, D.DUE_DT, D.PO_QT, D.EXCH_UM, D.EXCH_AM, ISNULL(H.EXCH_RT,1) EXCH_RT, ISNULL(H.MGMT_CD,'') MGMT_CD, ISNULL(D.PJT_CD,'') PJT_CD, ISNULL(H.LC_NB,'') LC_NB, ISNULL(H.PLN_CD,'') PLN_CD, H.REMARK_DC, D.PO_UM, ISNULL(D.UM_FG,'') UM_FG, D.POG_AM, D.POGV_AM1, D.POGH_AM1, D.SHIPREQ_DT, '' REQ_FG, '' QC_FG, ISNULL(D.REMARK_DC,'') + '|' + CONVERT(NVARCHAR(3),D.PO_SQ) REMARKD_DC, '' SO_NB, '' SO_SQ, '' REQ_NB, '' MREQ_SQ, '' REQR_NB, '' REQR_SQ, TRNMTD_DC, PAYCON_DC, DELARA_DC,D.PO_NB MGM_NM, UMVAT_FG, VAT_UM " 
-                "FROM LPO H INNER JOIN LPO_D D ON H.CO_CD = D.CO_CD AND H.PO_NB = D.PO_NB "
-                "WHERE H.CO_CD = ? AND H.PO_DT >= ? AND H.PO_DT <= ? "
-                "ORDER BY H.CO_CD, H.PO_NB, D.PO_SQ"
-            )
-            params = [co_cd, start_date, end_date]
-
-        elif query_name == "출고처리":
-            if not all([co_cd, start_date, end_date]):
-                return jsonify({"error": "회사,시작일자,종료일자 모두 선택해야 합니다."}), 400
-            sql = (
-                "SELECT H.DIV_CD,H.SO_FG, H.ISU_DT, H.TR_CD, H.EXCH_CD, H.EXCH_RT, H.VAT_FG, H.UMVAT_FG, H.SHIP_CD, H.WH_CD, "
-                "'' AS AREA_CD, H.SHIP_FG, H.PLN_CD, H.REMARK_DC, D.ITEM_CD, D.SO_QT, D.ISU_QT, D.UM_FG, D.ISU_UM, "
-                "D.VAT_UM, D.ISUG_AM, D.ISUV_AM, D.ISUH_AM, D.EXCH_UM, D.EXCH_AM, D.LC_CD, D.LOT_NB, D.MGMT_CD, "
-                "D.PJT_CD, D.REMARK_DC AS REMARKD_DC, D.SO_NB, D.SO_SQ, D.REQ_NB, D.REQ_SQ, D.QC_NB, D.QC_SQ "
-                "FROM dbo.LDELIVER AS H "
-                "INNER JOIN dbo.LDELIVER_D AS D ON H.CO_CD = D.CO_CD AND H.ISU_NB = D.ISU_NB "
-                "WHERE H.CO_CD = ? AND H.ISU_DT >= ? AND H.ISU_DT <= ? "
-                "ORDER BY H.CO_CD, D.ISU_NB, D.ISU_SQ"
-            )
-            params = [co_cd, start_date, end_date]
-            
-        elif query_name == "수금등록":
-            if not all([co_cd, start_date, end_date]):
-                return jsonify({"error": "회사,시작일자,종료일자 모두 선택해야 합니다."}), 400
-            sql = (
-               "SELECT H.RCP_FG RCPH_FG,H.RCP_DT,H.TR_CD,H.REF_DC,H.PLN_CD,H.REMARK_DC,D.RCP_FG,D.RCPMGTR_CD,D.RCPMG_DC,D.JATA_FG,D.NORMAL_AM,D.BEFORE_AM,"
-                "D.BANK_CD,D.ISU_DT,D.DUE_DT,D.REMARK_DC REMARKD_DC,H.MGMT_CD,D.PJT_CD " 
-                "FROM LRCP H INNER JOIN LRCP_D D ON H.CO_CD = D.CO_CD AND H.RCP_NB =D.RCP_NB "
-                "WHERE H.RCP_FG = '0' AND H.CO_CD = ? AND H.rcp_DT BETWEEN ? AND ? "
-                "ORDER BY H.RCP_NB"
-            )
-            params = [co_cd, start_date, end_date]
-            
-        elif query_name == "생산실적":
-            if not all([co_cd, start_date, end_date]):
-                return jsonify({"error": "회사,시작일자,종료일자 모두 선택해야 합니다."}), 400
-            sql = (
-                "SELECT DOC_DT, ITEM_CD, ITEM_QT, MOVEBASELOC_CD, MOVELOC_CD, LOT_NB, PJT_CD,'' MGMT_CD, "
-                "PLN_CD,DOC_CD DOC_DC, BASELOC_CD, LOC_CD, EQUIP_CD "
-                "FROM LORCV_H WHERE CO_CD = ? AND DOC_DT >=  ? AND DOC_DT <= ? "
-                "UNION ALL "
-                "SELECT DOC_DT,PITEM_CD,ITEM_QT,BASELOC_CD,LOC_CD,LOT_NB,PJT_CD,MGMT_CD,PLN_CD,DOC_CD REMARK_DC,WR_WH_CD,WR_LC_CD,EQUIP_CD FROM LPRODUCTION "
-                "WHERE CO_CD = ? AND DOC_DT >= ? AND DOC_DT <= ?"
-            )
-            params = [co_cd, start_date, end_date,co_cd, start_date, end_date]
-
-        elif query_name == "생산출고":
-            if not all([co_cd, start_date, end_date]):
-                return jsonify({"error": "회사,시작일자,종료일자 모두 선택해야 합니다."}), 400
-            sql = (
-                "SELECT U.USE_DT ISU_DT, U.ITEM_CD, U.USE_QT ISU_QT, '' FWH_CD, '' FLC_CD, '' PLN_CD, "
-                "H.DOC_CD WR_CD, H.ITEM_CD ITEMPARENT_CD, '' LOT_NB, U.PJT_CD, U.MGMT_CD, U.REMARK_DC, "
-                "'' WO_CD, '' MATL_SQ, '' OP_NB "
-                "FROM LORCV_H H "
-                "LEFT OUTER JOIN LMTL_USE U ON H.CO_CD = U.CO_CD AND H.DOC_CD = U.WR_CD "
-                "WHERE H.CO_CD = ? AND U.USE_DT >= ? AND  U.USE_DT <= ? "
-                "union all "
-                "SELECT H.DOC_DT,D.CITEM_CD,D.USE_QT,D.BASELOC_CD,D.LOC_CD, '' PLN_CD,D.DOC_CD, H.PITEM_CD,D.LOT_NB,'' PJT_CD,'' MGMT_CD,D.REMARK_DC ,'' WO_CD, '' MATL_SQ, '' OP_NB "
-                "FROM LPRODUCTION H INNER JOIN  LPRODUCTION_D D ON H.CO_CD = D.CO_CD AND H.DOC_CD = D.DOC_CD "
-                "WHERE H.CO_CD = ? AND H.DOC_DT >= ? AND  H.DOC_DT <= ?"
-            )
-            params = [co_cd, start_date, end_date,co_cd, start_date, end_date]
-
-        elif query_name == "재고조정":
-            if not all([co_cd, start_date, end_date]):
-                return jsonify({"error": "회사,시작일자,종료일자 모두 선택해야 합니다."}), 400
-            sql = (
-                "SELECT CASE WHEN H.ADJUST_FG='0' THEN '기초' WHEN H.ADJUST_FG='1' THEN '입고' WHEN H.ADJUST_FG='2' THEN '출고' END ADJUST_FG,H.DIV_CD, "
-                "H.ADJUST_DT, H.WH_CD, H.LC_CD, H.REMARK_DC, H.TR_CD, H.PLN_CD, D.ITEM_CD, "
-                "CASE WHEN H.ADJUST_FG ='0' THEN D.OPEN_QT WHEN H.ADJUST_FG = '1' THEN D.RCV_QT ELSE D.ISU_QT END ADJUST_QT, "
-                "D.ADJUST_UM, D.ADJUST_AM, D.MGMT_CD, D.PJT_CD, D.LOT_NB, D.REMARK_DC REMARKD_DC "
-                "FROM LADJUST H "
-                "INNER JOIN LADJUST_D D ON H.CO_CD = D.CO_cD AND H.ADJUST_NB = D.ADJUST_NB "
-                "WHERE H.CO_CD = ? AND H.ADJUST_DT >= ? AND H.ADJUST_DT <= ? AND ADJUST_FG IN ('0','1','2')"
-            )
-            params = [co_cd, start_date, end_date]
-            
-        elif query_name == "재고이동":
-            if not all([co_cd, start_date, end_date]):
-                return jsonify({"error": "회사,시작일자,종료일자 모두 선택해야 합니다."}), 400
-            sql = (
-                "SELECT H.MOVE_DT,H.PLN_CD,H.REMARK_DC,D.ITEM_CD,D.MOVE_QT,H.FWH_CD,H.FLC_CD," 
-                "H.TWH_CD,H.TLC_CD,D.LOT_NB,D.PJT_CD,H.MGMT_CD,D.REMARK_DC REMARKD_DC "
-                "FROM LSTKMOVE H INNER JOIN LSTKMOVE_D D ON H.CO_CD = D.CO_CD AND H.MOVE_NB = D.MOVE_NB "
-                "WHERE H.CO_CD = ? AND H.MOVE_DT >= ? AND  H.MOVE_DT <= ?"
-            )
-            params = [co_cd, start_date, end_date]
-
-        elif query_name == "회계초기이월":
-            if not all([co_cd, start_date]):
-                return jsonify({"error": "회사,시작일자,종료일자 모두 선택해야 합니다."}), 400
-            sql = (
-                "SELECT GISU,DIV_CD,ACCT_CD,ISU_SQ,DEPT_CD,EMP_CD,ACCT_AM,TR_CD,CT_DEPT,"
-                "'' CASH_CD,PJT_CD,'' M_EMP_CD,'' EXCH_RT,'' EXCH_CD,'' EXCH_AM,'' BL_NO FROM APREV "
-                "WHERE CO_CD = ? AND FILL_DT = LEFT(?,4)+'0101'"
-            )
-            params = [co_cd, start_date]
-
-        elif query_name == "급여자료 추출":
-            if not all([co_cd, start_date, end_date]):
-                return jsonify({"error": "회사, 시작일, 종료일을 모두 선택해야 합니다."}), 400
-            sql = "EXEC sp_GetDynamicPayrollPivot_Fixed ?, ?, ?"
-            start_year = start_date[:4]
-            end_year = end_date[:4]
-            params = [co_cd, start_year, end_year]
-
-        elif query_name == "자동전표처리":
-            if not all([co_cd, start_date, end_date]):
-                return jsonify({"error": "회사,시작일자,종료일자 모두 선택해야 합니다."}), 400
-            sql = (
-                "SELECT H.DIV_CD AS IN_DIV_CD, H.ISU_DT AS MENU_DT, H.ISU_SQ AS MENU_SQ, D.LN_SQ AS MENU_LN_SQ, "
-                "H.ISU_DOC, H.DOCU_TY, D.DRCR_FG,LEFT(D.ACCT_CD,3) +'00'+ RIGHT(D.ACCT_CD,2) ACCT_CD, D.TR_CD, D.TR_NM, D.ACCT_AM, D.ATTR_CD, D.RMK_DC, "
-                "T.DIV_CD VAT_DIV_CD, H.FILL_DT ISS_DT , D.CT_DEAL TAX_FG, T.NONSUB_TY, T.SUP_AM, T.DUMMY1, T.CASH_AM, "
-                "T.BILL_AM, D.CT_NB,"
-                "CASE WHEN D.CT_DEAL = '24' THEN D.CT_QT ELSE D.CT_AM END CT_AM, T.JEONJA_YN, T.ASSET_AM, T.ASSET_VAT, "
-                "CASE WHEN AV2.ASSET_FG = '1' THEN AV2.ITEM_DC ELSE '' END AS ASSET_FG1, "
-                "CASE WHEN AV2.ASSET_FG = '1' THEN ISNULL(AV2.MATT_CNT, 0) ELSE 0 END AS MATT_CNT1, "
-                "CASE WHEN AV2.ASSET_FG = '1' THEN ISNULL(AV2.SUP_AM, 0) ELSE 0 END AS SUP_AM1, "
-                "CASE WHEN AV2.ASSET_FG = '1' THEN ISNULL(AV2.VAT_AM, 0) ELSE 0 END AS VAT_AM1, "
-                "CASE WHEN AV2.ASSET_FG = '2' THEN AV2.ITEM_DC ELSE '' END AS ASSET_FG2, "
-                "CASE WHEN AV2.ASSET_FG = '2' THEN ISNULL(AV2.MATT_CNT, 0) ELSE 0 END AS MATT_CNT2, "
-                "CASE WHEN AV2.ASSET_FG = '2' THEN ISNULL(AV2.SUP_AM, 0) ELSE 0 END AS SUP_AM2, "
-                "CASE WHEN AV2.ASSET_FG = '2' THEN ISNULL(AV2.VAT_AM, 0) ELSE 0 END AS VAT_AM2, "
-                "CASE WHEN AV2.ASSET_FG = '3' THEN AV2.ITEM_DC ELSE '' END AS ASSET_FG3, "
-                "CASE WHEN AV2.ASSET_FG = '3' THEN ISNULL(AV2.MATT_CNT, 0) ELSE 0 END AS MATT_CNT3, "
-                "CASE WHEN AV2.ASSET_FG = '3' THEN ISNULL(AV2.SUP_AM, 0) ELSE 0 END AS SUP_AM3, "
-                "CASE WHEN AV2.ASSET_FG = '3' THEN ISNULL(AV2.VAT_AM, 0) ELSE 0 END AS VAT_AM3, "
-                "CASE WHEN AV2.ASSET_FG = '4' THEN AV2.ITEM_DC ELSE '' END AS ASSET_FG4, "
-                "CASE WHEN AV2.ASSET_FG = '4' THEN ISNULL(AV2.MATT_CNT, 0) ELSE 0 END AS MATT_CNT4, "
-                "CASE WHEN AV2.ASSET_FG = '4' THEN ISNULL(AV2.SUP_AM, 0) ELSE 0 END AS SUP_AM4, "
-                "CASE WHEN AV2.ASSET_FG = '4' THEN ISNULL(AV2.VAT_AM, 0) ELSE 0 END AS VAT_AM4, "
-                "SB.BILL_NB, SB.ISS_DT ISSUE_DT, SB.DUE_DT, SB.BANK_CD FIN_CD, '' BILLCASH_CD, SB.ISU_NM, SB.ENDORS_NM, "
-                "SB.BILL_FG1, SB.BILL_FG2, SB.DEAL_FG, "
-                "CASE WHEN D.ACCT_CD IN ('13300','26300') THEN LEFT(D.CT_NB,3) + '00' + RIGHT(D.CT_NB,2) ELSE '' END LACCT_CD, CASE WHEN D.FR_DT = '00000000' THEN '' ELSE D.FR_DT END FR_DT, CASE WHEN D.TO_DT='00000000' THEN '' ELSE D.TO_DT END TO_DT, "
-                "CASE WHEN D.ACCT_CD IN ('13300','26300') THEN D.CT_DEAL ELSE '' END CALC_TY, "
-                "CASE WHEN D.DEPTCD_TY = 'C1' THEN D.CT_DEPT ELSE '' END CT_DEPT, "
-                "CASE WHEN D.DEPTCD_TY = 'C2' THEN D.CT_DEPT ELSE '' END CASH_CD, "
-                "CASE WHEN D.USER1_TY = 'L1' THEN D.CT_USER1 ELSE '' END CAR_CD, "
-                "CASE WHEN D.DEPTCD_TY = 'C4' THEN D.CT_DEPT ELSE '' END FI_IN_CD, "
-                "CASE WHEN D.DEPTCD_TY = 'C5' THEN D.CT_DEPT ELSE '' END SEC_CD, "
-                "CASE WHEN D.DEPTCD_TY = 'C9' THEN D.CT_DEPT ELSE '' END LOCAL_CD, "
-                "CASE WHEN D.PJTCD_TY = 'D1' THEN D.PJT_CD ELSE '' END PJT_CD, "
-                "CASE WHEN D.PJTCD_TY = 'D3' THEN D.PJT_CD ELSE '' END WH_CD, "
-                "CASE WHEN D.PJTCD_TY = 'D4' THEN D.PJT_CD ELSE '' END M_EMP_CD, "
-                "CASE WHEN D.PJTCD_TY = 'D5' THEN D.PJT_CD ELSE '' END M_DIV_CD, "
-                "CASE WHEN D.PJTCD_TY = 'D6' THEN D.PJT_CD ELSE '' END ITEMGRP_CD, "
-                "CASE WHEN D.PJTCD_TY = 'D8' THEN D.PJT_CD ELSE '' END PROC_FG, "
-                "CASE WHEN D.CTNB_TY = 'E2' THEN D.CT_NB ELSE '' END BL_NB, "
-                "CASE WHEN D.CTNB_TY = 'E3' THEN D.CT_NB ELSE '' END LC_NB, "
-                "CASE WHEN D.CTNB_TY = 'E4' THEN D.CT_NB ELSE '' END STOCK_NB, "
-                "CASE WHEN D.CTNB_TY = 'E5' THEN LEFT(D.CT_NB,3) + '00' + RIGHT(D.CT_NB,2) ELSE ''  END SUB_ACCT, "
-                "CASE WHEN D.CTNB_TY = 'E6' THEN D.CT_NB ELSE '' END ITEM_CD, "
-                "CASE WHEN D.CTNB_TY = 'E7' THEN D.CT_NB ELSE '' END ASSET_CD, "
-                "CASE WHEN D.CTNB_TY = 'E8' THEN D.CT_NB ELSE '' END LOAN_NB, "
-                "CASE WHEN D.CTNB_TY = 'E9' THEN D.CT_NB ELSE '' END LEND_NB, "
-                "CASE WHEN D.CTNB_TY = 'EA' THEN D.CT_NB ELSE '' END MA_NB, "
-                "CASE WHEN D.FRDT_TY = 'F1' THEN D.FR_DT ELSE '' END OCCUR_DT, "
-                "CASE WHEN D.FRDT_TY = 'F2' THEN D.FR_DT ELSE '' END START_DT, "
-                "CASE WHEN D.FRDT_TY = 'F3' THEN D.FR_DT ELSE '' END REQ_DT, "
-                "CASE WHEN D.TODT_TY = 'G1' THEN D.TO_DT ELSE '' END EXP_DT, "
-                "CASE WHEN D.TODT_TY = 'G2' THEN D.TO_DT ELSE '' END END_DT, "
-                "CASE WHEN D.TODT_TY = 'G3' THEN D.TO_DT ELSE '' END REPAY_DT, "
-                "CASE WHEN D.QT_TY = 'H1' THEN D.CT_QT ELSE 0 END CT_QT, "
-                "CASE WHEN D.QT_TY = 'H2' THEN D.CT_QT ELSE 0 END REPAY_QT, "
-                "CASE WHEN D.QT_TY = 'H3' THEN D.CT_QT ELSE 0 END NDEDUCTION_AM, "
-                "CASE WHEN D.QT_TY = 'H5' THEN D.CT_QT ELSE 0 END EXCH_RT, "
-                "CASE WHEN D.QT_TY = 'H6' THEN D.CT_QT ELSE 0 END CARDRCP_AM, "
-                "CASE WHEN D.AM_TY = 'I2' THEN D.CT_AM ELSE 0 END PARV_AM, "
-                "CASE WHEN D.AM_TY = 'I3' THEN D.CT_AM ELSE 0 END STANDARD_AM, "
-                "CASE WHEN D.AM_TY = 'I4' THEN D.CT_AM ELSE 0 END UNIT_AM, "
-                "CASE WHEN D.AM_TY = 'I5' THEN D.CT_AM ELSE 0 END FORE_AM, "
-                "CASE WHEN D.AM_TY = 'I6' THEN D.CT_AM ELSE 0 END PAY_AM, "
-                "CASE WHEN D.RT_TY = 'J1' THEN D.CT_RT ELSE 0 END INTER_RT, "
-                "CASE WHEN D.RT_TY = 'J2' THEN D.CT_RT ELSE 0 END DISCOUNT_RT, "
-                "CASE WHEN D.RT_TY = 'J3' THEN D.CT_RT ELSE 0 END FEE_RT, "
-                "CASE WHEN D.DEAL_TY = 'K1' THEN D.CT_DEAL ELSE '' END CT_DEAL, "
-                "CASE WHEN D.DEAL_TY = 'K2' THEN D.CT_DEAL ELSE '' END EXCH_CD, "
-                "CASE WHEN D.DEAL_TY = 'K3' THEN D.CT_DEAL ELSE '' END RECBILL_FG, "
-                "CASE WHEN D.DEAL_TY = 'K4' THEN D.CT_DEAL ELSE '' END PAYBILL_FG, "
-                "CASE WHEN D.DEAL_TY = 'K6' THEN D.CT_DEAL ELSE '' END OTHER_FG, "
-                "CASE WHEN D.DEAL_TY = 'K7' THEN D.CT_DEAL ELSE '' END COLLECT_FG, "
-                "CASE WHEN D.DEAL_TY = 'K8' THEN D.CT_DEAL ELSE '' END EVALUATION_FG, "
-                "CASE WHEN D.DEAL_TY = 'K9' THEN D.CT_DEAL ELSE '' END CALC_FG, "
-                "CT_USER1 USERL_TY1, '' USERL_TY2, '' USERL_TY3, '' USERL_TY4, '' USERL_TY5, '' USERL_TY6, '' USERL_TY7, '' USERL_TY8, '' USERL_TY9, "
-                "CT_USER2 USERM_TY1, '' USERM_TY2, '' USERM_TY3, '' USERM_TY4, '' USERM_TY5, '' USERM_TY6, '' USERM_TY7, '' USERM_TY8, '' USERM_TY9, "
-                "'' CEO_NM, '' REG_NB, '' BUSINESS, '' JONGMOK, '' DIV_ADDR1, '' ADDR2, '' TEL, '' EMAIL, '' EMPGRP_CD, '' TRCHARGE_EMP, "
-                "'' TRCHARGE_EMAIL, '' TRCHARGE_DEPT, '' TRCHARGE_TEL, '' TRCHARGE_HP, '' ISS_NO, d.DIV_CD2, d.MGT_CD, d.BOTTOM_CD, d.BGT_CD, d.RMK_NB "
-                "FROM ADOCUH H "
-                "INNER JOIN ADOCUD D ON H.CO_CD = D.CO_CD AND H.ISU_DT = D.ISU_DT AND H.ISU_SQ = D.ISU_SQ "
-                "LEFT OUTER JOIN ATAX T ON D.CO_CD = T.CO_CD AND D.ISU_DT = T.ISU_DT AND D.ISU_SQ = T.ISU_SQ AND D.LN_SQ = T.LN_SQ "
-                "LEFT OUTER JOIN AVASSET2 AV2 ON D.CO_CD = AV2.CO_CD AND D.ISU_DT = AV2.ISU_DT AND D.ISU_SQ = AV2.ISU_SQ AND D.LN_SQ = AV2.LN_SQ "
-                "LEFT OUTER JOIN SBILL SB ON D.CO_CD = SB.CO_CD AND D.ISU_DT = SB.ISU_DT AND D.ISU_SQ = SB.ISU_SQ AND D.LN_SQ = SB.LN_SQ "
-                "WHERE D.CO_CD = ? AND CONVERT(DATE, H.ISU_DT, 112) >= ? AND H.ISU_DT <= ? " 
-                "ORDER BY H.ISU_DT, H.ISU_SQ, D.LN_SQ"
-            )
-            params = [co_cd, start_date, end_date]
+        spec, error = _prepare_fetch(request.json)
+        if error:
+            return error
 
-        else:
-            return jsonify({"error": "유효하지 않은 쿼리 이름입니다."}), 400
-        
-        app.logger.info(f"실행할 쿼리: {sql}")
-        app.logger.info(f"전달할 파라미터: {params}")
-        # --- 변경점 끝 ---
-
-        conn_str = (f'DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={db_config["server"]};DATABASE={db_config["database"]};UID={db_config["uid"]};PWD={db_config["password"]};TrustServerCertificate=yes;')
-        with pyodbc.connect(conn_str, timeout=10) as cnxn:
-            df = pd.read_sql(sql, cnxn, params=params)
-
-        app.logger.info(f"데이터 조회 완료: {len(df)}개")
-        
-        df = df.replace({np.nan: None})
-
-        data_id = str(uuid.uuid4())
-        filepath = os.path.join(TEMP_DIR, f"{data_id}.parquet")
-        df.to_parquet(filepath, engine='pyarrow')
-        session['data_id'] = data_id
-        session['query_name'] = query_name  #
-        session['co_cd'] = co_cd 
-        session['co_nm'] = co_nm 
-        
-        preview_df = df.head(100)
-        
-        return jsonify({
-            "message": f"총 {len(df)}개 데이터 조회 완료. 상위 100개를 미리보기로 표시합니다.",
-            "columns": list(preview_df.columns),
-            "data": preview_df.to_dict(orient='records')
-        })
+        result = _run_fetch(spec)
+        _remember_fetch(result)
+        return jsonify(_fetch_message(result))
 
     except Exception as e:
         app.logger.error(f"데이터 조회 중 오류: {e}", exc_info=True)
         return jsonify({"error": f"서버 오류: {str(e)}"}), 500
 
-import openpyxl  # 파일 상단에 import 되어 있는지 확인
-# export_excel 함수만 수정
-@app.route('/api/export', methods=['POST'])
-def export_excel():
-    filepath = None
-    try:
-        data_id = session.get('data_id')
-        query_name = session.get('query_name')
-        co_cd = session.get('co_cd')
-        co_nm = session.get('co_nm')
 
-        if not all([data_id, query_name, co_cd]):
-            return jsonify({"error": "데이터를 먼저 조회해야 합니다."}), 400
+# --- 조회 전 행 수 추정 (pre-flight) ---
+# 조회하기 전에 같은 쿼리/조건의 결과 행 수를 추정해 분할 라인 수와 조회 방식(fetch_mode)을 제안합니다.
+#   - cache: 최근 조회 결과 캐시에 같은 조회가 있으면 그 행 수 (정확, DB 조회 없음)
+#   - count: 같은 SQL/파라미터로 COUNT_BIG(*) 실행 (정확). 최상위 ORDER BY 는 빼고,
+#            SELECT 목록을 COUNT_BIG(*) 로 바꾸거나 (DISTINCT/GROUP BY/UNION/TOP 이면) 파생 테이블로 감쌉니다.
+#   - stats: COUNT 가 ESTIMATE_TIMEOUT_SECONDS 안에 끝나지 않거나 실패하면, 최상위 FROM 의 첫 테이블 행 수를
+#            SQL Server 통계(sys.partitions)에서 읽음 — 조건을 반영하지 않은 상한값
+#   - 프로시저(EXEC)는 실행 전에 행 수를 알 수 없어 추정하지 않습니다.
+ESTIMATE_TIMEOUT_SECONDS = int(os.environ.get('ESTIMATE_TIMEOUT_SECONDS', '30'))
+ESTIMATE_PARTITION_ROWS = int(os.environ.get('ESTIMATE_PARTITION_ROWS', '1000000'))   # 이 이상이면 기간 분할 조회 제안
+ESTIMATE_MAX_PARTS = int(os.environ.get('ESTIMATE_MAX_PARTS', '20'))   # 기본 분할 라인 수로 이보다 많은 파일이 되면 분할 라인 수를 늘림
+DEFAULT_SPLIT_ROWS = 50000
+XLSX_MAX_ROWS = 1048576
 
-        filepath = os.path.join(TEMP_DIR, f"{data_id}.parquet")
-        if not os.path.exists(filepath):
-            return jsonify({"error": "서버에 데이터가 존재하지 않습니다. 다시 조회해주세요."}), 404
 
-        df = pd.read_parquet(filepath, engine='pyarrow')
-        if df.empty:
-            return jsonify({"error": "변환할 데이터가 없습니다."}), 400
+def _count_query(sql):
+    """같은 조건의 COUNT_BIG(*) SQL (파라미터 순서 유지). 만들 수 없으면 None"""
+    if not re.match(r'\s*SELECT\b', sql, re.I):
+        return None   # 프로시저(EXEC), CTE(WITH) 등
+    depths = _sql_depths(sql)
+    order_by = _find_keyword(sql, depths, r'\bORDER\s+BY\b')
+    end = order_by if order_by >= 0 else len(sql)
+    from_ = _find_keyword(sql, depths, r'\bFROM\b')
+    if from_ < 0:
+        return None
+    dropped = sql[:from_] + sql[end:]
+    if '?' in (ch for ch, depth in zip(dropped, depths[:from_] + depths[end:]) if depth is not None):
+        return None   # 빼는 부분(SELECT 목록/ORDER BY)에 바인딩 파라미터가 있으면 순서가 어긋남
+    if (re.match(r'\s*SELECT\s+(DISTINCT|TOP)\b', sql, re.I)
+            or _find_keyword(sql, depths, r'\b(GROUP\s+BY|UNION|HAVING)\b', end=end) >= 0):
+        # SELECT 목록을 바꾸면 행 수가 달라지는 형태: ORDER BY 만 빼고 파생 테이블로 감쌈
+        # (이름 없는/중복 컬럼이 있으면 SQL Server 가 거부하고, 이때는 통계 추정으로 넘어감)
+        return f"SELECT COUNT_BIG(*) FROM ({sql[:end].rstrip()}) AS estimate_q"
+    return "SELECT COUNT_BIG(*) " + sql[from_:end].rstrip()
 
-        data = request.get_json(silent=True)
-        if data is None:
-            data = {}
-            
-        split_rows = int(data.get('split_rows', 50000))
-
-        download_filename = f'{co_cd}_{query_name}_data.zip'  # ZIP 파일명 생성
-        zip_buffer = io.BytesIO()
-
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED, False) as zf:
-            for i in range(0, len(df), split_rows):
-                chunk_df = df.iloc[i:i + split_rows]
-                file_name = f"{co_cd}_{co_nm}_{query_name}_part_{i // split_rows + 1}.xlsx"
-
-                # 급여자료 추출의 경우 템플릿을 사용하지 않고 새 엑셀 파일 생성
-                if query_name == "급여자료 추출":
-                    workbook = openpyxl.Workbook()
-                    worksheet = workbook.active
-                    worksheet.title = "급여자료"
-
-                    # 헤더 작성
-                    for col_idx, column_name in enumerate(chunk_df.columns, start=1):
-                        worksheet.cell(row=1, column=col_idx, value=column_name)
-                        worksheet.cell(row=1, column=col_idx).font = Font(bold=True)
-
-                    # 데이터 작성
-                    for row_idx, row_data in enumerate(chunk_df.itertuples(index=False), start=2):
-                        for col_idx, cell_value in enumerate(row_data, start=1):
-                            if pd.isna(cell_value):
-                                cell_value = ""
-                            worksheet.cell(row=row_idx, column=col_idx, value=cell_value)
-
-                    # 열 너비 자동 조정
-                    for col_idx, column_name in enumerate(chunk_df.columns, start=1):
-                        max_length = max(
-                            len(str(cell_value)) if cell_value else 0
-                            for cell_value in [column_name] + chunk_df.iloc[:, col_idx - 1].astype(str).tolist()
-                        )
-                        worksheet.column_dimensions[get_column_letter(col_idx)].width = max_length + 2
-
-                    # 엑셀 파일을 메모리에 저장
-                    excel_buffer = io.BytesIO()
-                    workbook.save(excel_buffer)
-                    excel_buffer.seek(0)
-
-                    zf.writestr(file_name, excel_buffer.getvalue())
-                else:
-                    # 기존 템플릿 기반 처리
-                    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-                    TEMPLATE_FOLDER = os.path.join(BASE_DIR, 'excel_templates')
-
-                    template_config = {
-                        "거래처등록": {"file": "거래처등록_template.xlsx", "start_row": 4},
-                        "사원정보": {"file": "사원정보_template.xlsx", "start_row": 8},
-                        "부서정보": {"file": "부서정보_template.xlsx", "start_row": 22},
-                        "사원정보2": {"file": "사원정보2_template.xlsx", "start_row": 8},
-                        "조직정보": {"file": "조직정보_template.xlsx", "start_row": 8},
-                        "주문정보": {"file": "주문정보_template.xlsx", "start_row": 4},
-                        "생산실적": {"file": "생산입고_template.xlsx", "start_row": 4},
-                        "생산출고": {"file": "생산출고_template.xlsx", "start_row": 4},
-                        "상용직정보": {"file": "상용직정보_template.xlsx", "start_row": 8},
-                        "품목등록": {"file": "품목등록_template.xlsx", "start_row": 4},
-                        "BOM등록": {"file": "BOM등록_template.xlsx", "start_row": 4},
-                        "품목군등록": {"file": "품목군등록_template.xlsx", "start_row": 4},
-                        "기초재고": {"file": "기초재고_template.xlsx", "start_row": 4},
-                        "관리내역등록": {"file": "관리내역등록_template.xlsx", "start_row": 4},
-                        "물류담당자등록": {"file": "물류담당자등록_template.xlsx", "start_row": 4},
-                        "고객별물류담당자등록": {"file": "고객별물류담당자등록_template.xlsx", "start_row": 4},
-                        "프로젝트등록": {"file": "프로젝트등록_template.xlsx", "start_row": 4},
-                        "창고": {"file": "창고_template.xlsx", "start_row": 4},
-                        "공정": {"file": "공정_template.xlsx", "start_row": 4},
-                        "발주등록": {"file": "발주등록_template.xlsx", "start_row": 4},
-                        "수금등록": {"file": "수금등록_template.xlsx", "start_row": 4},
-                        "입고처리": {"file": "입고처리_template.xlsx", "start_row": 4},
-                        "출고처리": {"file": "출고처리_template.xlsx", "start_row": 4},
-                        "재고조정": {"file": "재고조정_template.xlsx", "start_row": 4},
-                        "재고이동": {"file": "재고이동_template.xlsx", "start_row": 4},
-                        "회계초기이월": {"file": "회계초기이월_template.xlsx", "start_row": 4},
-                        "자동전표처리": {"file": "자동전표처리_template.xlsx", "start_row": 4},
-                        "납품처등록": {"file": "납품처등록_template.xlsx", "start_row": 4},
-                    }
 
-                    config = template_config.get(query_name)
-                    if not config:
-                        app.logger.error(f"템플릿 설정이 없음: {query_name}")
-                        return jsonify({"error": f"'{query_name}'에 대한 엑셀 템플릿 설정이 없습니다."}), 400
+def _stats_table(sql):
+    """최상위 FROM 의 첫 테이블 이름 (하위 쿼리 등이면 None)"""
+    depths = _sql_depths(sql)
+    from_ = _find_keyword(sql, depths, r'\bFROM\b')
+    match = re.match(r'FROM\s+([\w.\[\]]+)', sql[from_:], re.I) if from_ >= 0 else None
+    return match.group(1) if match else None
 
-                    template_filename = config.get("file")
-                    start_row = config.get("start_row", 4)
-                    template_path = os.path.join(TEMPLATE_FOLDER, template_filename)
 
-                    if not os.path.exists(template_path):
-                        app.logger.error(f"템플릿 파일을 찾을 수 없음: {template_path}")
-                        return jsonify({"error": f"엑셀 템플릿 파일({template_filename})을 찾을 수 없습니다."}), 404
+def _query_scalar(cnxn, sql, params, timeout):
+    """첫 행 첫 값을 조회합니다. timeout 초가 지나면 드라이버가 쿼리를 취소합니다."""
+    previous = cnxn.timeout
+    cnxn.timeout = timeout
+    try:
+        cursor = cnxn.cursor()
+        try:
+            row = cursor.execute(sql, params).fetchone()
+            return row[0] if row else None
+        finally:
+            cursor.close()
+    finally:
+        cnxn.timeout = previous
+
+
+def _estimate_rows(spec):
+    """결과 행 수 추정. 반환값: (행 수, 방법, 참고) — 추정할 수 없으면 (None, None, 사유)"""
+    with _result_cache_lock:
+        cached = _lookup_result_locked(_fetch_fingerprint(spec), time.time())
+    if cached is not None:
+        return cached["total_rows"], "cache", "최근 조회 결과의 행 수입니다."
 
-                    workbook = openpyxl.load_workbook(template_path)
-                    worksheet = workbook.active
+    query_name = spec["query_name"]
+    count_sql = _count_query(spec["sql"])
+    note = "프로시저 실행 결과는 미리 추정할 수 없습니다."
+    if count_sql:
+        try:
+            with _db_connection(spec["db_config"], query_name) as cnxn, _stage('estimate', query_name) as info:
+                rows = int(_query_scalar(cnxn, count_sql, spec["params"], ESTIMATE_TIMEOUT_SECONDS) or 0)
+                info["rows"] = rows
+            return rows, "count", None
+        except pyodbc.Error as e:
+            app.logger.warning(f"{query_name}: COUNT 추정 실패, 통계로 추정합니다. ({e})")
+            note = f"COUNT 조회 실패: {e}"
 
-                    for r_idx, row_data in enumerate(chunk_df.itertuples(index=False), start=start_row):
-                        for c_idx, cell_value in enumerate(row_data, 1):
-                            if pd.isna(cell_value):
-                                cell_value = ""
-                            worksheet.cell(row=r_idx, column=c_idx, value=cell_value)
+    table = _stats_table(spec["sql"])
+    if table:
+        try:
+            with _db_connection(spec["db_config"], query_name) as cnxn:
+                rows = _query_scalar(cnxn, "SELECT SUM(rows) FROM sys.partitions WHERE object_id = OBJECT_ID(?) AND index_id IN (0, 1)",
+                                     [table], ESTIMATE_TIMEOUT_SECONDS)
+            if rows is not None:
+                return int(rows), "stats", f"조건을 반영하지 않은 {table} 테이블 전체 행 수(상한)입니다."
+        except pyodbc.Error as e:
+            app.logger.warning(f"{query_name}: 통계 추정 실패 ({e})")
+            note = f"통계 조회 실패: {e}"
+    return None, None, note
 
-                    excel_buffer = io.BytesIO()
-                    workbook.save(excel_buffer)
-                    excel_buffer.seek(0)
 
-                    zf.writestr(file_name, excel_buffer.getvalue())
+def _suggest_fetch_plan(spec, rows):
+    """추정 행 수로 분할 라인 수, 파일 수, 조회 방식을 제안합니다."""
+    entry = QUERY_REGISTRY[spec["query_name"]]
+    split_rows = DEFAULT_SPLIT_ROWS
+    if rows is None:
+        return {"split_rows": split_rows, "parts": None, "fetch_mode": 'stream'}
+    if rows > split_rows * ESTIMATE_MAX_PARTS:
+        # 파일이 너무 많아지면 만 단위로 올려 늘리되, 시트 한 장의 최대 행 수(헤더 제외)를 넘지 않게
+        max_rows = XLSX_MAX_ROWS - ((entry.get("start_row") or 2) - 1)
+        split_rows = min(max_rows, -(-rows // (ESTIMATE_MAX_PARTS * 10000)) * 10000)
+    # 큰 결과는 날짜 구간별 동시 조회, 그 외에는 취소 가능한 스트리밍 조회
+    fetch_mode = 'partitioned' if rows >= ESTIMATE_PARTITION_ROWS and _partition_windows(spec) else 'stream'
+    if fetch_mode == 'partitioned' and spec["fetch_mode"] == 'incremental':
+        fetch_mode = 'incremental'   # 증분 데이터셋을 쓰고 있으면 유지
+    return {"split_rows": split_rows, "parts": max(1, -(-rows // split_rows)), "fetch_mode": fetch_mode}
 
-        zip_buffer.seek(0)
-        return send_file(zip_buffer, as_attachment=True, download_name=download_filename, mimetype='application/zip')
+
+@app.route('/api/estimate', methods=['POST'])
+def estimate_rows():
+    """[신규] 조회 전에 결과 행 수를 추정하고 분할 라인 수와 조회 방식을 제안합니다."""
+    try:
+        spec, error = _prepare_fetch(request.get_json(silent=True) or {})
+        if error:
+            return error
+        rows, method, note = _estimate_rows(spec)
+        plan = _suggest_fetch_plan(spec, rows)
+        if rows is None:
+            message = f"행 수를 추정할 수 없습니다. ({note})"
+        else:
+            message = (f"예상 {rows:,}행{' 이하' if method == 'stats' else ''}: 분할 라인 수 {plan['split_rows']:,}"
+                       f" (파일 {plan['parts']}개), 조회 방식 {plan['fetch_mode']} 을(를) 권장합니다.")
+        return jsonify({
+            "query_name": spec["query_name"],
+            "estimated_rows": rows,
+            "method": method,
+            "note": note,
+            "suggested_split_rows": plan["split_rows"],
+            "suggested_parts": plan["parts"],
+            "suggested_fetch_mode": plan["fetch_mode"],
+            "message": message,
+        })
+    except Exception as e:
+        app.logger.error(f"행 수 추정 중 오류: {e}", exc_info=True)
+        return jsonify({"error": f"서버 오류: {str(e)}"}), 500
+
+
+# --- 미리보기 페이지 조회 ---
+# 저장된 조회 결과 Parquet 에서 원하는 페이지만 읽어 돌려줍니다. (DB 재조회 없음)
+#   - 필요한 컬럼만, 페이지가 걸친 row group 만 읽음
+#   - 필터는 row group 통계(min/max)로 건너뛸 수 있는 그룹을 건너뛰고, 나머지는 필터 컬럼만 읽어 판정
+#   - 정렬은 row group 마다 (정렬 키, 위치) 상위 offset + limit 개만 유지하며 병합
+PREVIEW_MAX_PAGE_ROWS = 1000
+PREVIEW_MAX_SORT_ROWS = int(os.environ.get('PREVIEW_MAX_SORT_ROWS', '100000'))   # 정렬 시 offset + limit 상한
+
+_PREVIEW_COMPARE_OPS = {
+    "eq": pc.equal, "ne": pc.not_equal,
+    "lt": pc.less, "le": pc.less_equal, "gt": pc.greater, "ge": pc.greater_equal,
+}
+_PREVIEW_FILTER_OPS = set(_PREVIEW_COMPARE_OPS) | {"contains", "isnull", "notnull"}
+
+
+def _parse_preview_request(data, schema):
+    """페이지 조회 요청 검사. 반환값: (옵션, 오류 메시지)"""
+    try:
+        offset = int(data.get('offset') or 0)
+        limit = int(data.get('limit') or PREVIEW_ROWS)
+    except (TypeError, ValueError):
+        return None, "offset, limit 은 숫자여야 합니다."
+    if offset < 0 or not 0 < limit <= PREVIEW_MAX_PAGE_ROWS:
+        return None, f"offset 은 0 이상, limit 은 1~{PREVIEW_MAX_PAGE_ROWS} 이어야 합니다."
+
+    columns = data.get('columns') or schema.names
+    unknown = [column for column in columns if column not in schema.names]
+    if unknown:
+        return None, f"존재하지 않는 컬럼입니다: {', '.join(map(str, unknown))}"
+
+    sort = data.get('sort')
+    if sort:
+        if sort.get('column') not in schema.names:
+            return None, f"정렬 컬럼이 없습니다: {sort.get('column')}"
+        if offset + limit > PREVIEW_MAX_SORT_ROWS:
+            return None, f"정렬한 미리보기는 상위 {PREVIEW_MAX_SORT_ROWS}행까지만 볼 수 있습니다."
+        sort = {"column": sort['column'], "desc": bool(sort.get('desc'))}
+
+    filters = []
+    for item in data.get('filters') or []:
+        column, op, value = item.get('column'), item.get('op', 'eq'), item.get('value')
+        if column not in schema.names:
+            return None, f"필터 컬럼이 없습니다: {column}"
+        if op not in _PREVIEW_FILTER_OPS:
+            return None, f"지원하지 않는 필터 조건입니다: {op}"
+        field_type = schema.field(column).type
+        if op in _PREVIEW_COMPARE_OPS:
+            # 요청 값(문자열/숫자)을 컬럼 타입으로 변환 ("2024-01-31" → date 등)
+            try:
+                value = pa.scalar(value).cast(field_type)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+                return None, f"'{column}' 컬럼 값으로 변환할 수 없습니다: {value}"
+        elif op == 'contains':
+            value = str(value)
+        filters.append({"column": column, "op": op, "value": value})
+    return {"offset": offset, "limit": limit, "columns": columns, "sort": sort, "filters": filters}, None
+
+
+def _row_group_may_match(row_group, schema, condition):
+    """row group 통계로 봤을 때 조건을 만족하는 행이 있을 수 있는지"""
+    op = condition["op"]
+    if op not in ('eq', 'lt', 'le', 'gt', 'ge'):
+        return True
+    stats = row_group.column(schema.get_field_index(condition["column"])).statistics
+    if stats is None or not stats.has_min_max:
+        return True
+    value = condition["value"].as_py()
+    try:
+        if op == 'eq':
+            return stats.min <= value <= stats.max
+        if op in ('lt', 'le'):
+            return stats.min < value or (op == 'le' and stats.min == value)
+        return stats.max > value or (op == 'ge' and stats.max == value)
+    except TypeError:
+        return True
+
+
+def _preview_mask(table, filters):
+    """필터 조건을 모두 만족하는 행 마스크 (NULL 비교는 불일치)"""
+    mask = None
+    for condition in filters:
+        column = table.column(condition["column"])
+        op = condition["op"]
+        if op == 'isnull':
+            matched = pc.is_null(column)
+        elif op == 'notnull':
+            matched = pc.is_valid(column)
+        elif op == 'contains':
+            if not pa.types.is_string(column.type):
+                column = pc.cast(column, pa.string())
+            matched = pc.match_substring(column, condition["value"])
+        else:
+            matched = _PREVIEW_COMPARE_OPS[op](column, condition["value"])
+        matched = pc.fill_null(matched, False)
+        mask = matched if mask is None else pc.and_(mask, matched)
+    return mask
+
+
+def _read_preview_page(filepath, options):
+    """조회 결과 파일에서 한 페이지를 읽습니다. 반환값: (행 목록, 조건에 맞는 전체 행 수)"""
+    part = pq.ParquetFile(filepath)
+    schema = part.schema_arrow
+    offset, limit, columns = options["offset"], options["limit"], options["columns"]
+    filters, sort = options["filters"], options["sort"]
+    filter_columns = list(dict.fromkeys(condition["column"] for condition in filters))
+
+    matched_rows = 0
+    pages = []          # 정렬 없음: 페이지에 들어가는 행 조각
+    candidates = None   # 정렬: (키, row group, 행 위치) 상위 offset + limit 개
+    for group in range(part.num_row_groups):
+        row_group = part.metadata.row_group(group)
+        if not all(_row_group_may_match(row_group, schema, condition) for condition in filters):
+            continue
+        if not filters and not sort:
+            # 필터/정렬이 없으면 row group 행 수만으로 페이지 위치를 알 수 있음
+            count = row_group.num_rows
+            if matched_rows < offset + limit and matched_rows + count > offset:
+                table = part.read_row_group(group, columns=columns)
+                start = max(0, offset - matched_rows)
+                pages.append(table.slice(start, offset + limit - matched_rows - start))
+            matched_rows += count
+            continue
+
+        keys = part.read_row_group(group, columns=list(dict.fromkeys(filter_columns + ([sort["column"]] if sort else []))))
+        mask = _preview_mask(keys, filters) if filters else None
+        count = (pc.sum(mask).as_py() or 0) if mask is not None else keys.num_rows
+        if sort:
+            positions = pc.indices_nonzero(mask) if mask is not None else pa.array(range(keys.num_rows), pa.uint64())
+            found = pa.table({
+                "key": keys.column(sort["column"]).take(positions),
+                "group": pa.array([group] * len(positions), pa.int32()),
+                "row": positions,
+            })
+            candidates = found if candidates is None else pa.concat_tables([candidates, found])
+            candidates = candidates.sort_by(
+                [("key", "descending" if sort["desc"] else "ascending"), ("group", "ascending"), ("row", "ascending")]
+            ).slice(0, offset + limit)
+        elif matched_rows < offset + limit and matched_rows + count > offset:
+            table = part.read_row_group(group, columns=columns)
+            if mask is not None:
+                table = table.filter(mask)
+            start = max(0, offset - matched_rows)
+            pages.append(table.slice(start, offset + limit - matched_rows - start))
+        matched_rows += count
+
+    if sort:
+        if candidates is None:
+            return [], matched_rows
+        page = candidates.slice(offset, limit)
+        groups = page.column("group").to_pylist()
+        rows = page.column("row").to_pylist()
+        pieces, order = [], []
+        for group in dict.fromkeys(groups):
+            picked = [n for n, g in enumerate(groups) if g == group]
+            pieces.append(part.read_row_group(group, columns=columns).take([rows[n] for n in picked]))
+            order.extend(picked)
+        if not pieces:
+            return [], matched_rows
+        table = pa.concat_tables(pieces).take(pc.sort_indices(pa.array(order)))
+        return table.to_pylist(), matched_rows
+    return [row for table in pages for row in table.to_pylist()], matched_rows
+
+
+@app.route('/api/preview', methods=['POST'])
+def preview_data():
+    """조회 결과의 원하는 페이지를 돌려줍니다. (offset, limit, columns, sort, filters)"""
+    data_id = session.get('data_id')
+    if not data_id:
+        return jsonify({"error": "데이터를 먼저 조회해야 합니다."}), 400
+    if not _result_store.touch(data_id):
+        return jsonify({"error": "서버에 데이터가 존재하지 않습니다. 다시 조회해주세요."}), 404
+
+    try:
+        filepath = _result_store.path(data_id)
+        with _result_store.pinned(data_id):
+            schema = pq.read_schema(filepath)
+            options, error = _parse_preview_request(request.json or {}, schema)
+            if error:
+                return jsonify({"error": error}), 400
+            rows, matched_rows = _read_preview_page(filepath, options)
+            total_rows = pq.ParquetFile(filepath).metadata.num_rows
+        return jsonify({
+            "columns": options["columns"],
+            "data": rows,
+            "offset": options["offset"],
+            "limit": options["limit"],
+            "total_rows": total_rows,
+            "matched_rows": matched_rows,
+        })
+    except Exception as e:
+        app.logger.error(f"미리보기 조회 중 오류: {e}", exc_info=True)
+        return jsonify({"error": f"서버 오류: {str(e)}"}), 500
+
+import openpyxl  # 파일 상단에 import 되어 있는지 확인
+
+# --- 엑셀 템플릿 캐시 ---
+# 템플릿 파일 경로별로 한 번만 해석해 두고 (파일 mtime/크기가 바뀌면 다시 읽음) 파트마다 재사용합니다.
+# 프로세스 풀 워커도 각자 이 캐시를 가지므로 파트 수만큼 템플릿을 다시 파싱하지 않습니다.
+_template_cache = {}   # (경로, 종류) -> ((mtime_ns, size), 값)
+_template_cache_lock = threading.Lock()
+
+
+def _cached_template(template_path, kind, loader):
+    """템플릿 캐시 조회. 파일이 그 자리에서 수정되었으면 다시 읽어 교체합니다."""
+    stat = os.stat(template_path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    key = (template_path, kind)
+    with _template_cache_lock:
+        entry = _template_cache.get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    value = loader(template_path)
+    with _template_cache_lock:
+        _template_cache[key] = (version, value)
+    if entry is not None:
+        app.logger.info(f"템플릿 변경 감지, 다시 읽음: {template_path}")
+    return value
+
+
+def _get_xlsx_template(template_path):
+    """고속 기록기용으로 해석된 템플릿 (읽기 전용 공유 객체이므로 수정하지 말 것)"""
+    return _cached_template(template_path, 'xml', _parse_xlsx_template)
+
+
+def _load_template_workbook(template_path):
+    """openpyxl 템플릿 워크북의 사본을 돌려줍니다.
+
+    처음 한 번 load_workbook 한 결과를 pickle 스냅샷으로 보관하고, 사용할 때마다 복원해서
+    매번 xlsx 를 다시 파싱하는 비용(수백 ms) 대신 수십 ms 로 독립된 사본을 만듭니다.
+    """
+    snapshot = _cached_template(template_path, 'openpyxl',
+                                lambda path: pickle.dumps(openpyxl.load_workbook(path), pickle.HIGHEST_PROTOCOL))
+    return pickle.loads(snapshot)
+
+
+# --- 내보내기 전 검증 (템플릿 컬럼 규칙) ---
+# 템플릿 헤더 영역의 컬럼 설명 셀("타입 : 문자 길이 : 10 필수 : True ...")에서 컬럼별 규칙을 읽고,
+# 저장된 조회 결과를 row group 단위로 읽어 규칙마다 Arrow 마스크로 검사합니다. (행 단위 파이썬 루프 없음)
+#   required  : NULL / 빈 문자열 금지
+#   max_length: 문자·코드 컬럼의 글자 수 상한
+#   date      : 날짜 컬럼은 실제로 있는 날짜의 YYYYMMDD 8자리
+#   number    : 숫자 컬럼은 숫자로 해석되고 정수부가 (길이 - 소수 자릿수) 자리 이내
+# 규칙은 템플릿 열 순서(= 데이터 컬럼 위치)로 대응시키고, 빈 값은 required 외의 규칙에서 검사하지 않습니다.
+# 쿼리가 상수로 채우는 컬럼(예: 사원정보의 '' AS 로그인ID)은 데이터로 고칠 수 없으므로 검사하지 않습니다.
+# EXPORT_VALIDATION: block (위반이 있으면 엑셀/CSV 내보내기를 시작하지 않음, 요청의 skip_validation 으로 무시)
+#                    / warn (로그만 남김) / off
+EXPORT_VALIDATION = os.environ.get('EXPORT_VALIDATION', 'block')
+VALIDATION_SAMPLE_ROWS = int(os.environ.get('VALIDATION_SAMPLE_ROWS', '5'))   # 규칙별로 돌려줄 위반 행 예시 수
+_VALIDATION_RULE_NAMES = {
+    "required": "필수값 누락",
+    "max_length": "길이 초과",
+    "date": "날짜 형식(YYYYMMDD) 오류",
+    "number": "숫자 형식/자릿수 오류",
+}
+_SPEC_TYPE_RE = re.compile(r'타입\s*:\s*(\S+)')
+_SPEC_LENGTH_RE = re.compile(r'길이\s*:\s*(\d+)(?:\s*,\s*(\d+))?')
+_SPEC_REQUIRED_RE = re.compile(r'필수(?:여부)?\s*:\s*(\S+)')
+_NUMBER_TEXT_RE = r'^\s*[-+]?(\d+\.?\d*|\.\d+)\s*$'
+
+
+def _parse_column_spec(text):
+    """컬럼 설명 셀 하나를 규칙 dict 로 변환합니다. 설명 셀이 아니면 None"""
+    kind = _SPEC_TYPE_RE.search(text)
+    if kind is None:
+        return None
+    length = _SPEC_LENGTH_RE.search(text)
+    required = _SPEC_REQUIRED_RE.search(text)
+    return {
+        "type": kind.group(1),
+        "length": int(length.group(1)) if length else None,
+        "scale": int(length.group(2)) if length and length.group(2) else 0,
+        "required": required is not None and required.group(1) in ('True', '필수'),
+    }
+
+
+def _template_column_rules(template_path, start_row):
+    """템플릿의 컬럼별 규칙 목록 (열 순서대로, 설명이 없는 열은 None). 설명 행이 없는 템플릿은 []"""
+    def load(path):
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        try:
+            rows = list(workbook.active.iter_rows(max_row=start_row - 1, values_only=True))
+        finally:
+            workbook.close()
+        for row in rows:
+            rules = [_parse_column_spec(value) if isinstance(value, str) else None for value in row]
+            if any(rules):
+                return rules
+        return []
+    return _cached_template(template_path, f'rules_{start_row}', load)
+
+
+def _rule_violations(column, rule):
+    """컬럼 하나에 규칙을 적용해 (규칙 이름, 위반 마스크) 목록을 돌려줍니다."""
+    value_type = column.type
+    if pa.types.is_null(value_type):
+        return [("required", pa.array([True] * len(column)))] if rule["required"] else []
+    is_text = pa.types.is_string(value_type) or pa.types.is_large_string(value_type)
+    text = column if is_text else pc.cast(column, pa.string())
+    empty = pc.is_null(column)
+    if is_text:
+        empty = pc.or_(empty, pc.equal(pc.utf8_trim_whitespace(text), ''))
+    elif pa.types.is_floating(value_type):
+        empty = pc.or_(empty, pc.is_nan(column))
+    present = pc.invert(empty)
+
+    violations = []
+    if rule["required"]:
+        violations.append(("required", empty))
+    if rule["type"] in ('문자', '코드') and rule["length"]:
+        violations.append(("max_length", pc.and_(present, pc.greater(pc.utf8_length(text), rule["length"]))))
+    elif rule["type"] == '날짜' and (is_text or pa.types.is_integer(value_type)):
+        # strptime 은 20240230 을 3월 1일로 넘기므로 다시 문자열로 바꿔 원래 값과 같은지 봅니다.
+        parsed = pc.strptime(text, format='%Y%m%d', unit='s', error_is_null=True)
+        valid = pc.and_(pc.match_substring_regex(text, r'^\d{8}$'), pc.equal(pc.strftime(parsed, format='%Y%m%d'), text))
+        violations.append(("date", pc.and_(present, pc.invert(pc.fill_null(valid, False)))))
+    elif rule["type"] == '숫자':
+        if is_text:
+            valid = pc.match_substring_regex(text, _NUMBER_TEXT_RE)
+            number = pc.cast(pc.if_else(valid, pc.utf8_trim_whitespace(text), '0'), pa.float64())
+        elif pa.types.is_integer(value_type) or pa.types.is_floating(value_type) or pa.types.is_decimal(value_type):
+            valid, number = pa.array([True] * len(column)), pc.cast(column, pa.float64())
+        else:
+            valid, number = pa.array([False] * len(column)), None
+        invalid = pc.invert(valid)
+        if number is not None and rule["length"]:
+            limit = 10.0 ** (rule["length"] - rule["scale"])
+            invalid = pc.or_(invalid, pc.greater_equal(pc.abs(number), limit))
+        violations.append(("number", pc.and_(present, invalid)))
+    return [(name, pc.fill_null(mask, False)) for name, mask in violations]
+
+
+def _validate_result(filepath, template_path, start_row, query_name=''):
+    """저장된 조회 결과를 템플릿 규칙으로 검사해 규칙별 위반 건수와 예시 행을 돌려줍니다.
+
+    템플릿이 없거나 규칙이 없는 템플릿이면 rules 가 0 인 결과를 돌려줍니다.
+    """
+    rules = _template_column_rules(template_path, start_row) if template_path else []
+    entry = QUERY_REGISTRY.get(query_name)
+    constants = _constant_select_positions(entry["sql"]) if entry else set()
+    parquet_file = pq.ParquetFile(filepath)
+    names = parquet_file.schema_arrow.names
+    targets = [(name, rule, position) for position, (name, rule) in enumerate(zip(names, rules), start=1)
+               if rule and position not in constants]
+    report = {"checked_rows": parquet_file.metadata.num_rows, "rules": 0, "total_violations": 0, "violations": []}
+    if not targets:
+        return report
+
+    found = {}   # (컬럼, 규칙) -> 위반 정보
+    with _stage('validate', query_name) as info:
+        offset = 0
+        for rg in range(parquet_file.num_row_groups):
+            table = parquet_file.read_row_group(rg, columns=list(dict.fromkeys(name for name, _, _ in targets)))
+            for name, rule, position in targets:
+                column = table.column(name).combine_chunks()
+                for rule_name, mask in _rule_violations(column, rule):
+                    entry = found.setdefault((position, rule_name), {
+                        "column": name, "position": position, "rule": rule_name,
+                        "description": _VALIDATION_RULE_NAMES[rule_name], "type": rule["type"],
+                        "length": rule["length"], "count": 0, "samples": [],
+                    })
+                    count = pc.sum(mask).as_py() or 0
+                    if not count:
+                        continue
+                    entry["count"] += count
+                    need = VALIDATION_SAMPLE_ROWS - len(entry["samples"])
+                    if need > 0:
+                        for index in pc.indices_nonzero(mask)[:need].to_pylist():
+                            entry["samples"].append({"row": offset + index + 1, "value": column[index].as_py()})
+            offset += table.num_rows
+        info["rows"] = offset
+
+    report["rules"] = len(found)
+    report["violations"] = [entry for _, entry in sorted(found.items()) if entry["count"]]
+    report["total_violations"] = sum(entry["count"] for entry in report["violations"])
+    return report
+
+
+def _validation_summary(report, limit=5):
+    """검증 결과를 한 줄 안내 문구로 만듭니다."""
+    items = [f"{entry['column']} {entry['description']} {entry['count']:,}건" for entry in report["violations"][:limit]]
+    if len(report["violations"]) > limit:
+        items.append(f"외 {len(report['violations']) - limit}개 규칙")
+    return f"검증 오류 {report['total_violations']:,}건 ({', '.join(items)})"
+
+
+class _ValidationFailed(ValueError):
+    """내보내기 전 검증에서 위반이 나옴 (작업 상태에 검증 결과를 함께 남김)"""
+
+    def __init__(self, report):
+        super().__init__(f"{_validation_summary(report)}. 데이터를 확인하거나 검증을 무시하고 내보내세요.")
+        self.report = report
+
+
+@app.route('/api/validate', methods=['POST'])
+def validate_data():
+    """[신규] 세션의 조회 결과를 템플릿 컬럼 규칙으로 검사합니다."""
+    try:
+        data_id = session.get('data_id')
+        query_name = session.get('query_name')
+        if not data_id or not query_name:
+            return jsonify({"error": "데이터를 먼저 조회해야 합니다."}), 400
+        if not _result_store.touch(data_id):
+            return jsonify({"error": "서버에 데이터가 존재하지 않습니다. 다시 조회해주세요."}), 404
+        template, error = _export_template(query_name)
+        if error:
+            return error
+        with _result_store.pinned(data_id):
+            report = _validate_result(_result_store.path(data_id), template["template_path"], template["start_row"], query_name)
+        return jsonify(report)
+    except Exception as e:
+        app.logger.error(f"검증 중 오류: {e}", exc_info=True)
+        return jsonify({"error": f"서버 오류: {str(e)}"}), 500
+
+# --- 엑셀 내보내기 헬퍼 ---
+ZIP_COPY_CHUNK = 1024 * 1024          # 파트 파일을 ZIP 항목으로 옮길 때의 블록 크기
+
+# parallel: 파트 엑셀을 프로세스 풀에서 동시에 생성 / serial: 요청 스레드에서 하나씩 생성
+EXPORT_MODE = os.environ.get('EXPORT_MODE', 'parallel')
+EXPORT_POOL_SIZE = int(os.environ.get('EXPORT_POOL_SIZE', str(min(4, os.cpu_count() or 1))))
+EXPORT_MAX_WORKERS = int(os.environ.get('EXPORT_MAX_WORKERS', str(EXPORT_POOL_SIZE)))  # 요청 1건이 동시에 쓸 수 있는 워커 수 상한
+
+_export_pool = None
+_export_pool_lock = threading.Lock()
+
+
+def _get_export_pool():
+    """파트 생성용 프로세스 풀 (프로세스 전체에서 1개, 처음 사용할 때 생성)"""
+    global _export_pool
+    with _export_pool_lock:
+        if _export_pool is None:
+            # Flask 스레드가 떠 있는 상태에서 fork 하면 락이 꼬일 수 있어 spawn 을 사용합니다.
+            _export_pool = ProcessPoolExecutor(max_workers=EXPORT_POOL_SIZE,
+                                               mp_context=multiprocessing.get_context('spawn'))
+        return _export_pool
+
+
+class _ZipStream(io.RawIOBase):
+    """ZipFile 이 쓴 바이트를 모아 두었다가 응답 제너레이터가 꺼내 가는 쓰기 전용 버퍼.
+
+    seek/tell 을 지원하지 않으므로 ZipFile 은 data descriptor 방식으로 항목을 기록합니다.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _read_parquet_rows(filepath, start, stop):
+    """Parquet 파일의 [start, stop) 행만 Arrow 테이블로 읽습니다. (겹치는 row group 만 읽음)
+
+    문자열 컬럼은 Parquet 사전(dictionary) 인코딩 그대로 읽습니다. CO_CD, USE_YN 같은 코드값 컬럼을
+    행마다 파이썬 문자열 객체로 만들지 않고, 사전 하나와 정수 코드 배열로만 들고 있습니다.
+    """
+    schema = pq.read_schema(filepath)
+    strings = [field.name for field in schema if pa.types.is_string(field.type) or pa.types.is_large_string(field.type)]
+    parquet_file = pq.ParquetFile(filepath, read_dictionary=strings)
+    row_groups = []
+    first_row = None
+    offset = 0
+    for rg in range(parquet_file.num_row_groups):
+        rg_rows = parquet_file.metadata.row_group(rg).num_rows
+        if offset < stop and offset + rg_rows > start:
+            if first_row is None:
+                first_row = offset
+            row_groups.append(rg)
+        offset += rg_rows
+    if not row_groups:
+        return parquet_file.schema_arrow.empty_table()
+    table = parquet_file.read_row_groups(row_groups)
+    # row group 마다 사전이 따로 있으므로 하나로 합쳐 둠 (컬럼별 코드 배열 하나)
+    return table.slice(start - first_row, stop - start).unify_dictionaries().combine_chunks()
+
+
+def _column_values(column):
+    """Arrow 컬럼을 셀 값 목록으로 변환합니다. (NULL, NaN 은 빈 값 "")"""
+    return ["" if value is None or value != value else value for value in column.to_pylist()]
+
+
+def _build_payroll_part(chunk, part_path, query_name=''):
+    """급여자료 추출: 템플릿 없이 새 엑셀 파일을 만들어 part_path 에 저장합니다.
+
+    급여 피벗은 컬럼이 매우 많으므로 셀 객체를 만들지 않습니다. 열 너비는 Arrow 로 컬럼마다 한 번에 계산하고,
+    굵은 헤더 행과 열 너비만 있는 작은 워크북을 템플릿 삼아 고속 기록기로 데이터 행을 기록합니다.
+    고속 기록기가 다루지 않는 값(날짜 등)이 있으면 openpyxl 쓰기 전용(write-only) 시트로 처리합니다.
+    """
+    with _stage('sheet_fill', query_name) as info:
+        widths = _payroll_column_widths(chunk)
+        columns = _prepare_xlsx_columns(chunk) if XLSX_WRITER == 'fast' else None
+        info["rows"] = chunk.num_rows
+    if columns is None:
+        _build_payroll_part_write_only(chunk, widths, part_path, query_name)
+        return
+    with _stage('template_load', query_name):
+        template = _payroll_template(chunk.column_names, widths)
+    with _stage('workbook_save', query_name) as info:
+        _write_xlsx_from_template(template, columns, chunk.num_rows, 2, part_path)
+        info["rows"], info["bytes"] = chunk.num_rows, os.path.getsize(part_path)
+
+
+def _payroll_column_widths(chunk):
+    """급여자료 열 너비: 헤더와 값의 문자열 길이 중 최댓값 + 2 (빈 값, 0 은 0자로 계산)
+
+    문자열이 아닌 컬럼은 Arrow 에서 문자열로 변환해 길이를 구하고, 사전 인코딩 컬럼은 고유값 길이만 구해
+    코드 배열로 펼치므로 값마다 str() 을 부르는 파이썬 루프가 없습니다.
+    """
+    widths = []
+    for column_name, column in zip(chunk.column_names, chunk.columns):
+        if isinstance(column, pa.ChunkedArray):
+            column = column.combine_chunks()
+        values, indices = (column.dictionary, column.indices) if pa.types.is_dictionary(column.type) else (column, None)
+        longest = 0
+        if not pa.types.is_null(values.type) and len(column):
+            try:
+                text = values if pa.types.is_string(values.type) else pc.cast(values, pa.string())
+            except (pa.ArrowNotImplementedError, pa.ArrowInvalid):
+                lengths = pa.array([len(str(value)) if value else 0 for value in values.to_pylist()], pa.int32())
+            else:
+                lengths = pc.utf8_length(text)
+                # 엑셀에 빈 값으로 쓰이는 NaN 과 거짓 값(0, False)은 0자
+                if pa.types.is_floating(values.type):
+                    # Arrow 는 정수값 실수를 "100" 으로, 파이썬 str() 은 "100.0" 으로 씀
+                    integral = pc.invert(pc.match_substring_regex(text, '[.eEna]'))
+                    lengths = pc.add(lengths, pc.if_else(integral, 2, 0))
+                    lengths = pc.if_else(pc.or_(pc.equal(values, 0), pc.is_nan(values)), 0, lengths)
+                elif pa.types.is_integer(values.type) or pa.types.is_decimal(values.type):
+                    lengths = pc.if_else(pc.equal(values, 0), 0, lengths)
+                elif pa.types.is_boolean(values.type):
+                    lengths = pc.if_else(values, lengths, 0)
+            if indices is not None:
+                lengths = pc.take(lengths, indices)
+            longest = pc.max(lengths).as_py() or 0
+        widths.append(max(len(str(column_name)), longest) + 2)
+    return widths
+
+
+def _payroll_template(column_names, widths):
+    """굵은 헤더 행과 열 너비만 있는 급여자료 워크북을 만들어 고속 기록기 템플릿으로 해석합니다."""
+    workbook = openpyxl.Workbook()
+    worksheet = workbook.active
+    worksheet.title = "급여자료"
+    for col_idx, (column_name, width) in enumerate(zip(column_names, widths), start=1):
+        worksheet.cell(row=1, column=col_idx, value=column_name).font = Font(bold=True)
+        worksheet.column_dimensions[get_column_letter(col_idx)].width = width
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return _parse_xlsx_template(buffer)
+
+
+def _build_payroll_part_write_only(chunk, widths, part_path, query_name=''):
+    """openpyxl 쓰기 전용 시트로 급여자료 파트를 만듭니다. (XLSX_ROW_BLOCK 행씩 변환해 메모리를 일정하게 유지)"""
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet("급여자료")
+    for col_idx, width in enumerate(widths, start=1):
+        worksheet.column_dimensions[get_column_letter(col_idx)].width = width
+
+    with _stage('sheet_fill', query_name) as info:
+        header = []
+        for column_name in chunk.column_names:
+            cell = WriteOnlyCell(worksheet, value=column_name)
+            cell.font = Font(bold=True)
+            header.append(cell)
+        worksheet.append(header)
+        for batch in chunk.to_batches(max_chunksize=XLSX_ROW_BLOCK):
+            for row_data in zip(*(_column_values(column) for column in batch.columns)):
+                worksheet.append(row_data)
+        info["rows"] = chunk.num_rows
+
+    with _stage('workbook_save', query_name) as info:
+        workbook.save(part_path)
+        info["bytes"] = os.path.getsize(part_path)
+
+
+def _build_template_part(chunk, template_path, start_row, part_path, query_name=''):
+    """템플릿 엑셀의 start_row 부터 데이터를 채워 part_path 에 저장합니다.
+
+    기본은 시트 XML 을 직접 만드는 고속 기록기를 쓰고, 지원하지 않는 값(날짜 등)이 있으면 openpyxl 로 처리합니다.
+    고속 기록기는 값 변환을 sheet_fill, 시트 XML 생성과 압축을 workbook_save 단계로 기록합니다.
+    """
+    if XLSX_WRITER == 'fast':
+        with _stage('sheet_fill', query_name) as info:
+            columns = _prepare_xlsx_columns(chunk)
+            info["rows"] = chunk.num_rows
+        if columns is not None:
+            try:
+                with _stage('template_load', query_name):
+                    template = _get_xlsx_template(template_path)
+            except (KeyError, ValueError, AttributeError) as e:
+                app.logger.warning(f"고속 기록기에서 템플릿을 해석할 수 없어 openpyxl 로 처리합니다: {template_path} ({e})")
+            else:
+                with _stage('workbook_save', query_name) as info:
+                    _write_xlsx_from_template(template, columns, chunk.num_rows, start_row, part_path)
+                    info["rows"], info["bytes"] = chunk.num_rows, os.path.getsize(part_path)
+                return
+    _build_template_part_openpyxl(chunk, template_path, start_row, part_path, query_name)
+
+
+def _build_template_part_openpyxl(chunk, template_path, start_row, part_path, query_name=''):
+    """openpyxl 로 템플릿을 열어 셀 단위로 채웁니다. (고속 기록기가 처리하지 못하는 경우)"""
+    with _stage('template_load', query_name):
+        workbook = _load_template_workbook(template_path)
+    worksheet = workbook.active
+
+    with _stage('sheet_fill', query_name) as info:
+        columns = [_column_values(column) for column in chunk.columns]
+        for r_idx, row_data in enumerate(zip(*columns), start=start_row):
+            for c_idx, cell_value in enumerate(row_data, 1):
+                worksheet.cell(row=r_idx, column=c_idx, value=cell_value)
+        info["rows"] = chunk.num_rows
+
+    with _stage('workbook_save', query_name) as info:
+        workbook.save(part_path)
+        info["rows"], info["bytes"] = chunk.num_rows, os.path.getsize(part_path)
+
+
+# --- 템플릿 고속 기록기 ---
+# openpyxl 로 셀 객체를 하나씩 만드는 대신, 템플릿 xlsx 의 다른 파트(스타일, 헤더 행, 숨김 시트 등)는
+# 바이트 그대로 복사하고 활성 시트의 sheetData 에 데이터 행 XML 만 컬럼 단위로 만들어 끼워 넣습니다.
+# 셀 표현은 openpyxl 이 저장하는 형식(inlineStr 문자열, "%.16g" 숫자, 빈 값은 빈 inlineStr 셀)과 같습니다.
+XLSX_WRITER = os.environ.get('XLSX_WRITER', 'fast')   # fast | openpyxl
+XLSX_ROW_BLOCK = 2000                                  # 시트 XML 을 몇 행씩 만들어 기록할지
+XLSX_COMPRESSLEVEL = int(os.environ.get('XLSX_COMPRESSLEVEL', '1'))
+
+_ILLEGAL_XML_CHARS = re.compile(r'[\000-\010]|[\013-\014]|[\016-\037]')  # openpyxl 과 동일한 금지 문자
+_XML_ATTR_RE = re.compile(r'([\w:]+)="([^"]*)"')
+_ROW_RE = re.compile(r'<row\b[^>]*?\br="(\d+)"[^>]*?(?:/>|>.*?</row>)', re.S)
+_CELL_RE = re.compile(r'<c\b[^>]*?\br="([A-Z]+)\d+"[^>]*?(?:/>|>.*?</c>)', re.S)
+_DIMENSION_RE = re.compile(r'<dimension ref="([^"]*)"\s*/>')
+
+
+def _parse_xlsx_template(template_path):
+    """템플릿 xlsx 를 고속 기록기용으로 나눕니다.
+
+    활성 시트(openpyxl 의 workbook.active 와 같은 시트) XML 은 sheetData 앞(head) / 기존 행 / 뒤(tail)로
+    나누고, 나머지 파트는 바이트 그대로 보관합니다.
+    """
+    with zipfile.ZipFile(template_path) as zf:
+        entries = tuple((info.filename, info.date_time, zf.read(info)) for info in zf.infolist())
+    parts = {name: data for name, _, data in entries}
+
+    workbook_xml = parts['xl/workbook.xml'].decode('utf-8')
+    active = re.search(r'<workbookView\b[^>]*\bactiveTab="(\d+)"', workbook_xml)
+    sheet_rids = re.findall(r'<sheet\b[^>]*\br:id="([^"]+)"', workbook_xml)
+    if not sheet_rids:
+        raise ValueError("workbook.xml 에서 시트를 찾을 수 없습니다.")
+    rid = sheet_rids[int(active.group(1)) if active else 0]
+
+    rels_xml = parts['xl/_rels/workbook.xml.rels'].decode('utf-8')
+    target = None
+    for rel in re.findall(r'<Relationship\b[^>]*>', rels_xml):
+        attrs = dict(_XML_ATTR_RE.findall(rel))
+        if attrs.get('Id') == rid:
+            target = attrs['Target']
+    if target is None:
+        raise ValueError(f"시트 관계({rid})를 찾을 수 없습니다.")
+    sheet_path = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+
+    sheet_xml = parts[sheet_path].decode('utf-8')
+    empty = re.search(r'<sheetData\s*/>', sheet_xml)
+    if empty:
+        head, body, tail = sheet_xml[:empty.start()] + '<sheetData>', '', '</sheetData>' + sheet_xml[empty.end():]
+    else:
+        opening = re.search(r'<sheetData\b[^>]*>', sheet_xml)
+        closing = sheet_xml.index('</sheetData>')
+        head, body, tail = sheet_xml[:opening.end()], sheet_xml[opening.end():closing], sheet_xml[closing:]
+
+    dimension = _DIMENSION_RE.search(head)
+    max_col = max_row = 0
+    if dimension:
+        _, _, max_col, max_row = range_boundaries(dimension.group(1).split(':')[-1])
+
+    return {
+        "entries": entries,
+        "sheet_path": sheet_path,
+        "head": head,
+        "rows": tuple((int(m.group(1)), m.group(0)) for m in _ROW_RE.finditer(body)),
+        "tail": tail,
+        "max_col": max_col,
+        "max_row": max_row,
+    }
+
+
+_EMPTY_CELL_TAIL = '" t="inlineStr"/>'   # openpyxl 이 빈 값("")을 저장하는 형태
+
+
+def _inline_string_tail(value):
+    """문자열 값 하나를 셀 XML 의 r 속성 뒤쪽 조각으로 변환합니다."""
+    if value == "":
+        return _EMPTY_CELL_TAIL
+    value = _ILLEGAL_XML_CHARS.sub('', value)
+    text = value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    if value.strip() != value:
+        return f'" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+    return f'" t="inlineStr"><is><t>{text}</t></is></c>'
+
+
+def _number_tails(uniques):
+    """숫자 고유값 배열을 셀 XML 조각 목록으로 변환합니다. (openpyxl 의 safe_string 과 같은 "%.16g")
+
+    금액·수량처럼 정수인 값은 배열 단위로 변환하고, 소수만 값마다 포맷합니다.
+    """
+    values = np.asarray(uniques, dtype=np.float64)
+    integral = np.isfinite(values) & (values == np.trunc(values)) & (np.abs(values) < 1e16)
+    tails = np.full(len(values), _EMPTY_CELL_TAIL, dtype=object)
+    if integral.any():
+        digits = values[integral].astype(np.int64).astype(str).astype(object)
+        tails[integral] = '" t="n"><v>' + digits + '</v></c>'
+    for i in np.flatnonzero(~integral & np.isfinite(values)).tolist():
+        tails[i] = f'" t="n"><v>{values[i]:.16g}</v></c>'
+    return tails.tolist()
+
+
+def _prepare_xlsx_columns(chunk):
+    """Arrow 컬럼마다 행별 셀 XML 조각(r 속성 값 뒤쪽) 배열을 만듭니다.
+
+    컬럼을 사전 인코딩(문자열은 Parquet 에서 읽은 사전 그대로)해 고유값만 한 번씩 변환한 뒤 코드 배열로
+    펼치므로, 값 변환 비용은 행 수가 아니라 고유값 수에 비례합니다. NULL 은 빈 셀입니다.
+    날짜 등 고속 기록기가 다루지 않는 타입이 있으면 None 을 돌려줍니다.
+    """
+    columns = []
+    for column in chunk.columns:
+        if isinstance(column, pa.ChunkedArray):
+            column = column.combine_chunks()
+        value_type = column.type.value_type if pa.types.is_dictionary(column.type) else column.type
+        if pa.types.is_null(value_type):
+            columns.append(np.full(len(column), _EMPTY_CELL_TAIL, dtype=object))
+            continue
+        if pa.types.is_boolean(value_type):
+            convert = lambda uniques: [f'" t="b"><v>{int(v)}</v></c>' for v in uniques.to_pylist()]
+        elif pa.types.is_integer(value_type) or pa.types.is_floating(value_type) or pa.types.is_decimal(value_type):
+            convert = lambda uniques: _number_tails(uniques.to_numpy(zero_copy_only=False))
+        elif pa.types.is_string(value_type) or pa.types.is_large_string(value_type):
+            convert = lambda uniques: [_inline_string_tail(v) for v in uniques.to_pylist()]
+        else:
+            return None
+        encoded = column if pa.types.is_dictionary(column.type) else column.dictionary_encode()
+        uniques = encoded.dictionary
+        codes = encoded.indices.fill_null(len(uniques)).to_numpy(zero_copy_only=False)
+        table = np.array(convert(uniques) + [_EMPTY_CELL_TAIL], dtype=object)
+        columns.append(table[codes])
+    return columns
+
+
+def _render_xlsx_rows(columns, letters, first_row, start, stop):
+    """[start, stop) 행의 셀 XML 을 행별 문자열 목록으로 만듭니다."""
+    row_numbers = [str(r) for r in range(first_row + start, first_row + stop)]
+    rendered = []
+    for letter, tails in zip(letters, columns):
+        prefix = f'<c r="{letter}'
+        rendered.append([prefix + r + tail for r, tail in zip(row_numbers, tails[start:stop].tolist())])
+    return [''.join(cells) for cells in zip(*rendered)]
+
+
+def _merge_template_row(row_xml, cells_xml, letters):
+    """템플릿에 이미 있는 행(예: 샘플 행)에 데이터 셀을 덮어씁니다.
+
+    openpyxl 처럼 행 속성과 셀 스타일(s)은 유지하고, 데이터 컬럼 밖의 템플릿 셀은 그대로 둡니다.
+    """
+    opening = re.match(r'<row\b[^>]*?(?=/?>)', row_xml).group(0)
+    template_cells = {m.group(1): m.group(0) for m in _CELL_RE.finditer(row_xml)}
+    new_cells = dict(zip(letters, re.findall(r'<c\b.*?(?:/>|</c>)', cells_xml)))
+    merged = []
+    for letter in sorted(set(template_cells) | set(new_cells), key=column_index_from_string):
+        cell = new_cells.get(letter)
+        if cell is None:
+            merged.append(template_cells[letter])
+            continue
+        style = re.search(r'\bs="(\d+)"', template_cells.get(letter, '').split('>', 1)[0])
+        if style:
+            cell = cell.replace('" t="', f'" s="{style.group(1)}" t="', 1)
+        merged.append(cell)
+    return f'{opening}>{"".join(merged)}</row>'
+
+
+def _write_xlsx_from_template(template, columns, n_rows, start_row, part_path):
+    """템플릿 파트를 복사하면서 활성 시트에 데이터 행을 XLSX_ROW_BLOCK 단위로 기록합니다."""
+    letters = [get_column_letter(i) for i in range(1, len(columns) + 1)]
+    last_data_row = start_row + n_rows - 1
+    template_rows = template["rows"]
+    overlap = {r: xml for r, xml in template_rows if start_row <= r <= last_data_row}
+
+    head = template["head"]
+    last_col = get_column_letter(max(template["max_col"], len(columns), 1))
+    head = _DIMENSION_RE.sub(f'<dimension ref="A1:{last_col}{max(template["max_row"], last_data_row)}"/>', head, count=1)
+
+    with zipfile.ZipFile(part_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=XLSX_COMPRESSLEVEL) as zf:
+        for name, date_time, data in template["entries"]:
+            info = zipfile.ZipInfo(name, date_time=date_time)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            if name != template["sheet_path"]:
+                zf.writestr(info, data)
+                continue
+            with zf.open(info, 'w') as sheet:
+                sheet.write(head.encode('utf-8'))
+                sheet.write(''.join(xml for r, xml in template_rows if r < start_row).encode('utf-8'))
+                for block_start in range(0, n_rows, XLSX_ROW_BLOCK):
+                    block_stop = min(block_start + XLSX_ROW_BLOCK, n_rows)
+                    rows = _render_xlsx_rows(columns, letters, start_row, block_start, block_stop)
+                    out = []
+                    for r, cells_xml in enumerate(rows, start=start_row + block_start):
+                        if r in overlap:
+                            out.append(_merge_template_row(overlap[r], cells_xml, letters))
+                        else:
+                            out.append(f'<row r="{r}">{cells_xml}</row>')
+                    sheet.write(''.join(out).encode('utf-8'))
+                sheet.write(''.join(xml for r, xml in template_rows if r > last_data_row).encode('utf-8'))
+                sheet.write(template["tail"].encode('utf-8'))
+
+
+def _build_part_file(filepath, start, stop, template_path, start_row, query_name=''):
+    """[start, stop) 행으로 파트 엑셀 1개를 만들고 (임시 파일 경로, 단계별 측정값)을 돌려줍니다.
+
+    프로세스 풀 워커의 진입점이므로 데이터 대신 Parquet 경로와 행 범위만 전달받습니다.
+    측정값은 워커에서 기록할 수 없으므로 부모 프로세스가 받아 _metrics 에 기록합니다.
+    """
+    with _collect_stage_samples() as samples:
+        with _stage('parquet_read', query_name) as info:
+            chunk = _read_parquet_rows(filepath, start, stop)
+            info["rows"] = chunk.num_rows
+        fd, part_path = tempfile.mkstemp(prefix='part_', suffix='.xlsx', dir=TEMP_DIR)
+        os.close(fd)
+        try:
+            if template_path is None:
+                _build_payroll_part(chunk, part_path, query_name)
+            else:
+                _build_template_part(chunk, template_path, start_row, part_path, query_name)
+        except Exception:
+            os.remove(part_path)
+            raise
+    return part_path, samples
+
+
+def _finish_part(result):
+    """파트 결과의 측정값을 기록하고 파트 파일 경로를 돌려줍니다."""
+    part_path, samples = result
+    for sample in samples:
+        _metrics.observe(*sample)
+    return part_path
+
+
+def _remove_part_when_done(future):
+    """취소하지 못한(이미 실행 중인) 파트 작업은 끝난 뒤 결과 파일을 지웁니다."""
+    if future.cancel():
+        return
+
+    def _cleanup(f):
+        if not f.cancelled() and f.exception() is None and os.path.exists(f.result()[0]):
+            os.remove(f.result()[0])
+    future.add_done_callback(_cleanup)
+
+
+def _iter_part_files(filepath, total_rows, split_rows, template_path, start_row, workers, query_name=''):
+    """파트 파일 경로를 part 번호 순서대로 돌려줍니다.
+
+    workers > 1 이면 프로세스 풀에 최대 workers 개까지 미리 제출해 두고, 완료 순서와 관계없이
+    앞 파트부터 차례로 꺼내므로 파트 번호와 ZIP 순서는 항상 같습니다.
+    """
+    ranges = [(i, min(i + split_rows, total_rows)) for i in range(0, total_rows, split_rows)]
+    if workers <= 1 or len(ranges) == 1:
+        for start, stop in ranges:
+            yield _finish_part(_build_part_file(filepath, start, stop, template_path, start_row, query_name))
+        return
+
+    pool = _get_export_pool()
+    pending = collections.deque()
+    remaining = iter(ranges)
+    try:
+        for start, stop in itertools.islice(remaining, workers):
+            pending.append(pool.submit(_build_part_file, filepath, start, stop, template_path, start_row, query_name))
+        while pending:
+            future = pending.popleft()
+            for start, stop in itertools.islice(remaining, 1):
+                pending.append(pool.submit(_build_part_file, filepath, start, stop, template_path, start_row, query_name))
+            yield _finish_part(future.result())
+    finally:
+        # 클라이언트가 끊겼거나 오류가 난 경우 남은 작업 정리
+        for future in pending:
+            _remove_part_when_done(future)
+
+
+# --- CSV / Parquet / Arrow 내보내기 ---
+# 적재/대사용으로 엑셀 템플릿이 필요 없으면 저장된 Parquet 결과를 split_rows 단위 파트로 잘라
+# 셀 단위 파이썬 루프 없이 Arrow 로 ZIP 항목에 바로 기록합니다. (프로세스 풀 없이 요청 스레드에서 처리)
+#   csv: 템플릿의 헤더 행(데이터 시작 행 위)을 먼저 쓰고, 템플릿이 없는 급여자료는 컬럼명을 헤더로 씀
+#   parquet / arrow: 컬럼명·타입 그대로의 원본 데이터 (arrow 는 zstd 압축 IPC 파일 형식)
+EXPORT_FORMATS = ('xlsx', 'csv', 'parquet', 'arrow')
+# utf-8-sig: BOM 이 있어 엑셀에서 열어도 한글이 깨지지 않음 / cp949: BOM 을 읽지 못하는 기존 적재 도구용
+CSV_ENCODINGS = ('utf-8-sig', 'cp949')
+CSV_ENCODING = os.environ.get('CSV_ENCODING', 'utf-8-sig')
+
+
+def _template_header_rows(template_path, start_row):
+    """템플릿의 데이터 시작 행 위(헤더 영역) 값 목록. 빈 셀은 """""
+    def load(path):
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        try:
+            return [["" if value is None else value for value in row]
+                    for row in workbook.active.iter_rows(max_row=start_row - 1, values_only=True)]
+        finally:
+            workbook.close()
+    if start_row <= 1:
+        return []
+    return _cached_template(template_path, f'header_{start_row}', load)
+
+
+def _iter_parquet_slices(parquet_file, start, stop):
+    """[start, stop) 행을 row group 단위 Arrow 테이블로 차례로 돌려줍니다. (원본 스키마 그대로)"""
+    offset = 0
+    for rg in range(parquet_file.num_row_groups):
+        rg_rows = parquet_file.metadata.row_group(rg).num_rows
+        if offset < stop and offset + rg_rows > start:
+            lo, hi = max(start - offset, 0), min(stop - offset, rg_rows)
+            yield parquet_file.read_row_group(rg).slice(lo, hi - lo)
+        offset += rg_rows
+        if offset >= stop:
+            break
+
+
+def _csv_safe(table):
+    """실수 컬럼의 NaN 을 빈 값(NULL)으로 바꿉니다. (엑셀 내보내기와 같은 처리)"""
+    for i, field in enumerate(table.schema):
+        if pa.types.is_floating(field.type):
+            column = table.column(i)
+            table = table.set_column(i, field, pc.if_else(pc.is_nan(column), pa.scalar(None, field.type), column))
+    return table
+
+
+def _write_raw_part(entry, parquet_file, start, stop, ctx, header_rows):
+    """파트 하나를 열려 있는 ZIP 항목(entry)에 ctx 의 형식으로 기록합니다. (row group 마다 yield)"""
+    export_format = ctx["export_format"]
+    slices = _iter_parquet_slices(parquet_file, start, stop)
+    if export_format == 'parquet':
+        with pq.ParquetWriter(entry, parquet_file.schema_arrow) as writer:
+            for table in slices:
+                writer.write_table(table)
+                yield
+    elif export_format == 'arrow':
+        options = pa_ipc.IpcWriteOptions(compression='zstd')
+        with pa_ipc.new_file(entry, parquet_file.schema_arrow, options=options) as writer:
+            for table in slices:
+                writer.write_table(table)
+                yield
+    else:
+        encoding = ctx["csv_encoding"]
+        header = io.StringIO()
+        csv.writer(header, lineterminator='\n').writerows(header_rows or [parquet_file.schema_arrow.names])
+        entry.write(header.getvalue().encode(encoding, errors='replace'))   # utf-8-sig 는 여기서 BOM 이 붙음
+        write_options = pa_csv.WriteOptions(include_header=False)
+        for table in slices:
+            buffer = io.BytesIO()
+            pa_csv.write_csv(_csv_safe(table), buffer, write_options)
+            data = buffer.getvalue()
+            if encoding != 'utf-8-sig':
+                # 해당 코드 페이지에 없는 문자는 ? 로 바뀜
+                data = data.decode('utf-8').encode(encoding, errors='replace')
+            entry.write(data)
+            yield
+
+
+def _write_raw_parts(zf, ctx, folder='', on_part=None):
+    """조회 결과를 CSV / Parquet / Arrow 파트로 나눠 열려 있는 ZipFile 의 folder 아래에 기록합니다."""
+    export_format = ctx["export_format"]
+    header_rows = []
+    if export_format == 'csv' and ctx["template_path"] is not None:
+        header_rows = _template_header_rows(ctx["template_path"], ctx["start_row"])
+    with _result_store.pinned(ctx["data_id"]):
+        parquet_file = pq.ParquetFile(ctx["filepath"])
+        ranges = [(i, min(i + ctx["split_rows"], ctx["total_rows"])) for i in range(0, ctx["total_rows"], ctx["split_rows"])]
+        for part_no, (start, stop) in enumerate(ranges, start=1):
+            file_name = f"{folder}{ctx['co_cd']}_{ctx['co_nm']}_{ctx['query_name']}_part_{part_no}.{export_format}"
+            info = zipfile.ZipInfo(file_name, date_time=time.localtime()[:6])
+            # Parquet/Arrow 는 이미 압축되어 있으므로 ZIP 에서 다시 압축하지 않음
+            info.compress_type = zipfile.ZIP_DEFLATED if export_format == 'csv' else zipfile.ZIP_STORED
+            with _stage('file_write', ctx["query_name"]) as stage_info:
+                # 파트 크기를 미리 알 수 없으므로 2GB 를 넘을 수 있게 ZIP64 로 기록
+                with zf.open(info, 'w', force_zip64=True) as entry:
+                    yield from _write_raw_part(entry, parquet_file, start, stop, ctx, header_rows)
+                stage_info["rows"], stage_info["bytes"] = stop - start, info.compress_size
+            if on_part:
+                on_part(part_no)
+            yield
+
+
+def _attachment_headers(download_filename):
+    """한글 파일명을 포함한 Content-Disposition 헤더 (send_file 과 같은 형식)"""
+    ascii_name = unicodedata.normalize('NFKD', download_filename).encode('ascii', 'ignore').decode('ascii')
+    return {
+        'Content-Disposition': f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(download_filename)}"
+    }
+
+
+def _prepare_export(data, validate_now=True):
+    """세션의 조회 결과와 요청 옵션으로 내보내기 작업 정보를 만듭니다. 반환값: (작업 정보, 오류 응답)
+
+    스트리밍/백그라운드 작업 모두 첫 바이트를 보내기 전에 여기서 설정을 확인합니다.
+    (스트리밍 시작 후에는 JSON 오류를 돌려줄 수 없음)
+    데이터 검증은 전체 결과를 읽어야 하므로 백그라운드 작업(validate_now=False)에서는 작업 안에서 합니다.
+    """
+    data_id = session.get('data_id')
+    query_name = session.get('query_name')
+    co_cd = session.get('co_cd')
+    co_nm = session.get('co_nm')
+
+    if not all([data_id, query_name, co_cd]):
+        return None, (jsonify({"error": "데이터를 먼저 조회해야 합니다."}), 400)
+
+    filepath = _result_store.path(data_id)
+    if not _result_store.touch(data_id):
+        return None, (jsonify({"error": "서버에 데이터가 존재하지 않습니다. 다시 조회해주세요."}), 404)
+
+    total_rows = pq.ParquetFile(filepath).metadata.num_rows
+    if total_rows == 0:
+        return None, (jsonify({"error": "변환할 데이터가 없습니다."}), 400)
+
+    options, error = _export_options(data)
+    if error:
+        return None, error
+    template, error = _export_template(query_name)
+    if error:
+        return None, error
+
+    ctx = {
+        "data_id": data_id,
+        "filepath": filepath,
+        "total_rows": total_rows,
+        "split_rows": options["split_rows"],
+        "workers": options["workers"],
+        "export_format": options["export_format"],
+        "csv_encoding": options["csv_encoding"],
+        "template_path": template["template_path"],
+        "start_row": template["start_row"],
+        "query_name": query_name,
+        "co_cd": co_cd,
+        "co_nm": co_nm,
+        "download_filename": f'{co_cd}_{query_name}_data.zip',  # ZIP 파일명 생성
+        "validate": options["validate"],
+    }
+    if options["validate"] and validate_now:
+        report = _check_export_validation(ctx)
+        if report is not None:
+            error = _ValidationFailed(report)
+            return None, (jsonify({"error": str(error), "validation": report}), 422)
+    return ctx, None
+
+
+def _export_options(data):
+    """분할 라인 수, 파트 생성 워커 수, 내보내기 형식. 반환값: (옵션, 오류 응답)"""
+    split_rows = int(data.get('split_rows', DEFAULT_SPLIT_ROWS))
+    if split_rows <= 0:
+        return None, (jsonify({"error": "분할 라인 수는 1 이상이어야 합니다."}), 400)
+
+    export_format = data.get('export_format') or 'xlsx'
+    if export_format not in EXPORT_FORMATS:
+        return None, (jsonify({"error": f"지원하지 않는 내보내기 형식입니다: {export_format} ({', '.join(EXPORT_FORMATS)})"}), 400)
+    csv_encoding = data.get('csv_encoding') or CSV_ENCODING
+    if csv_encoding not in CSV_ENCODINGS:
+        return None, (jsonify({"error": f"지원하지 않는 CSV 인코딩입니다: {csv_encoding} ({', '.join(CSV_ENCODINGS)})"}), 400)
+
+    # 템플릿 규칙 검증은 ERP 에 올릴 엑셀/CSV 만 (Parquet/Arrow 는 원본 데이터 그대로)
+    validate = EXPORT_VALIDATION != 'off' and export_format in ('xlsx', 'csv') and not data.get('skip_validation')
+
+    export_mode = data.get('export_mode') or EXPORT_MODE
+    workers = 1
+    if export_mode == 'parallel':
+        workers = max(1, min(int(data.get('workers') or EXPORT_MAX_WORKERS), EXPORT_MAX_WORKERS))
+    return {"split_rows": split_rows, "workers": workers, "validate": validate,
+            "export_format": export_format, "csv_encoding": csv_encoding}, None
+
+
+def _check_export_validation(ctx):
+    """내보내기 전 검증. EXPORT_VALIDATION=block 에서 위반이 있으면 검증 결과를, 아니면 None 을 돌려줍니다."""
+    with _result_store.pinned(ctx["data_id"]):
+        report = _validate_result(ctx["filepath"], ctx["template_path"], ctx["start_row"], ctx["query_name"])
+    if not report["total_violations"]:
+        return None
+    if EXPORT_VALIDATION == 'block':
+        return report
+    app.logger.warning(f"{ctx['query_name']} ({ctx['co_cd']}): {_validation_summary(report)}")
+    return None
+
+
+def _export_template(query_name):
+    """쿼리의 엑셀 템플릿 경로와 시작 행 (템플릿이 없는 급여자료는 None). 반환값: (설정, 오류 응답)"""
+    template_path = None
+    start_row = None
+    entry = QUERY_REGISTRY.get(query_name)
+    if not entry:
+        app.logger.error(f"쿼리 설정이 없음: {query_name}")
+        return None, (jsonify({"error": f"'{query_name}'에 대한 엑셀 템플릿 설정이 없습니다."}), 400)
+    if entry["template"]:
+        template_filename = entry["template"]
+        start_row = entry["start_row"]
+        template_path = os.path.join(TEMPLATE_FOLDER, template_filename)
+
+        if not os.path.exists(template_path):
+            app.logger.error(f"템플릿 파일을 찾을 수 없음: {template_path}")
+            return None, (jsonify({"error": f"엑셀 템플릿 파일({template_filename})을 찾을 수 없습니다."}), 404)
+    return {"template_path": template_path, "start_row": start_row}, None
+
+
+def _write_export_zip(fileobj, ctx, on_part=None):
+    """파트 엑셀을 차례로 만들어 fileobj 에 ZIP 으로 기록합니다.
+
+    블록을 기록할 때마다 yield 하므로 스트리밍 응답은 그 사이에 버퍼를 비워 보낼 수 있습니다.
+    on_part 가 있으면 파트를 하나 끝낼 때마다 파트 번호로 호출합니다.
+    """
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as zf:
+        yield from _write_export_parts(zf, ctx, on_part=on_part)
+    # central directory
+    yield
+
+
+def _write_export_parts(zf, ctx, folder='', on_part=None):
+    """조회 결과 하나의 파트 엑셀을 열려 있는 ZipFile 의 folder 아래에 기록합니다. (블록마다 yield)"""
+    if ctx["export_format"] != 'xlsx':
+        yield from _write_raw_parts(zf, ctx, folder, on_part)
+        return
+    with _result_store.pinned(ctx["data_id"]):
+        part_files = _iter_part_files(ctx["filepath"], ctx["total_rows"], ctx["split_rows"],
+                                      ctx["template_path"], ctx["start_row"], ctx["workers"], ctx["query_name"])
+        for part_no, part_path in enumerate(part_files, start=1):
+            file_name = f"{folder}{ctx['co_cd']}_{ctx['co_nm']}_{ctx['query_name']}_part_{part_no}.xlsx"
+            # 스트리밍 응답이면 클라이언트로 보내는 시간도 포함됩니다.
+            started = time.perf_counter()
+            try:
+                with open(part_path, 'rb') as part, zf.open(file_name, 'w') as entry:
+                    for block in iter(lambda: part.read(ZIP_COPY_CHUNK), b''):
+                        entry.write(block)
+                        yield
+            finally:
+                _record_stage('zip_write', ctx["query_name"], time.perf_counter() - started, nbytes=os.path.getsize(part_path))
+                os.remove(part_path)
+            if on_part:
+                on_part(part_no)
+            yield
+
+
+# [수정] ZIP 을 메모리에 다 만든 뒤 보내지 않고, 파트가 완성될 때마다 바로 스트리밍합니다.
+@app.route('/api/export', methods=['POST'])
+def export_excel():
+    try:
+        data = request.get_json(silent=True)
+        if data is None:
+            data = {}
+
+        ctx, error = _prepare_export(data)
+        if error:
+            return error
+
+        def generate():
+            try:
+                stream = _ZipStream()
+                for _ in _write_export_zip(stream, ctx):
+                    chunk = stream.drain()
+                    if chunk:
+                        yield chunk
+            except Exception as e:
+                # 이미 응답 헤더가 나간 뒤이므로 로그만 남기고 연결을 끊습니다. (브라우저는 다운로드 실패로 처리)
+                app.logger.error(f"엑셀 생성 중 오류: {e}", exc_info=True)
+                raise
+
+        # 조회 결과 Parquet 는 지우지 않습니다. (다른 분할 수로 다시 내보낼 수 있도록 결과 캐시가 관리)
+        return Response(generate(), mimetype='application/zip', headers=_attachment_headers(ctx["download_filename"]))
 
     except Exception as e:
         app.logger.error(f"엑셀 생성 중 오류: {e}", exc_info=True)
         return jsonify({"error": f"엑셀 생성 오류: {str(e)}"}), 500
+
+
+# --- 백그라운드 작업 ---
+# 오래 걸리는 조회/내보내기를 요청 스레드 밖의 작업 스레드에서 실행하고,
+# 클라이언트는 작업 ID 로 진행 상황(stage, rows, parts)을 조회한 뒤 결과를 받아 갑니다.
+# 실행 중인 작업은 /api/jobs/<id>/cancel 로 취소할 수 있습니다. (위 '작업 취소' 참고, 진행 보고 시점마다 취소 여부 확인)
+# 작업은 등록받은 프로세스의 스레드에서 실행됩니다. RESULT_STORE_BACKEND=shared 이면 작업 상태를 결과 저장소에도 기록해
+# 다른 워커/레플리카가 받은 상태 조회/다운로드 요청도 처리하고, 취소 요청은 파일로 남겨 실행 중인 워커가 확인해 취소합니다.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '4'))
+JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS', '3600'))  # 끝난 작업/결과 파일 보관 시간
+JOB_PUBLISH_SECONDS = float(os.environ.get('JOB_PUBLISH_SECONDS', '1'))         # 진행 상황 공유 간격 (shared)
+JOB_CANCEL_POLL_SECONDS = float(os.environ.get('JOB_CANCEL_POLL_SECONDS', '1'))  # 다른 워커가 받은 취소 요청 확인 간격 (shared)
+
+_job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def _client_id():
+    """작업 소유자 식별용 세션 ID"""
+    if 'client_id' not in session:
+        session['client_id'] = str(uuid.uuid4())
+    return session['client_id']
+
+
+def _expire_jobs_locked(now):
+    for job_id, job in list(_jobs.items()):
+        if job["finished_at"] and now - job["finished_at"] > JOB_RETENTION_SECONDS:
+            del _jobs[job_id]
+            result_file = job.get("_file")
+            if result_file and os.path.exists(result_file):
+                os.remove(result_file)
+
+
+def _submit_job(kind, target, *args, specs=()):
+    """작업을 등록합니다. specs(조회 정보 목록)에는 작업의 취소 토큰을 연결해 실행 중인 쿼리도 취소되게 합니다."""
+    job_id = str(uuid.uuid4())
+    cancel = _CancelToken()
+    for spec in specs:
+        spec["cancel"] = cancel
+    job = {
+        "job_id": job_id,
+        "kind": kind,
+        "owner": _client_id(),
+        "status": "queued",
+        "stage": "queued",
+        "rows": 0,
+        "total_rows": None,
+        "parts": 0,
+        "total_parts": None,
+        "error": None,
+        "result": None,
+        "created_at": time.time(),
+        "finished_at": None,
+        "_cancel": cancel,
+    }
+    with _jobs_lock:
+        _expire_jobs_locked(time.time())
+        _jobs[job_id] = job
+        _result_store.save_job(job)
+    _job_executor.submit(_run_job, job_id, target, args)
+    return job_id
+
+
+def _update_job(job_id, **fields):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job.update(fields)
+            # 상태 변화(시작/종료)는 바로, 진행 상황은 JOB_PUBLISH_SECONDS 마다 공유
+            now = time.time()
+            if "status" in fields or now - job.get("_published_at", 0) >= JOB_PUBLISH_SECONDS:
+                job["_published_at"] = now
+                _result_store.save_job(job)
+
+
+def _run_job(job_id, target, args):
+    with _jobs_lock:
+        cancel = _jobs[job_id]["_cancel"]
+
+    def progress(**fields):
+        cancel.check()
+        _update_job(job_id, **fields)
+
+    try:
+        progress(status="running")
+        result = target(*args, progress=progress)
+    except _JobCancelled:
+        app.logger.info(f"작업 취소됨 ({job_id})")
+        _update_job(job_id, status="cancelled", stage="cancelled", error="작업이 취소되었습니다.", finished_at=time.time())
+        return
+    except _ValidationFailed as e:
+        app.logger.warning(f"작업 중단 ({job_id}): {e}")
+        _update_job(job_id, status="error", stage="error", error=str(e), validation=e.report, finished_at=time.time())
+        return
+    except Exception as e:
+        app.logger.error(f"작업 실패 ({job_id}): {e}", exc_info=True)
+        _update_job(job_id, status="error", stage="error", error=str(e), finished_at=time.time())
+        return
+    result_file = result.pop("_file", None)
+    _update_job(job_id, status="done", stage="done", result=result, _file=result_file, finished_at=time.time())
+
+
+def _cancel_job(job_id):
+    """작업 취소를 요청합니다. 반환값: 취소를 요청했으면 True, 이미 끝난 작업이면 False"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            if job["finished_at"]:
+                return False
+            job["stage"] = "cancelling"
+            _result_store.save_job(job)
+            cancel = job["_cancel"]
+    if job is None:
+        # 다른 워커/레플리카가 실행 중인 작업 (shared)
+        job = _result_store.load_job(job_id)
+        if job is None or job["finished_at"]:
+            return False
+        _result_store.request_cancel(job_id)
+        return True
+    cancel.cancel()
+    return True
+
+
+def _apply_cancel_requests():
+    """다른 워커가 받은 취소 요청 중 이 프로세스에서 실행 중인 작업을 취소합니다. (shared)"""
+    requested = _result_store.cancel_requests()
+    with _jobs_lock:
+        running = [job_id for job_id in requested
+                   if job_id in _jobs and not _jobs[job_id]["finished_at"] and not _jobs[job_id]["_cancel"].cancelled]
+    for job_id in running:
+        app.logger.info(f"다른 워커가 받은 작업 취소 요청 ({job_id})")
+        _cancel_job(job_id)
+
+
+def _cancel_watch_loop():
+    while True:
+        time.sleep(JOB_CANCEL_POLL_SECONDS)
+        try:
+            _apply_cancel_requests()
+        except Exception as e:
+            app.logger.error(f"작업 취소 요청 확인 중 오류: {e}", exc_info=True)
+
+
+def _get_owned_job(job_id):
+    """현재 세션이 만든 작업의 사본 (다른 사용자의 작업은 None)"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        job = dict(job) if job is not None else None
+    if job is None:
+        job = _result_store.load_job(job_id)   # 다른 워커/레플리카의 작업 (shared)
+    if job is None or job["owner"] != session.get('client_id'):
+        return None
+    return job
+
+
+def _export_job(ctx, progress=_no_progress):
+    """내보내기 ZIP 을 temp_data 에 파일로 만듭니다. (다운로드 엔드포인트에서 전송)"""
+    if ctx["validate"]:
+        progress(stage='validating')
+        report = _check_export_validation(ctx)
+        if report is not None:
+            raise _ValidationFailed(report)
+    total_parts = -(-ctx["total_rows"] // ctx["split_rows"])
+    progress(stage='writing', total_rows=ctx["total_rows"], total_parts=total_parts)
+    zip_path = os.path.join(TEMP_DIR, f"export_{uuid.uuid4()}.zip")
+
+    def on_part(part_no):
+        progress(parts=part_no, rows=min(part_no * ctx["split_rows"], ctx["total_rows"]))
+
+    try:
+        with open(zip_path, 'wb') as f:
+            for _ in _write_export_zip(f, ctx, on_part=on_part):
+                pass
+    except Exception:
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
+        raise
+    return {"filename": ctx["download_filename"], "_file": zip_path}
+
+
+@app.route('/api/jobs/fetch', methods=['POST'])
+def submit_fetch_job():
+    """[신규] 조회를 백그라운드 작업으로 실행하고 작업 ID 를 바로 돌려줍니다."""
+    try:
+        spec, error = _prepare_fetch(request.json)
+        if error:
+            return error
+        job_id = _submit_job('fetch', _run_fetch, spec, specs=[spec])
+        return jsonify({"job_id": job_id}), 202
+    except Exception as e:
+        app.logger.error(f"조회 작업 등록 중 오류: {e}", exc_info=True)
+        return jsonify({"error": f"서버 오류: {str(e)}"}), 500
+
+
+@app.route('/api/jobs/export', methods=['POST'])
+def submit_export_job():
+    """[신규] 엑셀 내보내기를 백그라운드 작업으로 실행하고 작업 ID 를 바로 돌려줍니다."""
+    try:
+        data = request.get_json(silent=True)
+        if data is None:
+            data = {}
+        ctx, error = _prepare_export(data, validate_now=False)
+        if error:
+            return error
+        job_id = _submit_job('export', _export_job, ctx)
+        return jsonify({"job_id": job_id}), 202
+    except Exception as e:
+        app.logger.error(f"내보내기 작업 등록 중 오류: {e}", exc_info=True)
+        return jsonify({"error": f"엑셀 생성 오류: {str(e)}"}), 500
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """[신규] 작업 진행 상황. 끝난 조회 작업은 이때 세션에 결과를 연결합니다."""
+    job = _get_owned_job(job_id)
+    if job is None:
+        return jsonify({"error": "작업을 찾을 수 없습니다."}), 404
+
+    status = {key: value for key, value in job.items() if not key.startswith('_') and key != 'owner'}
+    if job["status"] == "done":
+        if job["kind"] == "fetch":
+            if session.get('data_id') != job["result"]["data_id"]:
+                _remember_fetch(job["result"])
+            status["result"] = _fetch_message(job["result"])
+        elif job["kind"] == "integrity":
+            status["result"] = job["result"]   # 내려받을 파일 없음
+        else:
+            status["result"] = dict(job["result"], download_url=f"/api/jobs/{job_id}/download")
+    return jsonify(status)
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """[신규] 실행 중인 작업을 취소합니다. 실행 중인 쿼리는 cursor.cancel() 로 바로 중단됩니다."""
+    job = _get_owned_job(job_id)
+    if job is None:
+        return jsonify({"error": "작업을 찾을 수 없습니다."}), 404
+    if not _cancel_job(job_id):
+        return jsonify({"error": "이미 끝난 작업입니다."}), 409
+    app.logger.info(f"작업 취소 요청 ({job_id}, {job['kind']})")
+    return jsonify({"job_id": job_id, "status": "cancelling"}), 202
+
+
+@app.route('/api/jobs/<job_id>/download', methods=['GET'])
+def download_job_result(job_id):
+    """[신규] 끝난 내보내기 작업의 ZIP 파일을 내려받습니다."""
+    job = _get_owned_job(job_id)
+    if job is None or job["kind"] not in ("export", "bundle"):
+        return jsonify({"error": "작업을 찾을 수 없습니다."}), 404
+    if job["status"] != "done":
+        return jsonify({"error": "작업이 아직 끝나지 않았습니다."}), 409
+    result_file = job.get("_file")
+    if not result_file or not os.path.exists(result_file):
+        return jsonify({"error": "결과 파일이 만료되었습니다. 다시 내보내기 해주세요."}), 410
+    return send_file(result_file, mimetype='application/zip', as_attachment=True,
+                     download_name=job["result"]["filename"])
+
+
+# --- 이관 묶음 내보내기 / 여러 회사 동시 조회 ---
+# 여러 조회(메뉴 또는 회사별)를 작업 하나로 실행해 ZIP 하나를 만듭니다.
+#   - bundle: 한 회사의 여러 메뉴(query_name) → 메뉴별 폴더
+#   - fanout: 한 메뉴를 여러 회사(또는 전체 회사)에 대해 → 회사별 파일 ({co_cd}_{co_nm}_... 이름)
+# 조회는 정해진 수만큼 연결 풀의 연결을 재사용해 먼저 실행해 두므로, 앞 조회의 엑셀을 만드는 동안
+# 다음 조회가 진행됩니다. (ZIP 안의 순서는 요청 순서)
+# 조회 하나가 실패해도 나머지는 계속 진행하고, 실패 내역은 작업 결과와 ZIP 의 오류.txt 에 남깁니다.
+BUNDLE_FETCH_CONCURRENCY = int(os.environ.get('BUNDLE_FETCH_CONCURRENCY', '2'))
+FANOUT_CONCURRENCY = int(os.environ.get('FANOUT_CONCURRENCY', '4'))
+
+
+def _prepare_bundle(data):
+    """묶음 내보내기 요청을 검사해 메뉴별 조회/내보내기 정보를 만듭니다. 반환값: (작업 정보, 오류 응답)"""
+    query_names = data.get('query_names')
+    if not isinstance(query_names, list) or not query_names:
+        return None, (jsonify({"error": "내보낼 메뉴를 하나 이상 선택해야 합니다."}), 400)
+    if not data.get('co_cd'):
+        return None, (jsonify({"error": "회사를 선택해야 합니다."}), 400)
+    options, error = _export_options(data)
+    if error:
+        return None, error
+
+    items = []
+    for query_name in dict.fromkeys(query_names):
+        entry = QUERY_REGISTRY.get(query_name)
+        if entry is None:
+            return None, (jsonify({"error": f"유효하지 않은 쿼리 이름입니다: {query_name}"}), 400)
+        if not all(data.get(name) for name in entry["required"]):
+            return None, (jsonify({"error": f"{query_name}: {entry['error']}"}), 400)
+        spec, error = _prepare_fetch(dict(data, query_name=query_name))
+        if error:
+            return None, error
+        template, error = _export_template(query_name)
+        if error:
+            return None, error
+        items.append({"spec": spec, "label": query_name, "folder": f"{query_name}/",
+                      "template_path": template["template_path"], "start_row": template["start_row"]})
+
+    return {
+        "items": items,
+        "concurrency": BUNDLE_FETCH_CONCURRENCY,
+        "split_rows": options["split_rows"],
+        "workers": options["workers"],
+        "validate": options["validate"],
+        "export_format": options["export_format"],
+        "csv_encoding": options["csv_encoding"],
+        "download_filename": f"{data['co_cd']}_이관자료_data.zip",
+    }, None
+
+
+def _prepare_fanout(data):
+    """여러 회사 동시 조회 요청을 검사해 회사별 조회/내보내기 정보를 만듭니다. 반환값: (작업 정보, 오류 응답)
+
+    co_cds 가 "all" 이면 sco 의 전체 회사를 대상으로 합니다.
+    """
+    query_name = data.get('query_name')
+    entry = QUERY_REGISTRY.get(query_name)
+    if entry is None:
+        return None, (jsonify({"error": "유효하지 않은 쿼리 이름입니다."}), 400)
+    if not data.get('db_config'):
+        return None, (jsonify({"error": "DB 정보가 없습니다."}), 400)
+    options, error = _export_options(data)
+    if error:
+        return None, error
+    template, error = _export_template(query_name)
+    if error:
+        return None, error
+
+    companies = {company["co_cd"]: company["co_nm"] for company in _load_companies(data['db_config'])[0]}
+    co_cds = data.get('co_cds')
+    if co_cds == 'all':
+        co_cds = list(companies)
+    if not isinstance(co_cds, list) or not co_cds:
+        return None, (jsonify({"error": "조회할 회사를 하나 이상 선택해야 합니다."}), 400)
+    unknown = [co_cd for co_cd in co_cds if co_cd not in companies]
+    if unknown:
+        return None, (jsonify({"error": f"회사 목록에 없는 회사 코드입니다: {', '.join(map(str, unknown))}"}), 400)
+
+    items = []
+    for co_cd in dict.fromkeys(co_cds):
+        spec, error = _prepare_fetch(dict(data, co_cd=co_cd, co_nm=companies[co_cd]))
+        if error:
+            return None, error
+        items.append({"spec": spec, "label": f"{co_cd} {companies[co_cd]}", "folder": "",
+                      "template_path": template["template_path"], "start_row": template["start_row"]})
+
+    try:
+        concurrency = int(data.get('max_workers') or FANOUT_CONCURRENCY)
+    except (TypeError, ValueError):
+        return None, (jsonify({"error": "max_workers 는 숫자여야 합니다."}), 400)
+    return {
+        "items": items,
+        "concurrency": max(1, min(concurrency, FANOUT_CONCURRENCY)),
+        "split_rows": options["split_rows"],
+        "workers": options["workers"],
+        "validate": options["validate"],
+        "export_format": options["export_format"],
+        "csv_encoding": options["csv_encoding"],
+        "download_filename": f"{query_name}_회사별_data.zip",
+    }, None
+
+
+def _bundle_job(bundle, progress=_no_progress):
+    """조회를 미리 실행해 두고, 끝나는 대로 요청 순서에 맞춰 엑셀 파트를 ZIP 에 기록합니다."""
+    items = bundle["items"]
+    zip_path = os.path.join(TEMP_DIR, f"export_{uuid.uuid4()}.zip")
+    results, failed, empty = [], [], []
+    progress(stage='querying', queries=0, total_queries=len(items))
+
+    # 같은 DB 를 대상으로 하므로 연결 풀의 대상별 연결 수를 넘지 않게 합니다.
+    concurrency = max(1, min(bundle["concurrency"], DB_POOL_MAX_PER_TARGET))
+    fetch_pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='bundle')
+    futures = [fetch_pool.submit(_run_fetch, item["spec"]) for item in items]
+    try:
+        with open(zip_path, 'wb') as f, zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for done, (item, future) in enumerate(zip(items, futures), start=1):
+                spec = item["spec"]
+                query_name, label = spec["query_name"], item["label"]
+                summary = {"label": label, "query_name": query_name, "co_cd": spec["co_cd"], "co_nm": spec["co_nm"],
+                           "total_rows": None, "error": None}
+                results.append(summary)
+                progress(stage='fetching', current=label, rows=0, total_rows=None, parts=0, total_parts=None)
+                try:
+                    result = future.result()
+                    summary["total_rows"] = result["total_rows"]
+                    if result["total_rows"] == 0:
+                        empty.append(label)
+                        continue
+                    ctx = {
+                        "data_id": result["data_id"],
+                        "filepath": _result_store.path(result["data_id"]),
+                        "total_rows": result["total_rows"],
+                        "split_rows": bundle["split_rows"],
+                        "workers": bundle["workers"],
+                        "export_format": bundle["export_format"],
+                        "csv_encoding": bundle["csv_encoding"],
+                        "template_path": item["template_path"],
+                        "start_row": item["start_row"],
+                        "query_name": query_name,
+                        "co_cd": result["co_cd"],
+                        "co_nm": result["co_nm"],
+                    }
+                    if bundle["validate"]:
+                        progress(stage='validating')
+                        report = _check_export_validation(ctx)
+                        if report is not None:
+                            raise ValueError(_validation_summary(report))
+                    progress(stage='writing', total_rows=ctx["total_rows"],
+                             total_parts=-(-ctx["total_rows"] // ctx["split_rows"]))
+
+                    def on_part(part_no, ctx=ctx):
+                        progress(parts=part_no, rows=min(part_no * ctx["split_rows"], ctx["total_rows"]))
+
+                    for _ in _write_export_parts(zf, ctx, folder=item["folder"], on_part=on_part):
+                        pass
+                except _JobCancelled:
+                    raise
+                except Exception as e:
+                    app.logger.error(f"묶음 내보내기 중 '{label}' 실패: {e}", exc_info=True)
+                    summary["error"] = str(e)
+                    failed.append(summary)
+                finally:
+                    progress(queries=done)
+            if failed:
+                zf.writestr("오류.txt", "\n".join(f"{item['label']}: {item['error']}" for item in failed))
+    except Exception:
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
+        raise
     finally:
-        if filepath and os.path.exists(filepath):
-            os.remove(filepath)
+        for future in futures:
+            future.cancel()
+        fetch_pool.shutdown(wait=False)
+    return {"filename": bundle["download_filename"], "_file": zip_path,
+            "results": results, "failed": failed, "empty": empty}
+
+
+@app.route('/api/jobs/bundle', methods=['POST'])
+def submit_bundle_job():
+    """[신규] 여러 메뉴를 조회해 메뉴별 폴더로 묶은 ZIP 을 만드는 작업을 등록합니다."""
+    try:
+        bundle, error = _prepare_bundle(request.get_json(silent=True) or {})
+        if error:
+            return error
+        job_id = _submit_job('bundle', _bundle_job, bundle, specs=[item["spec"] for item in bundle["items"]])
+        return jsonify({"job_id": job_id}), 202
+    except Exception as e:
+        app.logger.error(f"묶음 내보내기 작업 등록 중 오류: {e}", exc_info=True)
+        return jsonify({"error": f"서버 오류: {str(e)}"}), 500
+
+
+@app.route('/api/jobs/fanout', methods=['POST'])
+def submit_fanout_job():
+    """[신규] 한 메뉴를 여러 회사에 대해 동시에 조회해 회사별 파일로 묶은 ZIP 을 만드는 작업을 등록합니다."""
+    try:
+        fanout, error = _prepare_fanout(request.get_json(silent=True) or {})
+        if error:
+            return error
+        job_id = _submit_job('bundle', _bundle_job, fanout, specs=[item["spec"] for item in fanout["items"]])
+        return jsonify({"job_id": job_id}), 202
+    except pyodbc.Error as ex:
+        return jsonify({"error": f"회사 목록 조회 실패: {ex}"}), 500
+    except Exception as e:
+        app.logger.error(f"회사별 조회 작업 등록 중 오류: {e}", exc_info=True)
+        return jsonify({"error": f"서버 오류: {str(e)}"}), 500
+
+# --- 데이터셋 간 참조 무결성 검사 ---
+# 한 회사의 여러 추출 결과를 모아, 거래 데이터가 참조하는 코드(품목/거래처/창고·장소/프로젝트)가
+# 기준 데이터셋(품목등록, 거래처등록 등)에 있는지 검사합니다. ERP 업로드 도중 실패하는 것을 미리 찾기 위함입니다.
+#   - 기준 데이터셋의 키 컬럼만 읽어 고유값 배열(Arrow 해시 집합)을 만들고, 참조 컬럼은 row group 단위로 읽어
+#     pc.is_in 으로 한 번에 판정합니다. (행 단위 파이썬 루프 없음)
+#   - 코드값은 앞뒤 공백을 제거해 비교하고(SQL Server CHAR 비교와 같게), 빈 값/NULL 참조는 검사하지 않습니다.
+#     복합 키(창고 + 장소)는 어느 한쪽이라도 비어 있으면 검사하지 않습니다.
+#   - 기본은 최근 조회 결과 캐시에 있는 데이터셋만 사용하고, fetch_missing 이면 없는 데이터셋을 조회합니다.
+# INTEGRITY_RULES: name / master (기준 데이터셋, 키 컬럼) / references (참조 데이터셋, 키 컬럼: 복합 키는 기준과 같은 순서)
+INTEGRITY_SAMPLE_VALUES = int(os.environ.get('INTEGRITY_SAMPLE_VALUES', '10'))   # 검사별로 돌려줄 누락 코드 예시 수
+_INTEGRITY_KEY_SEPARATOR = '\x1f'
+
+INTEGRITY_RULES = [
+    {
+        "name": "품목",
+        "master": ("품목등록", ("ITEM_CD",)),
+        "references": [
+            ("BOM등록", ("ITEMPARENT_CD",)), ("BOM등록", ("ITEMCHILD_CD",)),
+            ("기초재고", ("ITEM_CD",)), ("주문정보", ("ITEM_CD",)), ("발주등록", ("ITEM_CD",)),
+            ("입고처리", ("ITEM_CD",)), ("출고처리", ("ITEM_CD",)), ("생산실적", ("ITEM_CD",)),
+            ("생산출고", ("ITEM_CD",)), ("생산출고", ("ITEMPARENT_CD",)), ("재고조정", ("ITEM_CD",)),
+            ("재고이동", ("ITEM_CD",)), ("자동전표처리", ("ITEM_CD",)),
+        ],
+    },
+    {
+        "name": "거래처",
+        "master": ("거래처등록", ("TR_CD",)),
+        "references": [
+            ("공정", ("TR_CD",)), ("프로젝트등록", ("TR_CD",)), ("고객별물류담당자등록", ("TR_CD",)),
+            ("기초재고", ("TR_CD",)), ("주문정보", ("TR_CD",)), ("발주등록", ("TR_CD",)),
+            ("입고처리", ("TR_CD",)), ("출고처리", ("TR_CD",)), ("수금등록", ("TR_CD",)),
+            ("재고조정", ("TR_CD",)), ("회계초기이월", ("TR_CD",)), ("자동전표처리", ("TR_CD",)),
+        ],
+    },
+    {
+        "name": "창고",
+        "master": ("창고", ("BASELOC_CD",)),
+        "references": [
+            ("공정", ("BASELOC_CD",)), ("기초재고", ("WH_CD",)), ("입고처리", ("WH_CD",)),
+            ("출고처리", ("WH_CD",)), ("재고조정", ("WH_CD",)), ("재고이동", ("FWH_CD",)),
+            ("재고이동", ("TWH_CD",)), ("생산출고", ("FWH_CD",)),
+        ],
+    },
+    {
+        "name": "장소",
+        "master": ("공정", ("BASELOC_CD", "LOC_CD")),
+        "references": [
+            ("기초재고", ("WH_CD", "LC_CD")), ("입고처리", ("WH_CD", "LC_CD")), ("출고처리", ("WH_CD", "LC_CD")),
+            ("재고조정", ("WH_CD", "LC_CD")), ("재고이동", ("FWH_CD", "FLC_CD")), ("재고이동", ("TWH_CD", "TLC_CD")),
+            ("생산출고", ("FWH_CD", "FLC_CD")),
+        ],
+    },
+    {
+        "name": "프로젝트",
+        "master": ("프로젝트등록", ("PJT_CD",)),
+        "references": [
+            ("거래처등록", ("PJT_CD",)), ("기초재고", ("PJT_CD",)), ("주문정보", ("PJT_CD",)),
+            ("발주등록", ("PJT_CD",)), ("입고처리", ("PJT_CD",)), ("출고처리", ("PJT_CD",)),
+            ("수금등록", ("PJT_CD",)), ("재고조정", ("PJT_CD",)), ("재고이동", ("PJT_CD",)),
+            ("생산실적", ("PJT_CD",)), ("생산출고", ("PJT_CD",)), ("회계초기이월", ("PJT_CD",)),
+            ("자동전표처리", ("PJT_CD",)),
+        ],
+    },
+]
+
+
+def _integrity_rule_problems():
+    """INTEGRITY_RULES 설정 오류 목록 (레지스트리에 없는 데이터셋, 키 컬럼 수 불일치)"""
+    problems = []
+    for rule in INTEGRITY_RULES:
+        master, master_columns = rule["master"]
+        for dataset, columns in [rule["master"]] + rule["references"]:
+            if dataset not in QUERY_REGISTRY:
+                problems.append(f"참조 무결성 '{rule['name']}': 레지스트리에 없는 데이터셋 '{dataset}'")
+            if len(columns) != len(master_columns):
+                problems.append(f"참조 무결성 '{rule['name']}': {dataset} 의 키 컬럼 수가 {master} 와 다릅니다.")
+    return problems
+
+
+def _integrity_keys(table, columns):
+    """키 컬럼을 비교용 문자열 배열로 만듭니다. (앞뒤 공백 제거, 복합 키는 구분자로 연결, 빈 키는 NULL)"""
+    parts = []
+    for name in columns:
+        column = table.column(name).combine_chunks()
+        if pa.types.is_dictionary(column.type):
+            column = column.dictionary_decode()
+        if not pa.types.is_string(column.type):
+            column = pc.cast(column, pa.string())
+        column = pc.utf8_trim_whitespace(column)
+        parts.append(pc.if_else(pc.equal(column, ''), pa.scalar(None, pa.string()), column))
+    if len(parts) == 1:
+        return parts[0]
+    return pc.binary_join_element_wise(*parts, _INTEGRITY_KEY_SEPARATOR)   # 한쪽이라도 NULL 이면 NULL
+
+
+def _open_key_columns(filepath, columns):
+    """키 컬럼이 모두 있는지 확인하고 ParquetFile 을 엽니다."""
+    parquet_file = pq.ParquetFile(filepath)
+    missing = [name for name in columns if name not in parquet_file.schema_arrow.names]
+    if missing:
+        raise ValueError(f"컬럼이 없습니다: {', '.join(missing)}")
+    return parquet_file
+
+
+def _integrity_key_set(filepath, columns):
+    """기준 데이터셋의 키 고유값 배열 (pc.is_in 의 value_set)"""
+    table = _open_key_columns(filepath, columns).read(columns=list(columns))
+    return pc.unique(_integrity_keys(table, columns).drop_null())
+
+
+def _dangling_references(filepath, columns, key_set):
+    """참조 데이터셋에서 기준 키 집합에 없는 참조를 찾습니다. 반환값: (검사한 행 수, 누락 행 수, 누락 코드별 건수)"""
+    parquet_file = _open_key_columns(filepath, columns)
+    checked, dangling = 0, []
+    for rg in range(parquet_file.num_row_groups):
+        keys = _integrity_keys(parquet_file.read_row_group(rg, columns=list(columns)), columns).drop_null()
+        checked += len(keys)
+        not_found = keys.filter(pc.invert(pc.is_in(keys, value_set=key_set)))
+        if len(not_found):
+            dangling.append(not_found)
+    if not dangling:
+        return checked, 0, None
+    counts = pc.value_counts(pa.concat_arrays(dangling))
+    return checked, sum(len(chunk) for chunk in dangling), counts
+
+
+def _prepare_integrity(data):
+    """참조 무결성 검사 요청을 검사해 데이터셋별 조회 정보를 만듭니다. 반환값: (작업 정보, 오류 응답)"""
+    if not data.get('db_config'):
+        return None, (jsonify({"error": "DB 정보가 없습니다."}), 400)
+    if not data.get('co_cd'):
+        return None, (jsonify({"error": "회사를 선택해야 합니다."}), 400)
+
+    specs, skipped = {}, {}
+    for rule in INTEGRITY_RULES:
+        for dataset, _ in [rule["master"]] + rule["references"]:
+            if dataset in specs or dataset in skipped:
+                continue
+            entry = QUERY_REGISTRY[dataset]
+            if not all(data.get(name) for name in entry["required"]):
+                skipped[dataset] = entry["error"]   # 기간이 필요한 거래 데이터셋 등
+                continue
+            spec, error = _prepare_fetch(dict(data, query_name=dataset))
+            if error:
+                return None, error
+            specs[dataset] = spec
+    return {
+        "co_cd": data['co_cd'],
+        "co_nm": data.get('co_nm'),
+        "specs": specs,
+        "skipped": skipped,
+        "fetch_missing": bool(data.get('fetch_missing')),
+        "concurrency": BUNDLE_FETCH_CONCURRENCY,
+    }, None
+
+
+def _integrity_job(plan, progress=_no_progress):
+    """캐시된(또는 새로 조회한) 결과로 INTEGRITY_RULES 의 참조를 모두 검사합니다."""
+    skipped = dict(plan["skipped"])
+    paths = {}
+    with contextlib.ExitStack() as pins:
+        # 1) 최근 조회 결과 캐시에서 데이터셋 찾기 (검사하는 동안 결과 파일이 정리되지 않게 고정)
+        pending = {}
+        for dataset, spec in plan["specs"].items():
+            with _result_cache_lock:
+                cached = _lookup_result_locked(_fetch_fingerprint(spec), time.time())
+            if cached is not None:
+                pins.enter_context(_result_store.pinned(cached["data_id"]))
+                paths[dataset] = _result_store.path(cached["data_id"])
+            elif plan["fetch_missing"]:
+                pending[dataset] = spec
+            else:
+                skipped[dataset] = "최근 조회 결과가 없습니다."
+
+        # 2) 없는 데이터셋 조회 (fetch_missing)
+        if pending:
+            progress(stage='querying', queries=0, total_queries=len(pending))
+            concurrency = max(1, min(plan["concurrency"], DB_POOL_MAX_PER_TARGET))
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='integrity') as fetch_pool:
+                futures = {dataset: fetch_pool.submit(_run_fetch, spec) for dataset, spec in pending.items()}
+                for done, (dataset, future) in enumerate(futures.items(), start=1):
+                    try:
+                        result = future.result()
+                    except _JobCancelled:
+                        raise
+                    except Exception as e:
+                        app.logger.error(f"참조 무결성 검사용 '{dataset}' 조회 실패: {e}", exc_info=True)
+                        skipped[dataset] = f"조회 실패: {e}"
+                    else:
+                        pins.enter_context(_result_store.pinned(result["data_id"]))
+                        paths[dataset] = _result_store.path(result["data_id"])
+                    progress(queries=done, current=dataset)
+
+        # 3) 기준 키 집합을 만들고 참조 데이터셋마다 검사
+        progress(stage='checking')
+        checks = []
+        for rule in INTEGRITY_RULES:
+            master, master_columns = rule["master"]
+            key_set, master_error = None, None
+            if master in paths:
+                try:
+                    with _stage('integrity', master):
+                        key_set = _integrity_key_set(paths[master], master_columns)
+                except Exception as e:
+                    master_error = f"기준 데이터셋({master})을 읽을 수 없습니다: {e}"
+            else:
+                master_error = f"기준 데이터셋({master}): {skipped.get(master, '결과 없음')}"
+            for dataset, columns in rule["references"]:
+                check = {"name": rule["name"], "master": master, "master_columns": list(master_columns),
+                         "dataset": dataset, "columns": list(columns), "status": "skipped", "reason": None,
+                         "checked_rows": 0, "dangling_rows": 0, "dangling_values": 0, "samples": []}
+                checks.append(check)
+                if master_error or dataset not in paths:
+                    check["reason"] = master_error or skipped.get(dataset, "결과 없음")
+                    continue
+                try:
+                    with _stage('integrity', dataset) as info:
+                        checked, dangling, counts = _dangling_references(paths[dataset], columns, key_set)
+                        info["rows"] = checked
+                except Exception as e:
+                    check["reason"] = str(e)
+                    continue
+                check.update(status="ok" if not dangling else "dangling", checked_rows=checked, dangling_rows=dangling)
+                if counts is not None:
+                    check["dangling_values"] = len(counts)
+                    top = counts.take(pc.array_sort_indices(counts.field('counts'), order='descending')[:INTEGRITY_SAMPLE_VALUES])
+                    check["samples"] = [{"value": value.replace(_INTEGRITY_KEY_SEPARATOR, ' / '), "rows": rows}
+                                        for value, rows in zip(top.field('values').to_pylist(), top.field('counts').to_pylist())]
+
+    return {
+        "co_cd": plan["co_cd"],
+        "co_nm": plan["co_nm"],
+        "checks": checks,
+        "datasets": sorted(paths),
+        "skipped": [{"dataset": dataset, "reason": reason} for dataset, reason in skipped.items()],
+        "total_dangling": sum(check["dangling_rows"] for check in checks),
+    }
+
+
+@app.route('/api/jobs/integrity', methods=['POST'])
+def submit_integrity_job():
+    """[신규] 회사 하나의 추출 결과 간 참조 무결성 검사 작업을 등록합니다."""
+    try:
+        plan, error = _prepare_integrity(request.get_json(silent=True) or {})
+        if error:
+            return error
+        job_id = _submit_job('integrity', _integrity_job, plan, specs=plan["specs"].values())
+        return jsonify({"job_id": job_id}), 202
+    except Exception as e:
+        app.logger.error(f"참조 무결성 검사 작업 등록 중 오류: {e}", exc_info=True)
+        return jsonify({"error": f"서버 오류: {str(e)}"}), 500
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """[신규] 단계별 성능 지표 (Prometheus 텍스트 형식)"""
+    return Response(_metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+# --- 임시 파일 정리 (janitor) ---
+JANITOR_INTERVAL_SECONDS = int(os.environ.get('JANITOR_INTERVAL_SECONDS', '60'))
+ORPHAN_PART_SECONDS = 3600   # 워커가 비정상 종료하며 남긴 파트 파일 보관 시간
+
+
+def _sweep_orphan_files():
+    """어떤 작업에도 속하지 않는 파트/ZIP 파일 정리 (프로세스 재시작 등으로 남은 파일)"""
+    now = time.time()
+    with _jobs_lock:
+        _expire_jobs_locked(now)
+        job_files = {job.get("_file") for job in _jobs.values()}
+    _result_store.expire_jobs(now, JOB_RETENTION_SECONDS)
+    for name in os.listdir(TEMP_DIR):
+        path = os.path.join(TEMP_DIR, name)
+        if name.startswith('part_') and name.endswith('.xlsx'):
+            max_age = ORPHAN_PART_SECONDS
+        elif name.startswith('export_') and name.endswith('.zip') and path not in job_files:
+            max_age = JOB_RETENTION_SECONDS
+        else:
+            continue
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+                app.logger.info(f"남은 임시 파일 삭제: {name}")
+        except FileNotFoundError:
+            pass
+
+
+def _janitor_loop():
+    while True:
+        time.sleep(JANITOR_INTERVAL_SECONDS)
+        try:
+            _result_store.reclaim()
+            _sweep_orphan_files()
+        except Exception as e:
+            app.logger.error(f"임시 파일 정리 중 오류: {e}", exc_info=True)
+
+
+def _start_janitor():
+    # 내보내기 프로세스 풀의 워커(자식 프로세스)에서는 실행하지 않습니다.
+    if multiprocessing.parent_process() is not None:
+        return
+    _result_store.scan()
+    threading.Thread(target=_janitor_loop, name='janitor', daemon=True).start()
+    if RESULT_STORE_BACKEND == 'shared':
+        threading.Thread(target=_cancel_watch_loop, name='cancel-watch', daemon=True).start()
+
+
+_validate_query_registry()
+_start_janitor()
 
 # --- Flask 서버 실행 ---
+# 개발용 서버 (운영은 gunicorn). Werkzeug 디버거는 코드 실행이 가능하므로 FLASK_DEBUG=1 일 때만 켭니다.
 if __name__ == '__main__':
 
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG', '0') == '1')
 
 
 
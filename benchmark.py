@@ -0,0 +1,320 @@
+"""조회/내보내기 성능 벤치마크
+
+실제 SQL Server 없이 /api/fetch, /api/export 코드 경로의 처리량을 측정합니다.
+pyodbc.connect 를 메모리 안의 대체 연결로 바꿔, 레지스트리에 등록된 쿼리의 SELECT 목록과 같은
+컬럼 구성의 합성 데이터를 원하는 행 수만큼 돌려줍니다. (WHERE 조건은 적용하지 않으므로 stream 조회 기준)
+
+측정 항목은 조회/내보내기 처리량(rows/sec), 최대 메모리(RSS, 프로세스 풀 워커 포함), ZIP 크기, 단계별 시간
+(/metrics 와 같은 값)이며, 결과는 JSON 한 줄씩 결과 파일에 누적해 이전 실행과 비교합니다.
+최대 RSS 는 줄어들지 않는 값이므로 분할 라인 수마다 새 프로세스에서 조회 + 내보내기를 한 번씩 실행해 따로 측정합니다.
+
+사용 예:
+    python benchmark.py --queries 품목등록,주문정보 --rows 10000,100000,1000000 --split-rows 10000,50000
+    python benchmark.py --rows 5000000 --split-rows 50000 --fail-on-regression
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_QUERIES = ['거래처등록', '품목등록', '주문정보', '자동전표처리', '급여자료 추출']
+DEFAULT_RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_results.jsonl')
+ROW_POOL_SIZE = 4096            # 미리 만들어 두고 돌려 쓰는 합성 행 수 (5M 행도 생성 비용 없이 공급)
+REGRESSION_THRESHOLD = 0.2      # 이전 실행보다 처리량이 20% 이상 떨어지면 회귀로 표시
+
+
+# --- 합성 데이터 ---
+
+def _select_column_names(app, sql):
+    """SELECT 목록의 결과 컬럼 이름 (별칭 또는 마지막 식별자). 알 수 없으면 None"""
+    depths = app._sql_depths(sql)
+    select = app._find_keyword(sql, depths, r'\bSELECT\b')
+    from_ = app._find_keyword(sql, depths, r'\bFROM\b', start=select)
+    if select < 0 or from_ < 0:
+        return None
+    items, start = [], select + len('SELECT')
+    for i in range(start, from_ + 1):
+        if i == from_ or (sql[i] == ',' and depths[i] == 0):
+            items.append(sql[start:i].strip())
+            start = i + 1
+    names = []
+    for n, item in enumerate(items, start=1):
+        tokens = item.replace('[', ' ').replace(']', ' ').split()
+        last = tokens[-1].split('.')[-1] if tokens else ''
+        names.append(last if last.replace('_', '').isalnum() and not last.isdigit() else f'C{n}')
+    return names
+
+
+def _column_layout(app, query_name):
+    """쿼리의 (컬럼 이름, 파이썬 타입, 값 생성기) 목록. 이름 접미사로 타입과 값 분포를 정합니다."""
+    entry = app.QUERY_REGISTRY[query_name]
+    names = _select_column_names(app, entry["sql"])
+    if names is None:
+        # 동적 피벗(급여자료 등): 사원 정보 + 급여 항목
+        names = ['EMP_CD', 'KOR_NM', 'DEPT_CD'] + [f'PAY_{n:02d}_AM' for n in range(1, (entry["columns"] or 30) + 1)]
+    layout = []
+    for name in names:
+        upper = name.upper()
+        if upper.endswith('_DT'):
+            layout.append((name, str, lambda rng: (datetime.date(2020, 1, 1) + datetime.timedelta(days=rng.randrange(1800))).strftime('%Y%m%d')))
+        elif upper.endswith(('_QT', '_UM', '_AM', '_RT')):
+            layout.append((name, float, lambda rng: round(rng.random() * 100000, 2) if rng.random() > 0.05 else None))
+        elif upper.endswith('_SQ'):
+            layout.append((name, int, lambda rng: rng.randrange(1, 50)))
+        elif upper.endswith('_NB'):
+            layout.append((name, str, lambda rng: f'{rng.randrange(10 ** 9):010d}'))
+        elif upper.endswith(('_FG', '_YN', '_TY')):
+            layout.append((name, str, lambda rng: rng.choice('0123')))
+        elif upper.endswith('_CD'):
+            layout.append((name, str, lambda rng: f'{rng.randrange(300):05d}' if rng.random() > 0.1 else ''))
+        else:
+            layout.append((name, str, lambda rng: f'텍스트 {rng.randrange(5000)}' if rng.random() > 0.2 else None))
+    return layout
+
+
+class _StandInCursor:
+    """pyodbc 커서 대신 합성 행을 돌려주는 커서 (execute / nextset / fetchmany / fetchone)"""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self.description = None
+        self._remaining = 0
+        self._offset = 0
+
+    def execute(self, sql, params=()):
+        if sql.strip().upper() == 'SELECT 1':
+            self.description = [('ONE', int, None, None, None, None, False)]
+            self._pool, self._remaining = [(1,)], 1
+        else:
+            layout, self._pool = self._connection.source
+            self.description = [(name, type_code, None, None, None, None, True) for name, type_code, _ in layout]
+            self._remaining = self._connection.rows
+        self._offset = 0
+        return self
+
+    def nextset(self):
+        return False
+
+    def fetchmany(self, size):
+        size = min(size, self._remaining)
+        rows = []
+        while len(rows) < size:
+            # 미리 만든 행 풀을 순환하며 잘라 씀
+            start = self._offset % len(self._pool)
+            taken = self._pool[start:start + size - len(rows)]
+            rows.extend(taken)
+            self._offset += len(taken)
+        self._remaining -= len(rows)
+        return rows
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchall(self):
+        return self.fetchmany(self._remaining)
+
+    def cancel(self):
+        self._remaining = 0
+
+    def close(self):
+        pass
+
+
+class _StandInConnection:
+    def __init__(self, source, rows):
+        self.source = source
+        self.rows = rows
+
+    def cursor(self):
+        return _StandInCursor(self)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _install_stand_in(app, query_name, rows, seed=0):
+    """pyodbc.connect 를 합성 데이터 연결로 바꿉니다."""
+    rng = random.Random(seed)
+    layout = _column_layout(app, query_name)
+    pool = [tuple(make(rng) for _, _, make in layout) for _ in range(ROW_POOL_SIZE)]
+    app.pyodbc.connect = lambda conn_str, timeout=None, **kwargs: _StandInConnection((layout, pool), rows)
+    return layout
+
+
+# --- 측정 (케이스 하나를 새 프로세스에서 실행) ---
+
+def _run_case(case):
+    """케이스 하나(분할 라인 수 하나)를 현재 프로세스에서 실행하고 결과 dict 를 돌려줍니다."""
+    # 조회 결과/데이터셋 파일을 저장소 폴더(temp_data, dataset)에 남기지 않도록 임시 폴더에서 실행
+    work_dir = tempfile.mkdtemp(prefix='benchmark_')
+    os.environ['TEMP_DIR'] = work_dir
+    os.environ['DATASET_DIR'] = os.path.join(work_dir, 'dataset')
+    try:
+        return _measure_case(case)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _measure_case(case):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app
+
+    query_name, rows = case["query_name"], case["rows"]
+    layout = _install_stand_in(app, query_name, rows)
+    client = app.app.test_client()
+    body = {
+        "db_config": {"server": "benchmark", "database": "benchmark", "uid": "benchmark", "password": ""},
+        "query_name": query_name, "co_cd": "1000", "co_nm": "BENCH",
+        "start_date": "2020-01-01", "end_date": "2024-12-31",
+        "fetch_mode": case["fetch_mode"], "force_refresh": True,
+    }
+    started = time.perf_counter()
+    response = client.post('/api/fetch', json=body)
+    fetch_seconds = time.perf_counter() - started
+    if response.status_code != 200:
+        raise RuntimeError(f"조회 실패: {response.get_json()}")
+    fetch_peak_rss = app._peak_rss_bytes() or 0
+
+    split_rows = case["split_rows"]
+    started = time.perf_counter()
+    # 합성 데이터는 템플릿 규칙(길이/형식 등)을 지키지 않으므로 검증 없이 파일 생성만 측정
+    response = client.post('/api/export', json={"split_rows": split_rows, "export_mode": case["export_mode"],
+                                                "skip_validation": True})
+    if response.status_code != 200:
+        raise RuntimeError(f"내보내기 실패 (split_rows={split_rows}): {response.get_json()}")
+    size = sum(len(chunk) for chunk in response.response)   # 스트리밍 응답을 끝까지 소비
+    export_seconds = time.perf_counter() - started
+
+    stages = {}
+    peak_rss = app._peak_rss_bytes() or 0
+    with app._metrics._lock:
+        for (stage, _), histogram in app._metrics._seconds.items():
+            stages[stage] = round(stages.get(stage, 0) + histogram[-2], 3)
+        peak_rss = max([peak_rss] + list(app._metrics._peak_rss.values()))
+    return {
+        "columns": len(layout),
+        "fetch": {"seconds": round(fetch_seconds, 3), "rows_per_sec": round(rows / fetch_seconds, 1),
+                  "peak_rss_bytes": fetch_peak_rss},
+        "export": {
+            "split_rows": split_rows,
+            "seconds": round(export_seconds, 3),
+            "rows_per_sec": round(rows / export_seconds, 1),
+            "zip_bytes": size,
+            "stage_seconds": stages,
+            "peak_rss_bytes": peak_rss,   # 조회 + 이 내보내기까지의 최대 RSS (워커 포함)
+        },
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _case_key(record):
+    return (record["query_name"], record["rows"], record["fetch_mode"], record["export_mode"])
+
+
+def _load_previous(results_path):
+    """케이스별 가장 최근 결과"""
+    previous = {}
+    if os.path.exists(results_path):
+        with open(results_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    previous[_case_key(record)] = record
+    return previous
+
+
+def _regressions(record, before):
+    """이전 결과 대비 처리량이 REGRESSION_THRESHOLD 이상 떨어진 항목"""
+    found = []
+    if before is None:
+        return found
+    pairs = [("fetch", before["fetch"]["rows_per_sec"], record["fetch"]["rows_per_sec"])]
+    before_exports = {item["split_rows"]: item for item in before["exports"]}
+    for item in record["exports"]:
+        if item["split_rows"] in before_exports:
+            pairs.append((f"export(split_rows={item['split_rows']})",
+                          before_exports[item["split_rows"]]["rows_per_sec"], item["rows_per_sec"]))
+    for name, old, new in pairs:
+        if old and new < old * (1 - REGRESSION_THRESHOLD):
+            found.append(f"{name}: {old:,.0f} → {new:,.0f} rows/sec")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="조회/내보내기 성능 벤치마크 (합성 데이터)")
+    parser.add_argument('--queries', default=','.join(DEFAULT_QUERIES), help="쉼표로 구분한 query_name 목록")
+    parser.add_argument('--rows', default='10000,100000', help="쉼표로 구분한 행 수 목록 (예: 10000,1000000,5000000)")
+    parser.add_argument('--split-rows', default='10000,50000', help="쉼표로 구분한 분할 라인 수 목록")
+    parser.add_argument('--fetch-mode', default='stream', choices=['stream', 'buffered'])
+    parser.add_argument('--export-mode', default='parallel', choices=['parallel', 'serial'])
+    parser.add_argument('--output', default=DEFAULT_RESULTS, help="결과를 누적할 JSON Lines 파일")
+    parser.add_argument('--fail-on-regression', action='store_true', help="회귀가 있으면 종료 코드 1")
+    parser.add_argument('--case', help=argparse.SUPPRESS)   # 내부용: 케이스 하나를 이 프로세스에서 실행
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(_run_case(json.loads(args.case)), ensure_ascii=False))
+        return 0
+
+    previous = _load_previous(args.output)
+    commit = _git_commit()
+    regressions = []
+    for query_name in [name.strip() for name in args.queries.split(',') if name.strip()]:
+        for rows in [int(value) for value in args.rows.split(',')]:
+            case = {
+                "query_name": query_name,
+                "rows": rows,
+                "split_rows": [int(value) for value in args.split_rows.split(',')],
+                "fetch_mode": args.fetch_mode,
+                "export_mode": args.export_mode,
+            }
+            results = []
+            for split_rows in case["split_rows"]:
+                # 최대 RSS 가 케이스/분할 라인 수끼리 섞이지 않도록 각각 새 프로세스에서 실행
+                completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--case',
+                                            json.dumps(dict(case, split_rows=split_rows))],
+                                           capture_output=True, text=True)
+                if completed.returncode != 0:
+                    print(f"[실패] {query_name} {rows:,}행 split {split_rows:,}\n{completed.stderr[-2000:]}", file=sys.stderr)
+                    continue
+                results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+            if not results:
+                continue
+            exports = [result["export"] for result in results]
+            record = dict(case, columns=results[0]["columns"], fetch=results[0]["fetch"], exports=exports,
+                          peak_rss_bytes=max(item["peak_rss_bytes"] for item in exports), commit=commit,
+                          measured_at=datetime.datetime.now().isoformat(timespec='seconds'))
+            with open(args.output, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+            exports = ', '.join(f"split {item['split_rows']:,}: {item['rows_per_sec']:,.0f} rows/s, {item['zip_bytes'] / 2 ** 20:.1f}MB,"
+                                f" RSS {item['peak_rss_bytes'] / 2 ** 20:.0f}MB" for item in record["exports"])
+            print(f"{query_name} {rows:,}행 ({record['columns']}컬럼) | 조회 {record['fetch']['rows_per_sec']:,.0f} rows/s"
+                  f" | {exports} | 최대 RSS {record['peak_rss_bytes'] / 2 ** 20:.0f}MB")
+            for message in _regressions(record, previous.get(_case_key(record))):
+                regressions.append(f"{query_name} {rows:,}행 {message}")
+
+    for message in regressions:
+        print(f"[회귀] {message}", file=sys.stderr)
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
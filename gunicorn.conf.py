@@ -0,0 +1,20 @@
+# gunicorn 설정 (운영 실행: gunicorn -c gunicorn.conf.py app:app)
+# 워커(프로세스)를 여러 개 두거나 레플리카를 늘리려면 모든 워커가 조회 결과와 작업 상태를 함께 봐야 하므로
+# RESULT_STORE_BACKEND=shared (+ 레플리카 간에는 공유 볼륨의 TEMP_DIR)와 같은 SECRET_KEY 로 실행합니다.
+# /metrics 는 요청을 받은 워커의 지표만 보여 줍니다.
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_WORKERS', '1'))
+# 조회/내보내기 작업은 워커 안의 스레드에서 실행되고, 요청은 진행 상황 조회가 대부분이므로 스레드 워커 사용
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', '8'))
+# 동기 내보내기(/api/export)는 ZIP 을 만들며 오래 걸릴 수 있어 여유 있게
+timeout = int(os.environ.get('WEB_TIMEOUT', '300'))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', '60'))
+# 정리 스레드/작업 스레드 풀/연결 풀은 워커마다 있어야 하므로 app 은 fork 후에 워커별로 불러옵니다.
+preload_app = False
+accesslog = '-'
+
+if workers > 1 and os.environ.get('RESULT_STORE_BACKEND', 'local') != 'shared':
+    raise SystemExit("WEB_WORKERS 가 2 이상이면 RESULT_STORE_BACKEND=shared 로 실행해야 합니다.")